@@ -0,0 +1,570 @@
+#! /usr/bin/env python3
+
+'''
+Times the steps of 'character_appear.py' on synthetic corpora shaped like
+    'expanded_table.csv', so that changes to the counting or the corrections
+    can be measured on any machine without the Peanuts data
+Each corpus is generated from a fixed random seed, so the same size always
+    produces the same corpus and the same results; the timings and a digest of
+    the results are compared to a baseline file saved by an earlier run
+'''
+
+
+def rule_terms(rules):
+    '''
+    Returns list of the words/phrases named in the correction rules 'rules'
+        (see 'load_correction_rules'), which must be among the searched-for
+        words so that all the rules apply
+    '''
+
+    terms = []
+    terms.extend(rules['merges'].keys())
+    terms.extend(rules['merges'].values())
+    terms.extend([rules['patty']['character'],
+                  rules['patty']['other_character']])
+    terms.extend(rules['appearances'].keys())
+    for misidentification in rules['misidentifications']:
+        terms.extend([misidentification['incorrect'],
+                      misidentification['correct']])
+    for source_columns in rules['combined_columns'].values():
+        terms.extend(source_columns)
+
+    terms = sorted(set(t.lower() for t in terms))
+
+    return(terms)
+
+
+def make_synthetic_word(random_state, n_syllables):
+    '''
+    Returns a made-up, pronounceable word of 'n_syllables' syllables
+    '''
+
+    consonants = 'bcdfghjklmnprstvwz'
+    vowels = 'aeiou'
+    syllables = [consonants[random_state.randint(len(consonants))] +
+                 vowels[random_state.randint(len(vowels))]
+                 for _ in range(n_syllables)]
+
+    return(''.join(syllables))
+
+
+def make_term_lists(rules, characters_filepath=None, term_scale=1, seed=0):
+    '''
+    Returns the lists of the words/phrases that the synthetic corpus is
+        searched for ('characters_and_more') and of the characters among them
+        ('characters_only')
+    The words/phrases are those of 'characters_filepath' (e.g., the project's
+        'characters_and_more.txt'), if given, and of the correction rules
+    'term_scale' - the list is enlarged to about 'term_scale' times its length
+        with made-up names, half of them 2-word phrases
+    '''
+
+    import numpy as np
+    import character_appear as ca
+
+    terms = rule_terms(rules)
+    if characters_filepath:
+        terms = sorted(set(terms) |
+                       set(t.lower() for t in ca.read_text_file(
+                           characters_filepath)))
+
+    # characters whose columns remain after the columns are merged
+    characters_only = set(rules['merges'].values())
+    characters_only |= set(rules['appearances'].keys())
+    characters_only |= {rules['patty']['character'],
+                        rules['patty']['other_character']}
+    characters_only = sorted(characters_only - set(rules['merges'].keys()))
+
+    random_state = np.random.RandomState(seed)
+    made_up = set()
+    n_made_up = int(len(terms) * (term_scale - 1))
+
+    while len(made_up) < n_made_up:
+        word = make_synthetic_word(random_state, random_state.randint(2, 4))
+        if len(made_up) % 2:
+            word = word + ' ' + make_synthetic_word(random_state, 2)
+        made_up.add(word)
+
+    characters_and_more = terms + sorted(made_up)
+
+    return(characters_and_more, characters_only)
+
+
+def make_comic_dates(n_comics, first_date='1950-10-02',
+                     last_date='2000-02-13'):
+    '''
+    Returns list of 'n_comics' sorted, unique comic filenames that start with
+        their dates, spread evenly from 'first_date' to 'last_date'; if there
+        are more comics than days, each day's comics are numbered after the
+        date, e.g., '1950-10-02_03'
+    '''
+
+    import datetime
+    import math
+
+    first = datetime.datetime.strptime(first_date, '%Y-%m-%d').date()
+    last = datetime.datetime.strptime(last_date, '%Y-%m-%d').date()
+    n_days = (last - first).days + 1
+    comics_per_day = int(math.ceil(n_comics / n_days))
+    n_days = int(math.ceil(n_comics / comics_per_day))
+    day_step = ((last - first).days + 1) / n_days
+
+    dates = []
+    for day in range(n_days):
+        date = str(first + datetime.timedelta(days=int(day * day_step)))
+        if comics_per_day == 1:
+            dates.append(date)
+        else:
+            dates.extend('{0}_{1:02d}'.format(date, k)
+                         for k in range(comics_per_day))
+
+    return(dates[:n_comics])
+
+
+def make_synthetic_table(n_panels, terms, seed=0, mention_rate=0.15,
+                         odd_quotes_rate=0.03, no_quotes_rate=0.45):
+    '''
+    Returns synthetic table/Pandas DataFrame of about 'n_panels' rows with the
+        columns of 'expanded_table.csv'
+    Daily comics have 1 to 4 panels, and every seventh comic (Sunday) has up
+        to 8; the panel texts mix filler words with words/phrases from
+        'terms' (each word of a panel is a term with probability
+        'mention_rate'), sometimes possessive or capitalized
+    'odd_quotes_rate' and 'no_quotes_rate' - proportions of panels with an
+        odd number of double-quotes and with no double-quotes; panels with no
+        double-quotes have no talk text
+    '''
+
+    import numpy as np
+    import pandas as pd
+
+    random_state = np.random.RandomState(seed)
+
+    filler = ['the', 'a', 'and', 'is', 'says', 'good', 'grief', 'dog',
+              'house', 'kite', 'tree', 'ball', 'baseball', 'game', 'team',
+              'piano', 'blanket', 'football', 'school', 'teacher', 'his',
+              'her', 'with', 'looks', 'at', 'on', 'top', 'of', 'sighs',
+              'walks', 'away', 'thinks', 'that', 'it', 'to', 'outside']
+    filler = np.array(filler, dtype=object)
+    terms = np.array(terms, dtype=object)
+    suffixes = np.array(['', '', '', '', "'s", '.', ','], dtype=object)
+
+    # comics and their numbers of panels
+    n_comics_guess = n_panels // 2 + 1
+    num_panels = random_state.randint(1, 5, n_comics_guess)
+    num_panels[6::7] = random_state.randint(5, 9, len(num_panels[6::7]))
+    n_comics = np.searchsorted(np.cumsum(num_panels), n_panels) + 1
+    num_panels = num_panels[:n_comics]
+    dates = make_comic_dates(n_comics)
+    n_rows = int(num_panels.sum())
+
+    def make_texts(n_texts, max_words):
+        n_words = random_state.randint(0, max_words + 1, n_texts)
+        total = int(n_words.sum())
+        is_term = random_state.rand(total) < mention_rate
+        words = filler[random_state.randint(len(filler), size=total)]
+        words[is_term] = terms[random_state.randint(len(terms),
+                                                    size=is_term.sum())]
+        capitalized = random_state.rand(total) < 0.1
+        words[capitalized] = [w.title() for w in words[capitalized]]
+        words = words + suffixes[random_state.randint(len(suffixes),
+                                                      size=total)]
+        stops = np.cumsum(n_words)
+        starts = stops - n_words
+        return([' '.join(words[starts[i]:stops[i]]) for i in range(n_texts)])
+
+    text = make_texts(n_rows, 14)
+    nontalk = make_texts(n_rows, 6)
+    talk = make_texts(n_rows, 8)
+
+    quotes = random_state.rand(n_rows)
+    odd_quotes = (quotes < odd_quotes_rate).astype(np.int64)
+    no_quotes = ((quotes >= odd_quotes_rate) &
+                 (quotes < odd_quotes_rate + no_quotes_rate)).astype(np.int64)
+
+    table = pd.DataFrame({
+        'filename': np.repeat(np.array(dates, dtype=object), num_panels),
+        'panel': np.concatenate([np.arange(n) for n in num_panels]),
+        'num_panels': np.repeat(num_panels, num_panels),
+        'text_by_panels': text,
+        'text_spell_corrected': text,
+        'comics_speakers': [['']] * n_rows,
+        'text_nontalk': [[t] for t in nontalk],
+        'text_talk': [[''] if no_quotes[i] else [talk[i]]
+                      for i in range(n_rows)],
+        'odd_quotes': odd_quotes,
+        'no_quotes': no_quotes},
+        columns=['filename', 'panel', 'num_panels', 'text_by_panels',
+                 'text_spell_corrected', 'comics_speakers', 'text_nontalk',
+                 'text_talk', 'odd_quotes', 'no_quotes'])
+
+    return(table)
+
+
+def write_synthetic_corpus(corpus_path, n_panels, rules,
+                           characters_filepath=None, term_scale=1, seed=0):
+    '''
+    Writes a synthetic corpus of about 'n_panels' panels (see
+        'make_synthetic_table') into the folders that 'character_appear.main'
+        reads from:  the table in '07_separate_talk', Peppermint Patty's dates
+        in '06_character_talk' and the lists of words/phrases in 'work', the
+        folder that 'main' runs in
+    Returns the path of the 'work' folder
+    '''
+
+    import os
+    import numpy as np
+    import character_appear as ca
+
+    characters_and_more, characters_only = make_term_lists(
+        rules, characters_filepath, term_scale, seed)
+    table = make_synthetic_table(n_panels, characters_and_more, seed)
+
+    # Peppermint Patty appears on some of the dates between 1966 and 1980
+    dates = table['filename'].unique()
+    patty_dates = dates[(dates >= '1966') & (dates < '1980')]
+    n_patty_dates = max(rules['patty']['n_reassigned_dates'] + 1,
+                        len(patty_dates) // 20)
+    patty_dates = patty_dates[np.linspace(0, len(patty_dates) - 1,
+                                          n_patty_dates).astype(np.int64)]
+
+    paths = {}
+    for folder in ['07_separate_talk', '06_character_talk', 'work']:
+        paths[folder] = os.path.join(corpus_path, folder)
+        os.makedirs(paths[folder], exist_ok=True)
+
+    table.to_csv(os.path.join(paths['07_separate_talk'], 'expanded_table.csv'),
+                 sep='^', index=False)
+    ca.write_list_to_text_file(
+        list(patty_dates),
+        os.path.join(paths['06_character_talk'], 'peppermint_patty_dates.txt'),
+        'w')
+    ca.write_list_to_text_file(
+        characters_only, os.path.join(paths['work'], 'characters_only.txt'),
+        'w')
+    ca.write_list_to_text_file(
+        characters_and_more,
+        os.path.join(paths['work'], 'characters_and_more.txt'), 'w')
+
+    return(paths['work'])
+
+
+def time_call(function, make_arguments, repeat):
+    '''
+    Calls 'function' with the arguments returned by 'make_arguments' (which
+        are made anew for each call, since some functions change their
+        arguments) 'repeat' times
+    Returns the shortest wall time of the calls and the result of the last
+        call
+    '''
+
+    import time
+
+    times = []
+
+    for _ in range(repeat):
+        arguments = make_arguments()
+        start = time.perf_counter()
+        result = function(*arguments)
+        times.append(time.perf_counter() - start)
+
+    return(min(times), result)
+
+
+def copy_counts(counts):
+    '''
+    Returns copy of the stacked 'CountMatrix' 'counts'
+    '''
+
+    import character_appear as ca
+
+    return(ca.CountMatrix(counts.bits.copy(), list(counts.columns)))
+
+
+def digest_counts(counts):
+    '''
+    Returns hexadecimal digest of the columns and the counts of 'counts'
+    '''
+
+    import hashlib
+
+    digest = hashlib.sha256('\n'.join(counts.columns).encode())
+    digest.update(counts.bits.tobytes())
+
+    return(digest.hexdigest())
+
+
+def digest_output_files(work_path):
+    '''
+    Returns hexadecimal digest of the result tables that 'main' saved in
+        'work_path'
+    '''
+
+    import hashlib
+    import os
+
+    digest = hashlib.sha256()
+    filenames = sorted(f for f in os.listdir(work_path)
+                       if (f.startswith('counts_') or
+                           f.startswith('proportions_')))
+
+    for filename in filenames:
+        digest.update(filename.encode())
+        with open(os.path.join(work_path, filename), 'rb') as result_file:
+            digest.update(result_file.read())
+
+    return(digest.hexdigest())
+
+
+def benchmark_corpus(work_path, rules, repeat=3, workers=1):
+    '''
+    Times the steps of 'character_appear' on the corpus in 'work_path' (see
+        'write_synthetic_corpus'), one at a time and then together in 'main'
+    Returns dictionary of the number of panels, the shortest time of each
+        step and the digests of the results of the steps and of 'main'
+    '''
+
+    import os
+    import character_appear as ca
+
+    text_col_names = ['comics_speakers', 'text_nontalk', 'text_talk']
+    table_filepath = os.path.join(os.path.dirname(work_path),
+                                  '07_separate_talk', 'expanded_table.csv')
+    characters = ca.read_text_file(os.path.join(work_path,
+                                                'characters_and_more.txt'))
+    characters = ca.add_possessives_to_word_list([s.lower()
+                                                  for s in characters])
+    pep_patty_dates = ca.read_text_file(os.path.join(
+        os.path.dirname(work_path), '06_character_talk',
+        'peppermint_patty_dates.txt'))
+    misidentifications = [[m['date'], m['incorrect'], m['correct']]
+                          for m in rules['misidentifications']]
+
+    times = {}
+    times['read_table'], table = time_call(
+        ca.read_table, lambda: (table_filepath, text_col_names), repeat)
+    table['text_spell_corrected'] = table['text_spell_corrected'].fillna('')
+    dates_column = table['filename']
+    date_index = ca.build_date_index(dates_column)
+
+    times['count_characters'], counts = time_call(
+        ca.count_characters, lambda: (table, characters, workers), repeat)
+    times['counts_summary_table'], _ = time_call(
+        ca.counts_summary_table, lambda: (counts, ), repeat)
+
+    steps = [
+        ('merge_characters_multiple_tables',
+         ca.merge_characters_multiple_tables, lambda c: (c, rules)),
+        ('adjust_patty_counts_multiple_tables',
+         ca.adjust_patty_counts_multiple_tables,
+         lambda c: (dates_column, c, pep_patty_dates, date_index,
+                    rules)),
+        ('adjust_counts_by_appearance_dates_multiple_tables',
+         ca.adjust_counts_by_appearance_dates_multiple_tables,
+         lambda c: (dates_column, c, date_index, rules)),
+        ('correct_misidentified_characters_multiple_tables',
+         ca.correct_misidentified_characters_multiple_tables,
+         lambda c: (dates_column, c, misidentifications, date_index)),
+        ('snoopy_and_personas_multiple_tables',
+         ca.snoopy_and_personas_multiple_tables, lambda c: (c, rules))]
+
+    for step_name, function, make_arguments in steps:
+        times[step_name], counts = time_call(
+            function, lambda: make_arguments(copy_counts(counts)), repeat)
+
+    characters_only = ca.read_text_file(os.path.join(work_path,
+                                                     'characters_only.txt'))
+    panels_with_characters = ca.count_matrix_rows_with_any(
+        ca.count_matrix_view(counts, 0), characters_only)
+    times['counts_by_comic_multiple_tables'], _ = time_call(
+        ca.counts_by_comic_multiple_tables,
+        lambda: (dates_column, table['num_panels'], panels_with_characters,
+                 counts, date_index), repeat)
+
+    # 'main' runs in the 'work' folder and reads from its sibling folders
+    current_path = os.getcwd()
+    os.chdir(work_path)
+    try:
+        times['main'], _ = time_call(ca.main, lambda: (workers, ), 1)
+    finally:
+        os.chdir(current_path)
+
+    result = {'n_panels': len(table), 'n_terms': len(characters),
+              'seconds': times, 'counts_digest': digest_counts(counts),
+              'output_digest': digest_output_files(work_path)}
+
+    return(result)
+
+
+def environment_description():
+    '''
+    Returns dictionary describing the machine and the versions of the
+        libraries that the benchmarks ran with
+    '''
+
+    import os
+    import platform
+    import numpy as np
+    import pandas as pd
+
+    environment = {'python': platform.python_version(),
+                   'numpy': np.__version__, 'pandas': pd.__version__,
+                   'machine': platform.machine(),
+                   'system': platform.system(), 'cpus': os.cpu_count()}
+
+    return(environment)
+
+
+def compare_to_baseline(results, baseline, tolerance=0.2, min_seconds=0.05):
+    '''
+    Compares benchmark 'results' to those of an earlier run, 'baseline'
+    Returns list of lines that report the time of each step relative to the
+        baseline and whether its results are the same, and whether any step
+        is slower than the baseline by more than 'tolerance' (as a proportion)
+        or has different results
+    Steps that are slower by less than 'min_seconds' are not reported as
+        slower, since the times of very short steps vary too much
+    '''
+
+    lines = []
+    failed = False
+
+    for size, result in sorted(results['sizes'].items(),
+                               key=lambda s: int(s[0])):
+        if size not in baseline['sizes']:
+            lines.append('{0} panels:  no baseline'.format(size))
+            continue
+        base = baseline['sizes'][size]
+
+        lines.append('{0} panels:'.format(size))
+        for step_name, seconds in result['seconds'].items():
+            base_seconds = base['seconds'].get(step_name)
+            if not base_seconds:
+                lines.append('    {0:<52} {1:9.3f} s    (no baseline)'
+                             .format(step_name, seconds))
+                continue
+            ratio = seconds / base_seconds
+            slower = (ratio > 1 + tolerance and
+                      seconds - base_seconds > min_seconds)
+            failed = failed or slower
+            lines.append('    {0:<52} {1:9.3f} s  {2:6.2f}x baseline{3}'
+                         .format(step_name, seconds, ratio,
+                                 '  SLOWER' if slower else ''))
+
+        for digest in ['counts_digest', 'output_digest']:
+            if result[digest] != base.get(digest):
+                failed = True
+                lines.append('    {0} differs from baseline'.format(digest))
+
+    return(lines, failed)
+
+
+def main(sizes=(10000, 100000, 1000000), repeat=3, workers=1, term_scale=1,
+         characters_filepath=None, baseline_filepath='benchmark_baseline.json',
+         save_baseline=False, tolerance=0.2, corpus_path=None, seed=0):
+    '''
+    Generates a synthetic corpus of each size in 'sizes' (numbers of panels),
+        times the steps of 'character_appear' on it (see 'benchmark_corpus')
+        and compares the times and results to the baseline in
+        'baseline_filepath', if it exists
+    'save_baseline' - if 'True', the results are saved as the new baseline
+        instead
+    'corpus_path' - folder where the corpora are generated; a temporary folder
+        that is deleted afterwards by default
+    Returns 'True' if no step was slower than 'tolerance' allows and all
+        results matched the baseline
+    '''
+
+    import json
+    import os
+    import shutil
+    import tempfile
+    import character_appear as ca
+
+    rules = ca.load_correction_rules()
+    results = {'environment': environment_description(), 'repeat': repeat,
+               'workers': workers, 'term_scale': term_scale, 'seed': seed,
+               'sizes': {}}
+
+    temporary = corpus_path is None
+    if temporary:
+        corpus_path = tempfile.mkdtemp(prefix='peanuts_benchmark_')
+
+    try:
+        for size in sizes:
+            size_path = os.path.join(corpus_path, 'panels_{0}'.format(size))
+            work_path = write_synthetic_corpus(size_path, size, rules,
+                                               characters_filepath,
+                                               term_scale, seed)
+            results['sizes'][str(size)] = benchmark_corpus(work_path, rules,
+                                                           repeat, workers)
+            print('{0} panels:  {1:.3f} s in main'.format(
+                size, results['sizes'][str(size)]['seconds']['main']))
+    finally:
+        if temporary:
+            shutil.rmtree(corpus_path, ignore_errors=True)
+
+    if save_baseline or not os.path.exists(baseline_filepath):
+        with open(baseline_filepath, 'w') as json_file:
+            json.dump(results, json_file, indent=4, sort_keys=True)
+        print('Saved baseline to {0}'.format(baseline_filepath))
+        return(True)
+
+    with open(baseline_filepath) as json_file:
+        baseline = json.load(json_file)
+
+    if baseline.get('environment') != results['environment']:
+        print('NOTE:  the baseline was run in a different environment:  '
+              '{0}'.format(baseline.get('environment')))
+    lines, failed = compare_to_baseline(results, baseline, tolerance)
+    print('\n'.join(lines))
+
+    return(not failed)
+
+
+def parse_command_line_arguments():
+    '''
+    Parses options for 'main' from the command line
+    '''
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Times character_appear.py on synthetic corpora and '
+                    'compares the times and results to a baseline')
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10000, 100000, 1000000],
+                        help='numbers of panels of the synthetic corpora')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='times each step is run; the fastest counts')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of processes that count the characters')
+    parser.add_argument('--term-scale', type=float, default=1,
+                        help='enlarge the list of searched-for words to this '
+                             'many times its length with made-up names')
+    parser.add_argument('--characters', dest='characters_filepath',
+                        default=None,
+                        help='list of searched-for words to add to those of '
+                             'the correction rules, e.g., '
+                             'characters_and_more.txt')
+    parser.add_argument('--baseline', dest='baseline_filepath',
+                        default='benchmark_baseline.json',
+                        help='json file of the baseline results (default: '
+                             'benchmark_baseline.json)')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='save the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='proportion by which a step may be slower than '
+                             'the baseline (default: 0.2)')
+    parser.add_argument('--corpus-path', default=None,
+                        help='folder to generate the corpora in and keep them '
+                             '(default: a temporary folder)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='random seed of the synthetic corpora')
+
+    return(parser.parse_args())
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(0 if main(**vars(parse_command_line_arguments())) else 1)
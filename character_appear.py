@@ -1,5 +1,30 @@
 #! /usr/bin/env python3
 
+from collections import namedtuple
+from contextlib import contextmanager
+
+
+# 'bits' is a NumPy 'uint8' array of rows of bit-packed '0'/'1' counts (see
+#   'pack_count_matrix'); 'columns' is the list of the names of the columns
+# 'bits' may have leading axes before the rows; e.g., 'count_characters'
+#   stacks its count tables into a single array of tables x rows x columns,
+#   and every function that takes a 'CountMatrix' applies to all tables at once
+CountMatrix = namedtuple('CountMatrix', ['bits', 'columns'])
+
+# rules and compiled inputs that this process has already read, by the files
+#   that they were read from and the sizes and modification times of the files
+#   (see 'load_correction_rules' and 'load_compiled_inputs'), and the hash of
+#   this module's source (see 'source_code_version')
+loaded_files_cache = {}
+
+# regular expression of the 'regex' tokenizer, compiled once per process (see
+#   'compile_word_pattern')
+word_pattern_cache = {}
+
+# English dictionary of 'enchant', loaded once per process (see
+#   'load_english_dictionary')
+dictionary_cache = {}
+
 
 def get_sibling_directory_path(sibling_directory_name):
     '''
@@ -29,6 +54,197 @@ def print_intermittent_status_message_in_loop(iteration, every_xth_iteration,
                     100 * (iteration + 1) / total_iterations))
 
 
+def new_run_report(profile=None):
+    '''
+    Returns a new, empty run report, which records the time, memory and rows of
+        each stage of a run (see 'report_stage') until it is saved (see
+        'write_run_report')
+    'profile' - 'cprofile' to also profile the function calls of each stage
+        with 'cProfile', 'tracemalloc' to also trace the memory allocations of
+        each stage with 'tracemalloc', or 'None'
+    '''
+
+    import time
+
+    if profile not in (None, 'cprofile', 'tracemalloc'):
+        raise ValueError("'profile' must be 'cprofile', 'tracemalloc' or "
+                         "'None'")
+
+    if profile == 'tracemalloc':
+        import tracemalloc
+        tracemalloc.start()
+
+    report = {'profile': profile, 'stages': {}, 'stage_order': [],
+              'profilers': {}, 'start_wall': time.time(),
+              'start_perf': time.perf_counter(), 'start_cpu': cpu_seconds()}
+
+    return(report)
+
+
+def cpu_seconds():
+    '''
+    Returns the user and system CPU time of this process and of its finished
+        child processes (e.g., the workers of 'count_characters_in_parallel')
+    '''
+
+    import os
+
+    times = os.times()
+
+    return(times[0] + times[1] + times[2] + times[3])
+
+
+def peak_rss_kb():
+    '''
+    Returns peak resident memory of this process and of the largest of its
+        finished child processes, in kilobytes, or 'None' if the platform
+        doesn't report it
+    '''
+
+    import sys
+
+    try:
+        import resource
+    except ImportError:
+        return(None, None)
+
+    # 'ru_maxrss' is in bytes on macOS and in kilobytes elsewhere
+    scale = 1024 if sys.platform == 'darwin' else 1
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss // scale
+
+    return(own, children)
+
+
+@contextmanager
+def report_stage(report, stage_name):
+    '''
+    Context manager that records the wall time, CPU time and peak resident
+        memory of the code that it runs as the stage 'stage_name' of 'report'
+        (see 'new_run_report'); a stage that runs several times (e.g., once per
+        chunk) is recorded as the total of its runs
+    The context manager provides a dictionary where the number of rows that
+        the stage processed can be set as 'rows'
+    If 'report' is 'None', nothing is recorded
+    '''
+
+    import time
+
+    stage_rows = {}
+
+    if report is None:
+        yield(stage_rows)
+        return
+
+    if stage_name not in report['stages']:
+        report['stage_order'].append(stage_name)
+        report['stages'][stage_name] = {
+            'calls': 0, 'rows': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0,
+            'peak_rss_kb': None, 'peak_children_rss_kb': None}
+    stage = report['stages'][stage_name]
+
+    if report['profile'] == 'cprofile':
+        import cProfile
+        profiler = report['profilers'].setdefault(stage_name,
+                                                  cProfile.Profile())
+        profiler.enable()
+    elif report['profile'] == 'tracemalloc':
+        import tracemalloc
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        start_snapshot = tracemalloc.take_snapshot()
+
+    start_wall = time.perf_counter()
+    start_cpu = cpu_seconds()
+
+    try:
+        yield(stage_rows)
+
+    finally:
+        stage['wall_seconds'] += time.perf_counter() - start_wall
+        stage['cpu_seconds'] += cpu_seconds() - start_cpu
+        stage['calls'] += 1
+        stage['rows'] += stage_rows.get('rows', 0)
+        stage['peak_rss_kb'], stage['peak_children_rss_kb'] = peak_rss_kb()
+
+        if report['profile'] == 'cprofile':
+            profiler.disable()
+        elif report['profile'] == 'tracemalloc':
+            traced_peak = tracemalloc.get_traced_memory()[1] // 1024
+            stage['traced_peak_kb'] = max(stage.get('traced_peak_kb', 0),
+                                          traced_peak)
+            differences = tracemalloc.take_snapshot().compare_to(
+                start_snapshot, 'lineno')
+            stage['top_allocations'] = [str(d) for d in differences[:10]]
+
+
+def report_stage_iterations(report, stage_name, iterable, count_rows=None):
+    '''
+    Yields the items of 'iterable', recording the time that it takes to
+        produce each item (e.g., to read a chunk of a table) as the stage
+        'stage_name' of 'report' (see 'report_stage')
+    'count_rows' - function that returns the number of rows in an item
+    '''
+
+    iterator = iter(iterable)
+    finished = object()
+
+    while True:
+        with report_stage(report, stage_name) as stage:
+            item = next(iterator, finished)
+            if item is not finished and count_rows is not None:
+                stage['rows'] = count_rows(item)
+
+        if item is finished:
+            return
+
+        yield(item)
+
+
+def write_run_report(report, report_filepath='run_report.json'):
+    '''
+    Saves 'report' (see 'new_run_report') as a 'json' file, with the total
+        time and memory of the run and, in the order that the stages first
+        ran, the wall time, CPU time, rows per second and peak resident memory
+        of each stage
+    If the stages were profiled with 'cProfile', the profile of each stage is
+        saved to its own file, which can be read with 'pstats'; the name of
+        the file is in the stage's report
+    '''
+
+    import json
+    import time
+
+    stages = []
+
+    for stage_name in report['stage_order']:
+        stage = dict(report['stages'][stage_name])
+        stage['stage'] = stage_name
+        if stage['rows'] and stage['wall_seconds'] > 0:
+            stage['rows_per_second'] = stage['rows'] / stage['wall_seconds']
+        else:
+            stage['rows_per_second'] = None
+
+        if stage_name in report['profilers']:
+            profile_filepath = 'profile_{0}.prof'.format(
+                stage_name.replace(' ', '_'))
+            report['profilers'][stage_name].dump_stats(profile_filepath)
+            stage['profile_file'] = profile_filepath
+
+        stages.append(stage)
+
+    own_rss, children_rss = peak_rss_kb()
+    run = {'started': time.strftime('%Y-%m-%dT%H:%M:%S',
+                                    time.localtime(report['start_wall'])),
+           'wall_seconds': time.perf_counter() - report['start_perf'],
+           'cpu_seconds': cpu_seconds() - report['start_cpu'],
+           'peak_rss_kb': own_rss, 'peak_children_rss_kb': children_rss,
+           'profile': report['profile']}
+
+    with open(report_filepath, 'w') as json_file:
+        json.dump({'run': run, 'stages': stages}, json_file, indent=4)
+
+
 def read_table(table_filepath, column_of_lists):
     '''
     reads table from 'csv' file
@@ -47,6 +263,155 @@ def read_table(table_filepath, column_of_lists):
     return(table)
 
 
+def write_columnar_table(table, columnar_filepath, source_filepath):
+    '''
+    Writes 'table' to the uncompressed Arrow/Feather file 'columnar_filepath',
+        with columns of lists stored as Arrow list columns
+    The size and modification time of 'source_filepath', the file that 'table'
+        was read from, are stored in the file's metadata, so that
+        'read_columnar_table' can tell when the file is out of date
+    '''
+
+    import os
+    import pyarrow as pa
+
+    source_stat = os.stat(source_filepath)
+    metadata = {b'source_size': str(source_stat.st_size).encode(),
+                b'source_mtime': repr(source_stat.st_mtime).encode()}
+
+    arrow_table = pa.Table.from_pandas(table, preserve_index=False)
+    metadata.update(arrow_table.schema.metadata or {})
+    arrow_table = arrow_table.replace_schema_metadata(metadata)
+
+    # uncompressed, so that the file can be memory-mapped without copying
+    with pa.OSFile(columnar_filepath, 'wb') as sink:
+        writer = pa.ipc.new_file(sink, arrow_table.schema)
+        writer.write_table(arrow_table)
+        writer.close()
+
+
+def read_columnar_table(columnar_filepath, source_filepath, column_of_lists):
+    '''
+    Reads table from the Arrow/Feather file 'columnar_filepath' written by
+        'write_columnar_table' by memory-mapping it
+    Returns 'None' if the file doesn't exist or if 'source_filepath' has
+        changed since the file was written
+    Each item in the columns 'column_of_lists' is returned as a NumPy array of
+        strings instead of the list that 'read_table' returns (see
+        'join_row_text')
+    '''
+
+    import os
+    import pyarrow as pa
+
+    if not os.path.exists(columnar_filepath):
+        return(None)
+
+    source_stat = os.stat(source_filepath)
+    arrow_table = pa.ipc.open_file(
+        pa.memory_map(columnar_filepath, 'r')).read_all()
+    metadata = arrow_table.schema.metadata or {}
+
+    source_size = str(source_stat.st_size).encode()
+    source_mtime = repr(source_stat.st_mtime).encode()
+    if (metadata.get(b'source_size') != source_size or
+            metadata.get(b'source_mtime') != source_mtime):
+        return(None)
+
+    table = arrow_table.to_pandas()
+
+    return(table)
+
+
+def read_expanded_table(table_filepath, column_of_lists,
+                        columnar_filepath='expanded_table.arrow'):
+    '''
+    Reads table from the columnar file 'columnar_filepath' (see
+        'read_columnar_table') if it is up to date with the 'csv' file
+        'table_filepath'; otherwise, reads the 'csv' file (see 'read_table')
+        and writes the columnar file so that later runs can read it
+    If the Arrow library 'pyarrow' isn't installed, the 'csv' file is always
+        read
+    Returns the table and whether it was read from the 'csv' file
+    '''
+
+    from importlib.util import find_spec
+
+    if find_spec('pyarrow') is None:
+        return(read_table(table_filepath, column_of_lists), True)
+
+    table = read_columnar_table(columnar_filepath, table_filepath,
+                                column_of_lists)
+
+    if table is not None:
+        return(table, False)
+
+    table = read_table(table_filepath, column_of_lists)
+    write_columnar_table(table, columnar_filepath, table_filepath)
+
+    return(table, True)
+
+
+def read_table_in_chunks(table_filepath, column_of_lists, chunk_rows):
+    '''
+    Reads table from 'csv' file (see 'read_table') about 'chunk_rows' rows at a
+        time, so that the whole table is never in memory at once
+    Yields the table in chunks of rows, in order; the rows must be sorted by
+        date/filename, and all panels of a comic are yielded in the same
+        chunk:  the rows of the last date read are held back and yielded with
+        the next chunk
+    Yields tuples of the row number of the first row of the chunk in the
+        whole table and the chunk, with its rows numbered from '0', as
+        'read_table' numbers them
+    A table without rows is yielded as a single empty chunk, so that its
+        results are saved as those of any other table
+    '''
+
+    import numpy as np
+    import pandas as pd
+    from ast import literal_eval
+
+    converters = {column: literal_eval for column in column_of_lists}
+    reader = pd.read_csv(table_filepath, sep='^', converters=converters,
+                         chunksize=chunk_rows)
+    held_back = None
+    empty_table = None
+    last_date = None
+    first_row = 0
+
+    for table in reader:
+        if held_back is not None:
+            table = pd.concat([held_back, table])
+
+        if len(table) == 0:
+            empty_table = table
+            continue
+
+        dates = table['filename'].values
+        first_held_back_row = np.argmax(dates == dates[-1])
+        held_back = table.iloc[first_held_back_row:]
+        table = table.iloc[:first_held_back_row]
+
+        if len(table) == 0:
+            continue
+        if last_date is not None and table['filename'].values[0] <= last_date:
+            raise ValueError('Rows must be sorted by date, with all panels of '
+                             'a comic in adjacent rows')
+        last_date = table['filename'].values[-1]
+
+        yield(first_row, table.reset_index(drop=True))
+        first_row += len(table)
+
+    if held_back is not None and len(held_back) > 0:
+        if (last_date is not None and
+                held_back['filename'].values[0] <= last_date):
+            raise ValueError('Rows must be sorted by date, with all panels of '
+                             'a comic in adjacent rows')
+        yield(first_row, held_back.reset_index(drop=True))
+    elif first_row == 0 and empty_table is not None:
+        yield(first_row, empty_table.reset_index(drop=True))
+
+
 def read_text_file(text_filename, as_string=False):
     '''
     reads each line in a text file as a list item and returns list by default
@@ -102,607 +467,3971 @@ def add_possessives_to_word_list(word_list):
     return(words_with_poss)
 
 
-def tally_word_counts_in_column(table_column, word_list, output_len):
+def build_phrase_automaton(phrase_columns):
     '''
-    Inputs:  'table_column' is a Pandas DataSeries where each element is a
-        string (or list of strings) to be searched; 'word_list' is a list of
-        words to search for; 'output_len' is the length of the output table
-        'tallies'
-    Outputs:  a table/DataFrame with each element in 'word_list' as a column
-        name, each row corresponding to each element in 'table_column', and
-        values of '0' or '1' indicating whether that column's 'word_list'
-        element appeared in that row's 'table_column' element; '0' is 'No' and
-        '1' is 'Yes'
-    'word_list' elements that are single words must match a token from the
-        'table_column' string to be considered a match; this prevents words from
-        matching when they are only sub-words in the string (e.g., so that
-        searching for 'hat' in 'that' does not yield a match);
-    'word_list' elements that are multiple words or hyphenated are searched for
-        in the string itself (which can produce the sub-word problem described
-        above)
+    Builds an Aho-Corasick automaton from 'phrase_columns', a dictionary of
+        phrases (keys) and lists of the column indices of each phrase in the
+        word list (values)
+    The automaton is stored as three lists indexed by state number:
+        'goto' - dictionaries mapping a character to the next state
+        'fail' - state to fall back to when a character has no transition
+        'output' - column indices of all phrases that end at the state,
+            including phrases that end at the state's fallback states
+    State '0' is the root, i.e., the empty prefix
     '''
 
-    import pandas as pd
-    from numpy import arange
-    from enchant.tokenize import get_tokenizer
+    goto = [{}]
+    fail = [0]
+    output = [[]]
+
+    # build trie of phrases
+    for phrase, column_indices in phrase_columns.items():
+        state = 0
+        for char in phrase:
+            if char not in goto[state]:
+                goto.append({})
+                fail.append(0)
+                output.append([])
+                goto[state][char] = len(goto) - 1
+            state = goto[state][char]
+        output[state] = output[state] + column_indices
+
+    # set fallback states breadth-first, so that each state's fallback state is
+    #   complete before the state itself is processed
+    queue = list(goto[0].values())
+    position = 0
+
+    while position < len(queue):
+        state = queue[position]
+        position += 1
+
+        for char, next_state in goto[state].items():
+            queue.append(next_state)
+            fallback = fail[state]
+            while fallback and char not in goto[fallback]:
+                fallback = fail[fallback]
+            fail[next_state] = goto[fallback].get(char, 0)
+            output[next_state] = output[next_state] + output[fail[next_state]]
+
+    return((goto, fail, output))
+
+
+def find_phrases_in_text(automaton, text):
+    '''
+    Scans 'text' once with the Aho-Corasick 'automaton' from
+        'build_phrase_automaton' and returns the set of column indices of all
+        phrases that appear anywhere in 'text', including as sub-words (e.g.,
+        'pig pen' is found in 'big pig pens')
+    '''
 
-    tallies = pd.DataFrame(0, index=arange(output_len), columns=word_list)
-    tokenizer = get_tokenizer('en_US')
-    message_interval = 1000
+    goto, fail, output = automaton
+    found = set()
+    state = 0
 
-    for i, text in table_column.iteritems():
+    for char in text:
+        while state and char not in goto[state]:
+            state = fail[state]
+        state = goto[state].get(char, 0)
+        if output[state]:
+            found.update(output[state])
 
-        print_intermittent_status_message_in_loop(i, message_interval,
-                                                  output_len)
+    return(found)
 
-        if isinstance(text, list):  # if text stored in list instead of string
-            if not text[0] and len(text) == 1:
-                continue            # skips empty lists
-            text = ' '.join(text)
 
-        tokens = [w[0].lower() for w in tokenizer(text)]
+def word_deletions(word, max_distance):
+    '''
+    Returns set of the strings made by deleting up to 'max_distance'
+        characters from 'word', including 'word' itself
+    '''
 
-        for j in range(len(word_list)):
+    deletions = {word}
+    edge = {word}
 
-            if (' ' in word_list[j]) or ('-' in word_list[j]):
-                if word_list[j] in text:
-                    tallies.iloc[i, j] = 1
-            else:
-                if word_list[j] in tokens:
-                    tallies.iloc[i, j] = 1
+    for _ in range(max_distance):
+        edge = {w[:i] + w[i+1:] for w in edge for i in range(len(w))}
+        deletions.update(edge)
 
-    return(tallies)
+    return(deletions)
 
 
-def combine_column_pairs(table):
+def edit_distance(word1, word2, max_distance):
     '''
-    Combines each adjacent pair of columns in a dataframe with Boolean 'or' and
-        returns the new table (with half the number of columns as the original
-        table)
+    Returns the number of insertions, deletions, substitutions and
+        transpositions of adjacent characters that change 'word1' into 'word2'
+        (the optimal string alignment distance), or 'max_distance' + 1 if it is
+        more than 'max_distance'
     '''
 
-    import numpy as np
-    import pandas as pd
+    if abs(len(word1) - len(word2)) > max_distance:
+        return(max_distance + 1)
 
-    columns = table.columns.values.tolist()
-    columns = columns[0::2]     # excludes every other element
-    combined_table = pd.DataFrame(0, index=np.arange(len(table)),
-                                  columns=columns)
+    before_previous = None
+    previous = list(range(len(word2) + 1))
 
-    for i in range(len(columns)):
-        combined_table.iloc[:, i] = table.iloc[:, i*2] | table.iloc[:, i*2+1]
+    for i in range(1, len(word1) + 1):
+        current = [i] + [0] * len(word2)
+        for j in range(1, len(word2) + 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1,
+                             previous[j - 1] + (word1[i - 1] != word2[j - 1]))
+            if (i > 1 and j > 1 and word1[i - 1] == word2[j - 2] and
+                    word1[i - 2] == word2[j - 1]):
+                current[j] = min(current[j], before_previous[j - 2] + 1)
+        if min(current) > max_distance:
+            return(max_distance + 1)
+        before_previous, previous = previous, current
 
-    return(combined_table)
+    return(min(previous[-1], max_distance + 1))
 
 
-def count_characters(expanded_table, characters):
+def split_possessive(word):
     '''
-    Performs a series of counts; each count tallies when words from 'characters'
-        appear in a specified column from 'expanded_table'
-    Each count is returned as a table/Pandas DataFrame; each word in
-        'characters' has its own column; each element from the column in
-        'expanded_table' has its own row; if a word appears in a column element,
-        the value is '1', otherwise it's '0'
-    Output:  Each count table is stored as an element in the list 'counts'
+    Returns tuple of 'word' without its possessive ending "'s", if it has one,
+        and the ending, e.g., ('snoopy', "'s") for "snoopy's" and ('snoopy',
+        '') for 'snoopy' (see 'add_possessives_to_word_list')
     '''
 
-    columns_to_count = [expanded_table.ix[:, 'text_spell_corrected'],         # for an overall count
-                        expanded_table.ix[:, 'text_nontalk'],                 # count in text outside double-quotes
-                        expanded_table.ix[:, 'text_talk'],                    # count in text inside double-quotes
-                        expanded_table.ix[expanded_table['odd_quotes'] == 1,  # counts text with odd number of double-quotes
-                                          'text_spell_corrected'],
-                        expanded_table.ix[expanded_table['no_quotes'] == 1,   # counts text with no double-quotes
-                                          'text_spell_corrected']]
-    counts = []
-
-    for i in range(len(columns_to_count)):
-        temp = tally_word_counts_in_column(columns_to_count[i], characters,
-                                           len(expanded_table))
-        counts.append(combine_column_pairs(temp))
+    if word.endswith("'s"):
+        return(word[:-2], word[-2:])
 
-    return(counts)
+    return(word, '')
 
 
-def counts_summary_table(counts):
+def load_english_dictionary():
     '''
-    Returns table of counts for each searched-for word (usually characters),
-        with one word per row; columns show different counts based on which
-        text was counted
+    Returns the English dictionary of 'enchant', which is loaded once per
+        process
+    The matches within edits depend on the dictionary (see
+        'find_fuzzy_matches'), so if 'enchant' isn't installed, an
+        'ImportError' is raised instead of taking no word to be English
     '''
 
-    import pandas as pd
+    if 'dictionary' not in dictionary_cache:
+        try:
+            import enchant
+        except ImportError:
+            raise ImportError("words are matched within edits only with the "
+                              "English dictionary of 'enchant', which isn't "
+                              "installed (see 'environment.yml')")
+        dictionary_cache['dictionary'] = enchant.Dict('en_US')
 
-    a = counts[0].sum()     # overall count, from 'text_spell_corrected' column
-    b = counts[1].sum()     # 'nontalk' count from 'text_nontalk' column
-    c = counts[2].sum()     # 'talk' count from 'text_talk' column
-    d = counts[3].sum()     # 'odd_quotes' count from text panels with an odd number of double-quotes
-    e = counts[4].sum()     # 'no_quotes' count from text panels with no double-quotes
+    return(dictionary_cache['dictionary'])
 
-    f = (counts[1] | counts[2] | counts[3] | counts[4]).sum()   # sums everything except 'overall'; should be identical to 'overall'
 
-    sums = pd.DataFrame(data=[a, b + e, c, d, f]).transpose()   # b + e:  'no_quotes' is classified as 'nontalk'
-    sums.columns = ['overall', 'nontalk', 'talk', 'oddq', 'sum']
-    sums['error'] = ((sums['sum'] / sums['overall']) * 100) - 100  # verify that 'overall' matches 'sum', errors = 0
+def is_dictionary_word(word):
+    '''
+    Returns 'True' if 'word' is in the English dictionary of 'enchant' (see
+        'load_english_dictionary')
+    '''
 
-    return(sums)
+    return(load_english_dictionary().check(word))
 
 
-def characters_merge_dict():
+def build_deletion_index(words, max_distance, min_length):
     '''
-    Creates dictionary of keys naming characters and values of the names that
-        the keys should be reclassified under; this allows the data associated
-        with the keys to be associated with the value
+    Builds an index for finding the 'words' that are within 'max_distance'
+        edits (see 'edit_distance') of a token without comparing the token to
+        every word:  each string made by deleting up to 'max_distance'
+        characters from a word (see 'word_deletions') is a key whose value is
+        the set of words that it was made from (as in 'SymSpell'); a token can
+        be within 'max_distance' edits of a word only if one of its own
+        deletions is a key for the word
+    Possessives are indexed by the word without the possessive (see
+        'split_possessive'), so that the edits are counted in the name itself:
+        otherwise, the ending would make short words long enough to be
+        matched, e.g., "ball's" with "bill's"
+    Words shorter than 'min_length' characters aren't indexed, since a few
+        edits turn short names into common words (e.g., 'lucy' and 'lucky')
+    Returns dictionary of the index ('deletions'), the indexed 'words',
+        'max_distance', 'min_length', and the 'matches' of each token that has
+        been looked up (see 'find_fuzzy_matches')
     '''
 
-    chars = {'charlie'                      : 'charlie brown',
-             'brown'                        : 'charlie brown',
-             'charles'                      : 'charlie brown',
-             'lucy van pelt'                : 'lucy',
-             'linus van pelt'               : 'linus',
-             'sally brown'                  : 'sally',
-             'peggy-jean'                   : 'peggy jean',
-             'pig pen'                      : 'pig-pen',
-             'pigpen'                       : 'pig-pen',
-             'beagle scout'                 : 'beaglescout',
-             'beagle-scout'                 : 'beaglescout',
-             'beagle scouts'                : 'beaglescouts',
-             'beagle-scouts'                : 'beaglescouts',
-             'shlabotnik'                   : 'joe shlabotnik',
-             'molly'                        : 'molly volley',
-             'charlotte'                    : 'charlotte braun',
-             'braun'                        : 'charlotte braun',
-             'crybaby'                      : 'crybaby boobie',
-             'boobie'                       : 'crybaby boobie',
-             'tapioca'                      : 'tapioca pudding',
-             'red haired girl'              : 'red-haired girl',
-             'sweetstory'                   : 'helen sweetstory',
-             'pig-tailed girl'              : 'pigtailed girl',
-             'pig tailed girl'              : 'pigtailed girl',
-             'kindergarten friend'          : 'pigtailed girl',
-             'school building'              : 'the school building',
-             'school thinks'                : 'the school building',
-             'world-famous'                 : 'world famous',
-             'world-famous grocery clerk'   : 'world famous grocery clerk',
-             'world-famous golf'            : 'world famous golf',
-             'legionnaires'                 : 'legionnaire',
-             'kite-eating'                  : 'kite-eating tree',
-             'kite eating tree'             : 'kite-eating tree'}
+    deletions = {}
 
-    return(chars)
+    for word in words:
+        base, _ = split_possessive(word)
+        if len(base) < min_length:
+            continue
+        for deletion in word_deletions(base, max_distance):
+            deletions.setdefault(deletion, set()).add(base)
+
+    fuzzy_index = {'deletions': deletions, 'words': set(words),
+                   'max_distance': max_distance, 'min_length': min_length,
+                   'matches': {}}
 
+    return(fuzzy_index)
 
-def merge_two_columns(count_table, col1_name, col2_name, merged_name):
+
+def find_fuzzy_matches(fuzzy_index, token):
     '''
-    Replaces two columns in a Pandas DataFrame with new column created by a
-        Boolean disjunction ('or') of the original two columns
+    Returns sorted list of the indexed words that are within the index's
+        'max_distance' edits of 'token' (see 'build_deletion_index'), other
+        than 'token' itself
+    The token without its possessive is compared with the indexed words
+        without theirs (see 'split_possessive'), and matches only the words
+        with the same ending, e.g., "snopy's" matches "snoopy's" but not
+        'snoopy'; a token that is an English word (see 'is_dictionary_word')
+        is taken to be that word, not a typo, and matches nothing
+    The matches of each token are looked up once and kept in the index, since
+        the same tokens appear in many texts
     '''
 
-    col1 = count_table[col1_name]
-    col2 = count_table[col2_name]
+    if token in fuzzy_index['matches']:
+        return(fuzzy_index['matches'][token])
 
-    count_table.drop(col1_name, axis=1, inplace=True)
-    count_table.drop(col2_name, axis=1, inplace=True)
-    count_table[merged_name] = col1 | col2
+    max_distance = fuzzy_index['max_distance']
+    base, ending = split_possessive(token)
+    matches = []
 
-    return(count_table)
+    if (len(base) >= fuzzy_index['min_length'] - max_distance and
+            not is_dictionary_word(base)):
+        candidates = set()
+        for deletion in word_deletions(base, max_distance):
+            candidates.update(fuzzy_index['deletions'].get(deletion, ()))
+        matches = sorted(word + ending for word in candidates
+                         if word + ending != token and
+                         word + ending in fuzzy_index['words'] and
+                         edit_distance(base, word, max_distance) <=
+                         max_distance)
 
+    fuzzy_index['matches'][token] = matches
 
-def find_two_columns_to_merge(column_names, merge_dict):
+    return(matches)
+
+
+def compile_word_matcher(word_list, max_distance=0, min_length=5):
     '''
-    searches in 'column_names' for the names of two columns to be merged
-    a column should be merged if it's a key in 'merge_dict'; the key's value
-        is the new name for the merged column
-    if the new name is itself already a column, the column should be merged
-        with this existing 'new name' column
-    if the new name is not already a column, then search for a 2nd column that
-        has the same new name listed as a value in 'merge_dict' as the 1st
-        column did; if such a 2nd column is found, merge the 1st and 2nd columns
-        under the shared new name
-    returns the names of the two columns to be merged and the new name for the
-        merged column
+    Compiles 'word_list' once into a matcher that finds all of its elements in
+        a text with a single pass over the text's tokens and a single pass over
+        the text itself
+    'word_list' elements that are single words are stored in a dictionary
+        lookup of tokens; elements that are multiple words or hyphenated are
+        compiled into an Aho-Corasick automaton (see 'build_phrase_automaton')
+    Values in the matcher are lists of column indices, so that words that
+        appear in 'word_list' more than once are matched in each of their
+        columns
+    'max_distance' - if more than '0', single words of at least 'min_length'
+        characters, not counting a possessive ending, also match tokens within
+        'max_distance' edits of them that aren't English words, e.g., typos
+        (see 'build_deletion_index' and 'find_fuzzy_matches'); multiple or
+        hyphenated words are matched only exactly
+        The English words are those of the dictionary of 'enchant', so
+        'enchant' must be installed (see 'load_english_dictionary')
     '''
 
-    for i in range(len(column_names)):
+    word_columns = {}
+    phrase_columns = {}
+
+    for j in range(len(word_list)):
+        if (' ' in word_list[j]) or ('-' in word_list[j]):
+            phrase_columns.setdefault(word_list[j], []).append(j)
+        else:
+            word_columns.setdefault(word_list[j], []).append(j)
 
-        col1_name = column_names[i]
+    if phrase_columns:
+        phrase_automaton = build_phrase_automaton(phrase_columns)
+    else:
+        phrase_automaton = None
 
-        if col1_name not in merge_dict:
-            continue
+    if max_distance > 0:
+        # the dictionary is loaded before any text is searched, so that a
+        #   missing 'enchant' stops the run at once
+        load_english_dictionary()
+        fuzzy_index = build_deletion_index(word_columns.keys(), max_distance,
+                                           min_length)
+    else:
+        fuzzy_index = None
 
-        # find a column in 'merge_dict' to be merged; identify its new, merged name
-        col1_new_name = merge_dict[col1_name]
+    matcher = {'word_columns': word_columns,
+               'phrase_automaton': phrase_automaton,
+               'fuzzy_index': fuzzy_index,
+               'word_list': word_list}
 
-        # if the new name is already a column
-        if col1_new_name in column_names:
+    return(matcher)
 
-            # merge the two columns together under the new name
-            return(col1_name, col1_new_name, col1_new_name)
 
-        # if the new name is not already a column
-        else:
+def match_words_in_text(matcher, text, tokens, fuzzy_hits=None):
+    '''
+    Returns set of column indices of the words from the matcher (see
+        'compile_word_matcher') that appear in 'text'
+    'tokens' are the lower-cased tokens of 'text'; single words must match a
+        token, while multiple words or hyphenated words are searched for in
+        'text' itself
+    If the matcher matches words within some edits of the tokens, tokens that
+        don't match any word exactly are looked up in its fuzzy index (see
+        'find_fuzzy_matches'); a column that is matched only this way is
+        appended to 'fuzzy_hits', if given, as a tuple of the column index and
+        the token, so that fuzzy matches can be audited
+    '''
+
+    word_columns = matcher['word_columns']
+    fuzzy_index = matcher.get('fuzzy_index')
+    found = set()
+    unmatched_tokens = []
 
-            # find a 2nd column...
-            for j in range(i + 1, len(column_names)):
+    for token in set(tokens):
+        if token in word_columns:
+            found.update(word_columns[token])
+        elif fuzzy_index is not None:
+            unmatched_tokens.append(token)
 
-                col2_name = column_names[j]
+    if matcher['phrase_automaton']:
+        found.update(find_phrases_in_text(matcher['phrase_automaton'], text))
 
-                # ...that should be merged...
-                if col2_name in merge_dict:
+    # sorted, so that the token of a column that several tokens match is
+    #   always the same
+    for token in sorted(unmatched_tokens):
+        for word in find_fuzzy_matches(fuzzy_index, token):
+            for j in word_columns[word]:
+                if j not in found:
+                    found.add(j)
+                    if fuzzy_hits is not None:
+                        fuzzy_hits.append((j, token))
 
-                    col2_new_name = merge_dict[col2_name]
+    return(found)
 
-                    # ...and has same new name as the 1st column
-                    if col1_new_name == col2_new_name:
 
-                        # merge the two columns together under the shared new name
-                        return(col1_name, col2_name, col1_new_name)
+def pack_count_matrix(values, columns):
+    '''
+    Packs 'values', a NumPy array of Boolean or '0'/'1' counts with one column
+        for each element in 'columns', into a 'CountMatrix'
+    Each row of 8 columns is stored in a single byte, so the 'CountMatrix'
+        uses 1/64th of the memory of the same counts stored as 'int64'
+    The columns are the last axis of 'values', so that any leading axes (e.g.,
+        one for several count tables) are kept
+    '''
+
+    import numpy as np
 
-                    else:
-                        continue
+    bits = np.packbits(np.asarray(values).astype(bool), axis=-1)
 
-    # if no columns are found, return empty strings
-    return('', '', '')
+    return(CountMatrix(bits, list(columns)))
 
 
-def merge_character_counts_into_single_columns(count_table):
+def stack_count_matrices(count_matrices):
     '''
-    Inputs:  'count_table' is a table/Pandas DataFrame that tallies whether a
-        word or phrase (naming characters) appeared in items of text; each word
-        has its own column; each row corresponds to an item of text; if a word
-        appeared in a text item, the corresponding cell in the 'count_table'
-        is '1', otherwise it's '0'
-    Merges columns in 'count_table' as specified in the dictionary
-        'characters_merge', which names the columns to be merged (keys) and the
-        names of the new, merged columns (values)
-    The original columns that are merged are deleted from the 'count_table',
-        while the new, merged columns are added to the table
-    This allows characters with alternate spellings or names (e.g., 'Pig-Pen'
-        and 'Pig Pen' to be reclassified under a single column
-    Output:  'count_table' with the new, merged columns
+    Stacks a list of 'CountMatrix' with the same rows and columns into a
+        single 'CountMatrix' with a leading axis for the list
     '''
 
-    characters_merge = characters_merge_dict()
-    i = 0       # ensures termination of loop in case of unanticipated error
+    import numpy as np
 
-    while i < count_table.shape[1]:
+    bits = np.stack([count_matrix.bits for count_matrix in count_matrices])
 
-        col1_name, col2_name, new_name = find_two_columns_to_merge(
-            count_table.columns, characters_merge)
+    return(CountMatrix(bits, list(count_matrices[0].columns)))
 
-        if not col1_name:
-            break
 
-        count_table = merge_two_columns(count_table, col1_name, col2_name,
-                                        new_name)
-        i += 1
+def count_matrix_view(count_matrix, view):
+    '''
+    Returns the 'CountMatrix' at position 'view' of the leading axis of a
+        stacked 'count_matrix' (see 'stack_count_matrices'); the returned
+        'CountMatrix' shares its bits with 'count_matrix'
+    '''
 
-    return(count_table)
+    return(CountMatrix(count_matrix.bits[view], count_matrix.columns))
 
 
-def merge_characters_multiple_tables(counts):
+def count_matrix_row_chunks(count_matrix, chunk_rows=65536):
     '''
-    Loops function 'merge_character_counts_into_single_columns' for each
-        count table in 'counts'
-    Description of 'merge_character_counts_into_single_columns':
-        Inputs:  'count_table' is a table/Pandas DataFrame that tallies whether a
-            word or phrase (naming characters) appeared in items of text; each word
-            has its own column; each row corresponds to an item of text; if a word
-            appeared in a text item, the corresponding cell in the 'count_table'
-            is '1', otherwise it's '0'
-        Merges columns in 'count_table' as specified in the dictionary
-            'characters_merge', which names the columns to be merged (keys) and the
-            names of the new, merged columns (values)
-        The original columns that are merged are deleted from the 'count_table',
-            while the new, merged columns are added to the table
-        This allows characters with alternate spellings or names (e.g., 'Pig-Pen'
-            and 'Pig Pen' to be reclassified under a single column
+    Yields slices of consecutive rows of 'count_matrix', so that functions that
+        need unpacked counts can unpack only 'chunk_rows' rows at a time
     '''
 
-    for i in range(len(counts)):
-        counts[i] = merge_character_counts_into_single_columns(counts[i])
+    n_rows = count_matrix.bits.shape[-2]
 
-    return(counts)
+    for start in range(0, n_rows, chunk_rows):
+        yield slice(start, min(start + chunk_rows, n_rows))
 
 
-def adjust_patty_counts_in_table(dates_column, count_table, pep_patty_dates):
+def unpack_count_matrix(count_matrix, rows=slice(None)):
     '''
-    Adjusts counts for Patty and Peppermint Patty
-    For 5 dates, Peppermint Patty is referred to only as 'Patty', so 'patty'
-        counts are reassigned to 'peppermint patty' for these dates
-    Peppermint Patty and Patty never appear in a comic together, so all 'patty'
-        counts on Peppermint Patty appearance dates are set to '0', indicating
-        that she didn't appear
+    Returns 'rows' of 'count_matrix' as a NumPy 'uint8' array of '0'/'1'
+        counts with one column for each of its 'columns'
     '''
 
-    # 5 dates at end are when Peppermint Patty is referred to only as 'Patty'
-    add_pep_dates = pep_patty_dates[-5:]
+    import numpy as np
 
-    # for these dates, assign 'patty' counts to 'peppermint patty'
-    idx = dates_column[dates_column.isin(add_pep_dates)].index.values
-    count_table.ix[idx, 'peppermint patty'] = count_table.ix[idx, 'patty']
+    n_columns = len(count_matrix.columns)
+    values = np.unpackbits(count_matrix.bits[..., rows, :], axis=-1)
 
-    # for dates when Peppermint Patty appears, remove any appearances for 'Patty'
-    # (they never appear in a comic together)
-    idx = dates_column[dates_column.isin(pep_patty_dates)].index.values
-    count_table.ix[idx, 'patty'] = 0
+    return(values[..., :n_columns])
 
-    return(count_table)
 
+def count_matrix_column_index(count_matrix, column):
+    '''
+    Returns the position of 'column' in the columns of 'count_matrix'; 'column'
+        can be a column name or a position
+    '''
+
+    if isinstance(column, str):
+        return(count_matrix.columns.index(column))
+    return(column)
 
-def adjust_patty_counts_multiple_tables(dates_column, counts, pep_patty_dates):
+
+def get_count_matrix_column(count_matrix, column, rows=slice(None)):
     '''
-    Loops function 'adjust_patty_counts_in_table' for each
-        count table in 'counts'
-    Description of 'adjust_patty_counts_in_table':
-        Adjusts counts for Patty and Peppermint Patty
-        For 5 dates, Peppermint Patty is referred to only as 'Patty', so 'patty'
-            counts are reassigned to 'peppermint patty' for these dates
-        Peppermint Patty and Patty never appear in a comic together, so all 'patty'
-            counts on Peppermint Patty appearance dates are set to '0', indicating
-            that she didn't appear
+    Returns Boolean NumPy array of the counts in 'rows' of 'column' of
+        'count_matrix' without unpacking any other columns
     '''
 
-    for i in range(len(counts)):
-        counts[i] = adjust_patty_counts_in_table(dates_column, counts[i],
-                                                 pep_patty_dates)
+    j = count_matrix_column_index(count_matrix, column)
+    column_bits = count_matrix.bits[..., rows, j >> 3]
 
-    return(counts)
+    return((column_bits & (0x80 >> (j & 7))) != 0)
 
 
-def create_appearances_dict():
+def set_count_matrix_column(count_matrix, column, values, rows=slice(None)):
     '''
-    Creates dictionary of first and last appearances (or mentions, sometimes)
-        for several characters in the Peanuts comic strip
+    Sets the counts in 'rows' of 'column' of 'count_matrix' to 'values', which
+        may be a single value or an array of Boolean or '0'/'1' values
     '''
 
-    dates = {'sally'                : ['1959-08-23', '2000-02-06'],
-             'rerun'                : ['1973-03-26', '2000-01-30'],
-             'woodstock'            : ['1966-03-04', '2000-01-16'],
-             #'peppermint'          : ['1966-08-22', '2000-02-13'],
-             'violet'               : ['1951-02-07', '1997-11-27'],
-             'marcie'               : ['1971-07-20', '2000-01-02'],
-             'spike'                : ['1975-08-13', '1999-12-21'],
-             'franklin'             : ['1968-07-31', '1995-11-05'],
-             'andy'                 : ['1994-02-14', '1999-09-27'],
-             'olaf'                 : ['1989-01-16', '1999-09-27'],
-             'frieda'               : ['1961-03-06', '1985-11-22'],
-             'eudora'               : ['1978-06-13', '1987-06-13'],
-             'truffles'             : ['1975-03-31', '1977-01-29'],
-             'peggy jean'           : ['1990-07-23', '1999-07-11'],
-             'pig pen'              : ['1954-07-13', '1999-09-08'],
-             'othmar'               : ['1959-10-06', '1973-09-11'],
-             'roy'                  : ['1965-06-11', '1984-05-27'],
-             'cormac'               : ['1992-07-17', '2000-02-06'],     # don't know last appearance
-             'thibault'             : ['1970-06-04', '1973-08-04'],
-             'sophie'               : ['1968-06-18', '1987-08-19'],
-             'poochie'              : ['1972-12-17', '1973-01-07'],
-             'naomi'                : ['1998-10-01', '2000-02-06'],     # don't know last appearance
-             'maynard'              : ['1986-07-21', '1986-07-30'],
-             'lydia'                : ['1986-06-09', '1999-03-23'],
-             'lila'                 : ['1968-02-17', '1968-08-31'],
-             'larry'                : ['1991-05-28', '1991-12-19'],
-             'royanne'              : ['1993-04-01', '1994-03-12'],
-             'harold'               : ['1983-12-16', '1984-05-20'],
-             'benny'                : ['1982-04-15', '1982-05-01'],
-             'molly volley'         : ['1977-05-09', '1991-01-01'],     # last appearance in 1990
-             'charlotte braun'      : ['1954-11-30', '1955-02-01'],
-             'crybaby boobie'       : ['1978-07-03', '1997-03-10'],
-             'tapioca pudding'      : ['1986-09-04', '1986-12-01'],
-             'helen sweetstory'     : ['1971-04-09', '1972-11-30'],     # last mention Nov 1972
-             'the school building'  : ['1974-08-31', '1979-12-31'],     # dies and rebuilt in 1976; unsure of last appearance
-             'ethan'                : ['1993-07-14', '1993-07-15'],
-             'floyd'                : ['1976-07-20', '1976-08-06'],
-             'shirley'              : ['1968-06-18', '1987-07-20'],
-             'emily'                : ['1995-02-11', '1999-12-31'],     # last appearance in 1999
-             'belle'                : ['1976-06-22', '1981-05-11'],
-             'faron'                : ['1961-05-23', '1961-11-20'],
-             'harriet'              : ['1980-05-12', '2000-02-06'],     # don't know last appearance
-             'bill'                 : ['1978-03-27', '2000-02-06'],     # don't know last appearance
-             'conrad'               : ['1978-03-27', '2000-02-06'],     # don't know last appearance
-             'olivier'              : ['1978-03-27', '2000-02-06'],     # don't know last appearance
-             'raymond'              : ['1988-10-13', '2000-02-06'],     # don't know last appearance
-             'fred'                 : ['1990-04-03', '1993-05-13'],
-             'wilson'               : ['1984-12-02', '1998-06-06']}
+    import numpy as np
 
-    return(dates)
+    j = count_matrix_column_index(count_matrix, column)
+    mask = np.uint8(0x80 >> (j & 7))
+    column_bits = count_matrix.bits[..., rows, j >> 3]
+    values = np.asarray(values).astype(bool)
+    count_matrix.bits[..., rows, j >> 3] = np.where(values, column_bits | mask,
+                                                    column_bits & ~mask)
 
 
-def adjust_counts_by_appearance_dates_in_table(dates_column, count_table):
+def select_count_matrix_columns(count_matrix, column_indices):
     '''
-    Adjusts counts so that characters can't appear before their debut dates or
-        after their final dates in the comic strip
-    Characters might erroneously appear outside their appearance dates because
-        of typoes or non-specific uses of their names (e.g., 'sally', 'rerun',
-        'violet', and 'spike' have meanings beyond the characters' names
+    Returns new 'CountMatrix' with only the columns of 'count_matrix' at the
+        positions in 'column_indices', in that order
     '''
 
-    dates = create_appearances_dict()
-    column_names = count_table.columns
+    import numpy as np
 
-    for i in range(len(column_names)):
+    column_indices = list(column_indices)
+    n_bytes = (len(column_indices) + 7) // 8
+    bits = np.zeros(count_matrix.bits.shape[:-1] + (n_bytes, ), dtype=np.uint8)
 
-        if column_names[i] in dates:
-            start_end_dates = dates[column_names[i]]
-            start_idx = min(dates_column[dates_column ==
-                                         start_end_dates[0]].index.values)
-            end_idx = max(dates_column[dates_column ==
-                                       start_end_dates[1]].index.values)
-            count_table.iloc[:start_idx, i] = 0
-            count_table.iloc[end_idx+1:, i] = 0
+    for rows in count_matrix_row_chunks(count_matrix):
+        values = unpack_count_matrix(count_matrix, rows)[..., column_indices]
+        bits[..., rows, :] = np.packbits(values, axis=-1)
 
-    return(count_table)
+    columns = [count_matrix.columns[j] for j in column_indices]
 
+    return(CountMatrix(bits, columns))
 
-def adjust_counts_by_appearance_dates_multiple_tables(dates_column, counts):
+
+def append_count_matrix_column(count_matrix, column_name, values):
     '''
-    Loops function 'adjust_counts_in_table_by_appearance_dates' for each
+    Returns 'count_matrix' with a new column 'column_name' that has the counts
+        'values'; if 'column_name' is already a column, its counts are replaced
+    '''
+
+    import numpy as np
+
+    if column_name in count_matrix.columns:
+        set_count_matrix_column(count_matrix, column_name, values)
+        return(count_matrix)
+
+    bits = count_matrix.bits
+
+    # a new byte is needed only when all 8 bits of the last byte are in use
+    if len(count_matrix.columns) % 8 == 0:
+        new_byte = np.zeros(bits.shape[:-1] + (1, ), dtype=np.uint8)
+        bits = np.concatenate([bits, new_byte], axis=-1)
+
+    count_matrix = CountMatrix(bits, count_matrix.columns + [column_name])
+    set_count_matrix_column(count_matrix, column_name, values)
+
+    return(count_matrix)
+
+
+def count_matrix_column_sums(count_matrix):
+    '''
+    Returns NumPy array of the sum of the counts of each column of
+        'count_matrix'
+    '''
+
+    import numpy as np
+
+    sums = np.zeros(count_matrix.bits.shape[:-2] +
+                    (len(count_matrix.columns), ), dtype=np.int64)
+
+    for rows in count_matrix_row_chunks(count_matrix):
+        sums += unpack_count_matrix(count_matrix, rows).sum(axis=-2,
+                                                            dtype=np.int64)
+
+    return(sums)
+
+
+def count_matrix_rows_with_any(count_matrix, columns):
+    '''
+    Returns Boolean NumPy array that is 'True' for each row of 'count_matrix'
+        that has a count in any of 'columns'
+    '''
+
+    import numpy as np
+
+    column_indices = [count_matrix_column_index(count_matrix, c)
+                      for c in columns]
+    any_counts = np.zeros(count_matrix.bits.shape[:-1], dtype=bool)
+
+    for rows in count_matrix_row_chunks(count_matrix):
+        values = unpack_count_matrix(count_matrix, rows)[..., column_indices]
+        any_counts[..., rows] = values.any(axis=-1)
+
+    return(any_counts)
+
+
+def count_matrix_to_dataframe(count_matrix, rows=slice(None)):
+    '''
+    Expands 'rows' of a 2-dimensional 'count_matrix' into a table/Pandas
+        DataFrame of '0'/'1' counts, indexed by row number
+    '''
+
+    import numpy as np
+    import pandas as pd
+
+    n_rows = count_matrix.bits.shape[-2]
+    index = np.arange(n_rows)[rows]
+    values = unpack_count_matrix(count_matrix, rows).astype(np.int64)
+    table = pd.DataFrame(values, index=index, columns=count_matrix.columns)
+
+    return(table)
+
+
+def sum_count_matrix_by_segments(count_matrix, starts, chunk_rows=65536):
+    '''
+    Sums the counts of 'count_matrix' over segments of adjacent rows, e.g., the
+        panels of each comic; 'starts' is a NumPy array of the first row of
+        each segment, in order, and each segment ends where the next begins
+    Returns NumPy array of counts x segments x columns, with the same leading
+        axes as 'count_matrix'
+    The rows are unpacked in blocks of whole segments of about 'chunk_rows'
+        rows, and the segments of each block are summed with a single
+        'np.add.reduceat'
+    '''
+
+    import numpy as np
+
+    n_rows = count_matrix.bits.shape[-2]
+    stops = np.append(starts[1:], n_rows)
+    sums = np.zeros(count_matrix.bits.shape[:-2] +
+                    (len(starts), len(count_matrix.columns)), dtype=np.int64)
+    first = 0
+
+    while first < len(starts):
+        last = np.searchsorted(starts, starts[first] + chunk_rows, side='left')
+        last = max(last, first + 1)
+        rows = slice(starts[first], stops[last - 1])
+        values = unpack_count_matrix(count_matrix, rows)
+        sums[..., first:last, :] = np.add.reduceat(
+            values, starts[first:last] - starts[first], axis=-2,
+            dtype=np.int64)
+        first = last
+
+    return(sums)
+
+
+def join_row_text(text):
+    '''
+    Returns the text of a row of a text column as a single string; text stored
+        in a list (or in a NumPy array, see 'read_columnar_table') is joined
+        with spaces, and empty lists are 'None', since they have no text to
+        search
+    '''
+
+    import numpy as np
+
+    # if text stored in list (or array) instead of string
+    if isinstance(text, (list, np.ndarray)):
+        if not text[0] and len(text) == 1:
+            return(None)            # skips empty lists
+        text = ' '.join(text)
+
+    return(text)
+
+
+def character_class_ranges(is_member):
+    '''
+    Returns a regular expression character class of every Unicode character
+        for which 'is_member' is 'True', as ranges of consecutive characters
+    '''
+
+    import sys
+
+    ranges = []
+    start = None
+
+    for code_point in range(sys.maxunicode + 2):
+        member = code_point <= sys.maxunicode and is_member(chr(code_point))
+        if member and start is None:
+            start = code_point
+        elif not member and start is not None:
+            ranges.append('\\U{0:08x}-\\U{1:08x}'.format(start,
+                                                         code_point - 1))
+            start = None
+
+    return('[' + ''.join(ranges) + ']')
+
+
+def compile_word_pattern():
+    '''
+    Returns a regular expression that finds the same words in a text as the
+        English tokenizer of 'enchant' does:  a word starts with a letter (a
+        character for which 'str.isalpha' is 'True'), continues over letters
+        and apostrophes, and doesn't end with an apostrophe; combining marks
+        (Unicode category 'M') that follow a letter are part of the letter
+    The pattern is compiled once per process, and the processes of the pool
+        of 'count_characters_in_parallel' are given the parent's pattern
+    '''
+
+    import re
+    import unicodedata
+
+    if 'pattern' not in word_pattern_cache:
+        letter = '{0}{1}*'.format(
+            character_class_ranges(str.isalpha),
+            character_class_ranges(
+                lambda c: unicodedata.category(c)[0] == 'M'))
+        word_pattern_cache['pattern'] = re.compile(
+            "{0}(?:'*{0})*".format(letter))
+
+    return(word_pattern_cache['pattern'])
+
+
+def get_text_tokenizer(backend='enchant'):
+    '''
+    Returns a function that takes a string of text and returns the set of its
+        lower-cased tokens
+    'backend' - 'enchant' to tokenize with the English tokenizer of 'enchant',
+        or 'regex' to tokenize with a regular expression that finds the same
+        words without 'enchant' (see 'compile_word_pattern'); both include
+        possessives (e.g., "snoopy's") as tokens
+    The tokens of the two backends can be compared on a table with
+        'compare_tokenizers'
+    '''
+
+    if backend == 'enchant':
+        from enchant.tokenize import get_tokenizer
+        enchant_tokenizer = get_tokenizer('en_US')
+
+        def tokenize(text):
+            return(set(w[0].lower() for w in enchant_tokenizer(text)))
+
+    elif backend == 'regex':
+        pattern = compile_word_pattern()
+
+        def tokenize(text):
+            return(set(w.lower() for w in pattern.findall(text)))
+
+    else:
+        raise ValueError("'backend' must be 'enchant' or 'regex'")
+
+    return(tokenize)
+
+
+def compare_tokenizers(expanded_table, text_columns=None,
+                       backends=('enchant', 'regex'), max_examples=20):
+    '''
+    Tokenizes each element of each of 'text_columns' of 'expanded_table' with
+        both of 'backends' (see 'get_text_tokenizer') and compares their
+        tokens, so that a backend can be checked against 'enchant' on the
+        whole corpus before it is used for counting
+    'text_columns' - the text columns of the counts (see
+        'count_view_text_columns') by default
+    Returns a dictionary with the number of 'rows' that were compared, the
+        number of rows with different tokens ('differing_rows') and up to
+        'max_examples' 'examples' of them:  the text column, the row, the row's
+        text and the tokens that only each backend found
+    '''
+
+    if text_columns is None:
+        text_columns = count_view_text_columns()
+
+    tokenizers = [get_text_tokenizer(backend) for backend in backends]
+    n_rows = 0
+    differing_rows = 0
+    examples = []
+
+    for text_column in text_columns:
+        for i, text in enumerate(expanded_table[text_column].values):
+            text = join_row_text(text)
+            if text is None:
+                continue
+            n_rows += 1
+            tokens = [tokenizer(text) for tokenizer in tokenizers]
+            if tokens[0] == tokens[1]:
+                continue
+            differing_rows += 1
+            if len(examples) < max_examples:
+                examples.append({
+                    'column': text_column, 'row': i, 'text': text,
+                    'only_' + backends[0]: sorted(tokens[0] - tokens[1]),
+                    'only_' + backends[1]: sorted(tokens[1] - tokens[0])})
+
+    return({'rows': n_rows, 'differing_rows': differing_rows,
+            'examples': examples})
+
+
+def tokenize_text_column(table_column, output_len, tokenizer=None,
+                         message_interval=1000):
+    '''
+    Tokenizes each element of 'table_column', a Pandas DataSeries where each
+        element is a string (or list of strings), once so that the tokens can
+        be searched for any number of words
+    'tokenizer' - function that returns the set of lower-cased tokens of a
+        string (see 'get_text_tokenizer'); 'enchant' by default
+    Returns list of length 'output_len' with one item for each row:  a tuple
+        of the row's text and the set of its lower-cased tokens; rows that are
+        not in 'table_column' or that have empty lists of text are 'None'
+    Progress is printed every 'message_interval' rows; if 'message_interval'
+        is 'None', no progress is printed
+    '''
+
+    if tokenizer is None:
+        tokenizer = get_text_tokenizer()
+
+    tokenized_column = [None] * output_len
+
+    for i, text in table_column.iteritems():
+
+        if message_interval:
+            print_intermittent_status_message_in_loop(i, message_interval,
+                                                      output_len)
+
+        text = join_row_text(text)
+
+        if text is None:
+            continue
+
+        tokenized_column[i] = (text, tokenizer(text))
+
+    return(tokenized_column)
+
+
+def tally_word_counts_in_tokens(tokenized_column, word_list, matcher=None,
+                                fuzzy_hits=None):
+    '''
+    Inputs:  'tokenized_column' is a list of texts and their tokens from
+        'tokenize_text_column'; 'word_list' is a list of words to search for
+    Outputs:  a 'CountMatrix' with each element in 'word_list' as a column
+        name, each row corresponding to each element in 'tokenized_column', and
+        values of '0' or '1' indicating whether that column's 'word_list'
+        element appeared in that row's text; '0' is 'No' and '1' is 'Yes'; rows
+        that are 'None' are all '0'
+    'matcher' is the compiled 'word_list' from 'compile_word_matcher'; if it
+        isn't provided, it is compiled here; passing it in allows the same
+        compiled 'word_list' to be used for several columns
+    'fuzzy_hits' - if the matcher also matches words within some edits of the
+        tokens, each count that was matched only this way is appended to this
+        list, if given, as a tuple of the row, the column index and the token
+        (see 'match_words_in_text')
+    '''
+
+    import numpy as np
+
+    if matcher is None:
+        matcher = compile_word_matcher(word_list)
+
+    # counts are set directly in their bit-packed bytes (see 'CountMatrix')
+    tallies = np.zeros((len(tokenized_column), (len(word_list) + 7) // 8),
+                       dtype=np.uint8)
+
+    for i in range(len(tokenized_column)):
+
+        if tokenized_column[i] is None:
+            continue
+
+        text, tokens = tokenized_column[i]
+        row_fuzzy_hits = [] if fuzzy_hits is not None else None
+
+        for j in match_words_in_text(matcher, text, tokens, row_fuzzy_hits):
+            tallies[i, j >> 3] |= 0x80 >> (j & 7)
+
+        if row_fuzzy_hits:
+            fuzzy_hits.extend((i, j, token) for j, token in row_fuzzy_hits)
+
+    tallies = CountMatrix(tallies, list(word_list))
+
+    return(tallies)
+
+
+def tally_word_counts_in_column(table_column, word_list, output_len,
+                                matcher=None, fuzzy_hits=None):
+    '''
+    Inputs:  'table_column' is a Pandas DataSeries where each element is a
+        string (or list of strings) to be searched; 'word_list' is a list of
+        words to search for; 'output_len' is the length of the output table
+        'tallies'
+    Outputs:  a 'CountMatrix' with each element in 'word_list' as a column
+        name, each row corresponding to each element in 'table_column', and
+        values of '0' or '1' indicating whether that column's 'word_list'
+        element appeared in that row's 'table_column' element; '0' is 'No' and
+        '1' is 'Yes'; rows of 'table_column' that aren't searched are all '0'
+    'word_list' elements that are single words must match a token from the
+        'table_column' string to be considered a match; this prevents words from
+        matching when they are only sub-words in the string (e.g., so that
+        searching for 'hat' in 'that' does not yield a match);
+    'word_list' elements that are multiple words or hyphenated are searched for
+        in the string itself (which can produce the sub-word problem described
+        above)
+    'matcher' is the compiled 'word_list' from 'compile_word_matcher'; if it
+        isn't provided, it is compiled here; passing it in allows the same
+        compiled 'word_list' to be used for several columns; a matcher compiled
+        with a 'max_distance' also matches words with typos, and the counts
+        that only match that way are appended to 'fuzzy_hits' (see
+        'tally_word_counts_in_tokens')
+    '''
+
+    tokenized_column = tokenize_text_column(table_column, output_len)
+    tallies = tally_word_counts_in_tokens(tokenized_column, word_list, matcher,
+                                          fuzzy_hits)
+
+    return(tallies)
+
+
+def combine_column_pairs(table):
+    '''
+    Combines each adjacent pair of columns in a 'CountMatrix' with Boolean 'or'
+        and returns the new 'CountMatrix' (with half the number of columns as
+        the original table)
+    '''
+
+    import numpy as np
+
+    columns = table.columns[0::2]     # excludes every other element
+    n_bytes = (len(columns) + 7) // 8
+    combined_bits = np.zeros(table.bits.shape[:-1] + (n_bytes, ),
+                             dtype=np.uint8)
+
+    for rows in count_matrix_row_chunks(table):
+        values = unpack_count_matrix(table, rows)
+        pairs = values.reshape(values.shape[:-1] + (len(columns), 2))
+        combined_bits[..., rows, :] = np.packbits(pairs.max(axis=-1), axis=-1)
+
+    combined_table = CountMatrix(combined_bits, columns)
+
+    return(combined_table)
+
+
+def count_views():
+    '''
+    Returns list of the counts performed by 'count_characters'; each count is
+        a tuple of the column of 'expanded_table' with the text to be counted
+        and the column that flags the rows to be counted with '1' ('None' if
+        all rows are counted)
+    '''
+
+    views = [('text_spell_corrected', None),           # for an overall count
+             ('text_nontalk', None),                   # count in text outside double-quotes
+             ('text_talk', None),                      # count in text inside double-quotes
+             ('text_spell_corrected', 'odd_quotes'),   # counts text with odd number of double-quotes
+             ('text_spell_corrected', 'no_quotes')]    # counts text with no double-quotes
+
+    return(views)
+
+
+def count_type_names():
+    '''
+    Returns list of the names of the counts in 'count_views', in order, which
+        name their output files
+    '''
+
+    count_types = ['1_overall', '2_nontalk', '3_talk',
+                   '4_odd_quotes', '5_no_quotes']
+
+    return(count_types)
+
+
+# tokenizer and compiled word list of each process in the pool of
+#   'count_characters_in_parallel'; set once per process by
+#   'initialize_counting_worker'
+counting_worker_state = {}
+
+
+def initialize_counting_worker(characters, tokenizer_backend='enchant',
+                               max_distance=0, min_length=5,
+                               word_pattern=None):
+    '''
+    Creates the tokenizer of 'tokenizer_backend' (see 'get_text_tokenizer') and
+        compiles 'characters' with 'max_distance' and 'min_length' (see
+        'compile_word_matcher') once for a process in the pool of
+        'count_characters_in_parallel'
+    'word_pattern' - the pattern of the 'regex' tokenizer that the parent
+        process compiled (see 'compile_word_pattern'), so that the process
+        doesn't compute its character ranges again
+    '''
+
+    if word_pattern is not None:
+        word_pattern_cache['pattern'] = word_pattern
+
+    counting_worker_state['tokenizer'] = get_text_tokenizer(tokenizer_backend)
+    counting_worker_state['matcher'] = compile_word_matcher(
+        characters, max_distance, min_length)
+    counting_worker_state['characters'] = characters
+
+
+def tally_text_columns_chunk(text_chunk):
+    '''
+    Counts the words of the process's 'characters' (see
+        'initialize_counting_worker') in a chunk of rows of text
+    'text_chunk' is a dictionary of names of text columns (keys) and lists of
+        the column's elements for the rows of the chunk (values)
+    Returns dictionary of the names of the text columns and the bit-packed
+        counts of the chunk's rows, with adjacent pairs of columns combined
+        (see 'combine_column_pairs'), and list of the counts that were matched
+        only within some edits of a token (see 'tally_word_counts_in_tokens'),
+        as tuples of the text column, the row in the chunk, the column index
+        and the token
+    '''
+
+    import pandas as pd
+
+    chunk_bits = {}
+    chunk_fuzzy_hits = []
+
+    for text_column, texts in text_chunk.items():
+        tokenized_column = tokenize_text_column(
+            pd.Series(texts), len(texts), counting_worker_state['tokenizer'],
+            message_interval=None)
+        fuzzy_hits = []
+        temp = tally_word_counts_in_tokens(
+            tokenized_column, counting_worker_state['characters'],
+            counting_worker_state['matcher'], fuzzy_hits)
+        chunk_bits[text_column] = combine_column_pairs(temp).bits
+        chunk_fuzzy_hits.extend((text_column, ) + hit for hit in fuzzy_hits)
+
+    return(chunk_bits, chunk_fuzzy_hits)
+
+
+def count_characters_in_parallel(expanded_table, characters, text_columns,
+                                 workers, tokenizer_backend='enchant',
+                                 max_distance=0, min_length=5,
+                                 fuzzy_hits=None):
+    '''
+    Splits the rows of 'expanded_table' into chunks and counts the words from
+        'characters' in each of 'text_columns' of each chunk in a pool of
+        'workers' processes, which tokenize with 'tokenizer_backend' (see
+        'get_text_tokenizer') and match words within 'max_distance' edits of
+        at least 'min_length' characters (see 'compile_word_matcher')
+    The chunks' counts are joined in their original row order, so the counts
+        are identical to counting all rows in a single process
+    Returns dictionary of the names of the text columns and their
+        'CountMatrix', with adjacent pairs of columns combined (see
+        'combine_column_pairs')
+    'fuzzy_hits' - list that the counts that were matched only within some
+        edits of a token are appended to, if given (see
+        'tally_text_columns_chunk'), with the rows of 'expanded_table'
+    '''
+
+    import numpy as np
+    from multiprocessing import Pool
+
+    n_rows = len(expanded_table)
+    # several chunks per worker, so that workers that finish early get more
+    chunk_rows = max(1, -(-n_rows // (workers * 4)))
+    text_chunks = [{c: expanded_table[c].values[
+                        start:start + chunk_rows].tolist()
+                    for c in text_columns}
+                   for start in range(0, n_rows, chunk_rows)]
+    chunks_bits = []
+    word_pattern = (compile_word_pattern() if tokenizer_backend == 'regex'
+                    else None)
+
+    with Pool(workers, initializer=initialize_counting_worker,
+              initargs=(characters, tokenizer_backend, max_distance,
+                        min_length, word_pattern)) as pool:
+        for i, (chunk_bits, chunk_fuzzy_hits) in enumerate(
+                pool.imap(tally_text_columns_chunk, text_chunks)):
+            print_intermittent_status_message_in_loop(i, 1, len(text_chunks))
+            chunks_bits.append(chunk_bits)
+            if fuzzy_hits is not None:
+                fuzzy_hits.extend(
+                    (text_column, i * chunk_rows + row, j, token)
+                    for text_column, row, j, token in chunk_fuzzy_hits)
+
+    columns = characters[0::2]
+    n_bytes = (len(columns) + 7) // 8
+    column_counts = {}
+
+    for text_column in text_columns:
+        bits = [chunk_bits[text_column] for chunk_bits in chunks_bits]
+        bits = np.concatenate(bits) if bits else np.zeros((0, n_bytes),
+                                                          dtype=np.uint8)
+        column_counts[text_column] = CountMatrix(bits, columns)
+
+    return(column_counts)
+
+
+def count_characters(expanded_table, characters, workers=1, report=None,
+                     matcher=None, tokenizer_backend='enchant',
+                     fuzzy_hits=None):
+    '''
+    Performs a series of counts; each count tallies when words from 'characters'
+        appear in a specified column from 'expanded_table'
+    Each count is returned as a 'CountMatrix'; each word in
+        'characters' has its own column; each element from the column in
+        'expanded_table' has its own row; if a word appears in a column element,
+        the value is '1', otherwise it's '0'
+    Output:  The count tables are stacked into a single 'CountMatrix' 'counts'
+        of count tables x rows x columns, in the order of 'count_views'; all
+        count tables share the same rows and columns
+    Each column of text is tokenized and searched only once; counts that are
+        restricted to some rows (e.g., 'odd_quotes') take their rows from the
+        count of the whole column
+    If 'workers' is more than 1, the rows are counted in a pool of 'workers'
+        processes (see 'count_characters_in_parallel')
+    'report' - run report where the tokenizing, the matching and the stacking
+        of the count tables are recorded as stages (see 'report_stage'), each
+        with the rows of the table once; in a pool of processes, the
+        tokenizing and the matching are recorded together
+    'matcher' - 'characters' compiled by 'compile_word_matcher', if they have
+        already been compiled; if it was compiled with a 'max_distance', words
+        are also matched within that many edits of the tokens (e.g., typos),
+        in a pool of processes, too
+    'tokenizer_backend' - 'enchant' or 'regex' (see 'get_text_tokenizer')
+    'fuzzy_hits' - list that each count that was matched only within some
+        edits of a token is appended to, if given, so that these matches can be
+        audited; each is a tuple of the text column, the row, the column of
+        the counts, the word of 'characters' and the token that matched it
+    '''
+
+    text_columns = count_view_text_columns()
+    n_rows = len(expanded_table)
+    column_fuzzy_hits = [] if fuzzy_hits is not None else None
+
+    if workers > 1:
+        fuzzy_index = matcher.get('fuzzy_index') if matcher else None
+        fuzzy_options = ((fuzzy_index['max_distance'],
+                          fuzzy_index['min_length'])
+                         if fuzzy_index is not None else (0, 5))
+        with report_stage(report, 'tokenize and match') as stage:
+            column_counts = count_characters_in_parallel(
+                expanded_table, characters, text_columns, workers,
+                tokenizer_backend, *fuzzy_options,
+                fuzzy_hits=column_fuzzy_hits)
+            stage['rows'] = n_rows
+
+    else:
+        if matcher is None:
+            matcher = compile_word_matcher(characters)
+        tokenizer = get_text_tokenizer(tokenizer_backend)
+        column_counts = {}
+
+        # each text column is tokenized and matched in turn, so that only
+        #   one tokenized column is kept at a time; the rows of the table are
+        #   recorded with the first column only
+        for i, text_column in enumerate(text_columns):
+            with report_stage(report, 'tokenize') as stage:
+                tokenized_column = tokenize_text_column(
+                    expanded_table.ix[:, text_column], n_rows, tokenizer)
+                stage['rows'] = n_rows if i == 0 else 0
+            with report_stage(report, 'match') as stage:
+                text_fuzzy_hits = [] if fuzzy_hits is not None else None
+                temp = tally_word_counts_in_tokens(tokenized_column,
+                                                   characters, matcher,
+                                                   text_fuzzy_hits)
+                column_counts[text_column] = combine_column_pairs(temp)
+                if text_fuzzy_hits:
+                    column_fuzzy_hits.extend((text_column, ) + hit
+                                             for hit in text_fuzzy_hits)
+                stage['rows'] = n_rows if i == 0 else 0
+
+    # each column of the counts combines a pair of words (see
+    #   'combine_column_pairs')
+    if fuzzy_hits is not None:
+        fuzzy_hits.extend(
+            (text_column, row, characters[j - j % 2], characters[j], token)
+            for text_column, row, j, token in column_fuzzy_hits)
+
+    with report_stage(report, 'stack views') as stage:
+        counts = stack_count_views(expanded_table, column_counts)
+        stage['rows'] = n_rows
+
+    return(counts)
+
+
+def count_view_text_columns():
+    '''
+    Returns list of the distinct text columns of the counts in 'count_views',
+        in order
+    '''
+
+    text_columns = []
+
+    for text_column, _ in count_views():
+        if text_column not in text_columns:
+            text_columns.append(text_column)
+
+    return(text_columns)
+
+
+def stack_count_views(expanded_table, column_counts):
+    '''
+    Stacks the counts of each of 'count_views' into a single 'CountMatrix' of
+        count tables x rows x columns
+    'column_counts' - dictionary of the names of the text columns of
+        'expanded_table' and the 'CountMatrix' of each whole column
+    Counts restricted to some rows (e.g., 'odd_quotes') are '0' in all other
+        rows
+    '''
+
+    import numpy as np
+
+    columns_to_count = count_views()
+    columns = column_counts[columns_to_count[0][0]].columns
+    counts_bits = np.zeros((len(columns_to_count), len(expanded_table),
+                            (len(columns) + 7) // 8), dtype=np.uint8)
+
+    for i, (text_column, row_filter) in enumerate(columns_to_count):
+        counts_bits[i] = column_counts[text_column].bits
+        if row_filter is not None:
+            counts_bits[i][expanded_table[row_filter].values != 1] = 0
+
+    counts = CountMatrix(counts_bits, list(columns))
+
+    return(counts)
+
+
+def hash_row_texts(texts):
+    '''
+    Returns NumPy array of 16-byte hashes of 'texts', the joined texts of the
+        rows of a text column (see 'join_row_text'); rows without text ('None')
+        all have the same hash
+    '''
+
+    import hashlib
+    import numpy as np
+
+    hashes = [hashlib.blake2b(('\x00' if text is None else 'T' + text)
+                              .encode('utf-8'), digest_size=16).digest()
+              for text in texts]
+
+    return(np.array(hashes, dtype='S16'))
+
+
+def load_incremental_state(state_filepath, settings=None):
+    '''
+    Reads the state saved by 'save_incremental_state' from the NumPy 'npz'
+        file 'state_filepath'
+    Returns 'None' if there is no state file, if it was written in another
+        format version or if it was saved with other 'settings' than these
+        (e.g., another tokenizer), since its matches can't be reused then
+    Returns dictionary with the previous run's 'word_list' and, for each text
+        column, a dictionary ('columns') with the hash of each row's text
+        ('hashes') and the bit-packed matches of 'word_list' in each row
+        ('bits')
+    '''
+
+    import json
+    import os
+    import numpy as np
+
+    state_version = 1
+
+    if not os.path.exists(state_filepath):
+        return(None)
+
+    with np.load(state_filepath, allow_pickle=False) as saved:
+        header = json.loads(str(saved['header']))
+        if header.get('version') != state_version:
+            return(None)
+        if header.get('settings') != settings:
+            return(None)
+        columns = {}
+        for i, text_column in enumerate(header['text_columns']):
+            columns[text_column] = {'hashes': saved['hashes_{0}'.format(i)],
+                                    'bits': saved['bits_{0}'.format(i)]}
+
+    state = {'word_list': header['word_list'], 'columns': columns}
+
+    return(state)
+
+
+def save_incremental_state(state_filepath, word_list, columns, settings=None):
+    '''
+    Saves the hash of each row's text and the bit-packed matches of
+        'word_list' in each row for each text column in 'columns' (see
+        'load_incremental_state') to the NumPy 'npz' file 'state_filepath',
+        with the 'settings' that the matches were made with
+    '''
+
+    import json
+    import os
+    import numpy as np
+
+    state_version = 1
+    text_columns = list(columns.keys())
+    header = {'version': state_version, 'word_list': list(word_list),
+              'text_columns': text_columns, 'settings': settings}
+    arrays = {'header': np.array(json.dumps(header))}
+
+    for i, text_column in enumerate(text_columns):
+        arrays['hashes_{0}'.format(i)] = columns[text_column]['hashes']
+        arrays['bits_{0}'.format(i)] = columns[text_column]['bits']
+
+    # write to a temporary file first, so that an interrupted run doesn't
+    #   leave a partial state file
+    temp_filepath = state_filepath + '.tmp.npz'
+    np.savez(temp_filepath, **arrays)
+    os.replace(temp_filepath, state_filepath)
+
+
+def tally_word_counts_incrementally(table_column, word_list, previous,
+                                    tokenizer, matcher):
+    '''
+    Tallies the words of 'word_list' in each element of 'table_column' (as
+        'tally_word_counts_in_column' does), reusing the matches of a previous
+        run where possible
+    'previous' - dictionary with the previous run's 'word_list' and the
+        'hashes' and 'bits' of the column (see 'load_incremental_state'), or
+        'None' if there was no previous run
+    Rows whose text has the same hash as a row of the previous run keep that
+        row's matches for words that were in the previous 'word_list'; only
+        rows with new or changed text are tokenized and searched for all words,
+        and unchanged rows are searched only for words that are new in
+        'word_list'
+    Returns the 'CountMatrix' of the column and the column's new state
+    '''
+
+    import numpy as np
+
+    texts = [join_row_text(text) for text in table_column.values]
+    hashes = hash_row_texts(texts)
+    n_rows = len(texts)
+    bits = np.zeros((n_rows, (len(word_list) + 7) // 8), dtype=np.uint8)
+    changed_rows = np.arange(n_rows)
+    reused_rows = np.zeros(0, dtype=np.int64)
+    new_terms = []
+
+    if previous is not None:
+        previous_rows = {}
+        for i, row_hash in enumerate(previous['hashes']):
+            previous_rows.setdefault(row_hash, i)
+        previous_columns = {}
+        for j, word in enumerate(previous['word_list']):
+            previous_columns.setdefault(word, j)
+
+        old_rows = np.array([previous_rows.get(h, -1) for h in hashes],
+                            dtype=np.int64)
+        reused_rows = np.flatnonzero(old_rows >= 0)
+        changed_rows = np.flatnonzero(old_rows < 0)
+        kept_columns = [j for j in range(len(word_list))
+                        if word_list[j] in previous_columns]
+        kept_old_columns = [previous_columns[word_list[j]]
+                            for j in kept_columns]
+        new_terms = [j for j in range(len(word_list))
+                     if word_list[j] not in previous_columns]
+
+        # copy previous matches of unchanged rows, a chunk of rows at a time
+        chunk_rows = 65536
+        for start in range(0, len(reused_rows), chunk_rows):
+            rows = reused_rows[start:start+chunk_rows]
+            old_values = np.unpackbits(previous['bits'][old_rows[rows]],
+                                       axis=-1)[:, kept_old_columns]
+            values = np.zeros((len(rows), len(word_list)), dtype=np.uint8)
+            values[:, kept_columns] = old_values
+            bits[rows] = np.packbits(values, axis=-1)
+
+    # rows with new or changed text are searched for all words
+    for i in changed_rows:
+        if texts[i] is None:
+            continue
+        tokens = tokenizer(texts[i])
+        for j in match_words_in_text(matcher, texts[i], tokens):
+            bits[i, j >> 3] |= 0x80 >> (j & 7)
+
+    # unchanged rows are searched only for new words; a row can match a new
+    #   single word only if the word is in the row's lower-cased text, so
+    #   other rows are not tokenized
+    if new_terms and len(reused_rows):
+        new_words = [word_list[j] for j in new_terms]
+        new_matcher = compile_word_matcher(new_words)
+        single_words = list(new_matcher['word_columns'].keys())
+
+        for i in reused_rows:
+            if texts[i] is None:
+                continue
+            lower_text = texts[i].lower()
+            if any(word in lower_text for word in single_words):
+                tokens = tokenizer(texts[i])
+            else:
+                tokens = set()
+            for k in match_words_in_text(new_matcher, texts[i], tokens):
+                j = new_terms[k]
+                bits[i, j >> 3] |= 0x80 >> (j & 7)
+
+    print('Searched {0} new or changed rows of {1} for all words and {2} '
+          'unchanged rows for {3} new words'.format(
+              len(changed_rows), n_rows, len(reused_rows), len(new_terms)))
+
+    column_state = {'hashes': hashes, 'bits': bits}
+
+    return(CountMatrix(bits, list(word_list)), column_state)
+
+
+def fuzzy_hits_table(fuzzy_hits, max_distance):
+    '''
+    Returns table of the counts that were matched only within some edits of a
+        token (see 'count_characters'), one row per panel, text column and
+        word, with the token that matched the word and the number of edits
+        between them, so that the matches can be audited
+    'fuzzy_hits' - list of tuples of the panel, the date of its comic, the text
+        column, the column of the counts, the word and the token
+    '''
+
+    import pandas as pd
+
+    table = pd.DataFrame(fuzzy_hits, columns=['panel', 'filename',
+                                              'text_column', 'column', 'term',
+                                              'token'])
+    table['distance'] = [edit_distance(term, token, max_distance)
+                         for term, token in zip(table['term'], table['token'])]
+    table = table.sort_values(['panel', 'text_column', 'column', 'term'])
+
+    return(table.set_index('panel'))
+
+
+def count_characters_incrementally(expanded_table, characters,
+                                   state_filepath='incremental_state.npz',
+                                   tokenizer_backend='enchant',
+                                   possessives=True):
+    '''
+    Performs the same counts as 'count_characters', but keeps the matches of
+        each row and the hashes of each row's text in 'state_filepath' so that
+        the next run only searches rows whose text has changed and only
+        searches unchanged rows for words that have been added to 'characters'
+        (see 'tally_word_counts_incrementally')
+    The counts are identical to those of 'count_characters'
+    'tokenizer_backend' - 'enchant' or 'regex' (see 'get_text_tokenizer')
+    'possessives' - whether 'characters' pair each word/phrase with its
+        possessive (see 'compile_inputs'); for several scenarios, a list of the
+        setting of each scenario
+    The matches are saved with 'tokenizer_backend' and 'possessives'; if either
+        differs from the previous run, all rows are searched again
+    '''
+
+    settings = {'tokenizer_backend': tokenizer_backend,
+                'possessives': possessives}
+    previous = load_incremental_state(state_filepath, settings)
+    matcher = compile_word_matcher(characters)
+    tokenizer = get_text_tokenizer(tokenizer_backend)
+    column_counts = {}
+    column_states = {}
+
+    for text_column in count_view_text_columns():
+
+        if previous is not None and text_column in previous['columns']:
+            previous_column = dict(previous['columns'][text_column],
+                                   word_list=previous['word_list'])
+        else:
+            previous_column = None
+
+        temp, column_states[text_column] = tally_word_counts_incrementally(
+            expanded_table.ix[:, text_column], characters, previous_column,
+            tokenizer, matcher)
+        column_counts[text_column] = combine_column_pairs(temp)
+
+    save_incremental_state(state_filepath, characters, column_states,
+                           settings)
+    counts = stack_count_views(expanded_table, column_counts)
+
+    return(counts)
+
+
+def counts_summary_column_sums(counts):
+    '''
+    Returns list of the column sums of each count table in 'counts' and of the
+        Boolean 'or' of count tables 1 to 4, in the order that
+        'counts_summary_table_from_sums' takes them
+    'counts' can be a stacked 'CountMatrix' (see 'count_characters') or a list
+        of 'CountMatrix' or of tables/Pandas DataFrames
+    Column sums of several chunks of rows of the same count tables can be added
+        together (see 'add_column_sums')
+    '''
+
+    import numpy as np
+    import pandas as pd
+
+    if not isinstance(counts, CountMatrix) and isinstance(counts[0],
+                                                          CountMatrix):
+        counts = stack_count_matrices(counts)
+
+    if isinstance(counts, CountMatrix):
+        sums = count_matrix_column_sums(counts)
+        column_sums = [pd.Series(sums[i], index=counts.columns)
+                       for i in range(len(sums))]
+        # Boolean 'or' of bit-packed counts is 'or' of each of their bytes
+        counts_or = CountMatrix(np.bitwise_or.reduce(counts.bits[1:5], axis=0),
+                                counts.columns)
+        column_sums.append(pd.Series(count_matrix_column_sums(counts_or),
+                                     index=counts.columns))
+    else:
+        column_sums = [counts[i].sum() for i in range(len(counts))]
+        column_sums.append(
+            (counts[1] | counts[2] | counts[3] | counts[4]).sum())
+
+    return(column_sums)
+
+
+def add_column_sums(column_sums, more_column_sums):
+    '''
+    Adds the lists of column sums 'column_sums' and 'more_column_sums' (see
+        'counts_summary_column_sums') of 2 chunks of rows of the same count
+        tables; 'column_sums' can be 'None' for the first chunk
+    '''
+
+    if column_sums is None:
+        return(more_column_sums)
+
+    column_sums = [column_sums[i] + more_column_sums[i]
+                   for i in range(len(column_sums))]
+
+    return(column_sums)
+
+
+def counts_summary_table_from_sums(column_sums):
+    '''
+    Returns table of counts for each searched-for word (usually characters)
+        from the column sums of the count tables (see
+        'counts_summary_column_sums'), with one word per row
+    '''
+
+    import pandas as pd
+
+    a = column_sums[0]      # overall count, from 'text_spell_corrected' column
+    b = column_sums[1]      # 'nontalk' count from 'text_nontalk' column
+    c = column_sums[2]      # 'talk' count from 'text_talk' column
+    d = column_sums[3]      # 'odd_quotes' count from text panels with an odd number of double-quotes
+    e = column_sums[4]      # 'no_quotes' count from text panels with no double-quotes
+
+    f = column_sums[5]      # sums everything except 'overall'; should be identical to 'overall'
+
+    sums = pd.DataFrame(data=[a, b + e, c, d, f]).transpose()   # b + e:  'no_quotes' is classified as 'nontalk'
+    sums.columns = ['overall', 'nontalk', 'talk', 'oddq', 'sum']
+    sums['error'] = ((sums['sum'] / sums['overall']) * 100) - 100  # verify that 'overall' matches 'sum', errors = 0
+
+    return(sums)
+
+
+def counts_summary_table(counts):
+    '''
+    Returns table of counts for each searched-for word (usually characters),
+        with one word per row; columns show different counts based on which
+        text was counted
+    'counts' can be a stacked 'CountMatrix' (see 'count_characters') or a list
+        of 'CountMatrix' or of tables/Pandas DataFrames
+    '''
+
+    return(counts_summary_table_from_sums(counts_summary_column_sums(counts)))
+
+
+def source_code_version():
+    '''
+    Returns hash of the source code of this module, so that files saved by a
+        different version of the code aren't reused (see
+        'load_compiled_inputs'); the source is read once per process
+    '''
+
+    import hashlib
+
+    cache_key = ('source_code_version', )
+
+    if cache_key not in loaded_files_cache:
+        with open(__file__, 'rb') as source_file:
+            loaded_files_cache[cache_key] = hashlib.sha1(
+                source_file.read()).hexdigest()
+
+    return(loaded_files_cache[cache_key])
+
+
+def file_signature(filepath):
+    '''
+    Returns tuple of the size and modification time of the file 'filepath', so
+        that changes to the file can be detected without reading it, or 'None'
+        if the file doesn't exist
+    '''
+
+    import os
+
+    try:
+        file_stat = os.stat(filepath)
+    except OSError:
+        return(None)
+
+    return((file_stat.st_size, file_stat.st_mtime_ns))
+
+
+def compile_inputs(characters_only_filepath, characters_filepath,
+                   patty_filepath, rules_filepath=None, possessives=True,
+                   rule_updates=None):
+    '''
+    Reads and compiles the inputs of a run besides the table of text:  the
+        characters ('characters_only'), the words/phrases to search for, in
+        lower case and with their possessives ('characters'), the matcher
+        compiled from them (see 'compile_word_matcher'), the correction rules
+        (see 'load_correction_rules') with their merges and appearance dates
+        (see 'characters_merge_dict' and 'create_appearances_dict'), and the
+        dates when Peppermint Patty appears ('pep_patty_dates')
+    'possessives' - if 'False', the possessives of the words/phrases are not
+        searched for; each word/phrase is paired with itself instead, as the
+        counts combine each word/phrase with the next one in 'characters' (see
+        'combine_column_pairs')
+    'rule_updates' - dictionary of sections of the correction rules (e.g.,
+        'merges') that replace those read from 'rules_filepath'
+    Returns dictionary of the inputs
+    '''
+
+    characters = read_text_file(characters_filepath)
+    characters = [s.lower() for s in characters]
+    if possessives:
+        characters = add_possessives_to_word_list(characters)   # tokenizer includes possessives
+    else:
+        characters = [s for s in characters for _ in range(2)]
+    rules = load_correction_rules(rules_filepath)
+    if rule_updates:
+        rules.update(rule_updates)
+
+    inputs = {'characters_only': read_text_file(characters_only_filepath),
+              'characters': characters,
+              'matcher': compile_word_matcher(characters),
+              'rules': rules,
+              'merges': characters_merge_dict(rules),
+              'appearances': create_appearances_dict(rules),
+              'pep_patty_dates': read_text_file(patty_filepath)}
+
+    return(inputs)
+
+
+def load_compiled_inputs(characters_only_filepath, characters_filepath,
+                         patty_filepath, rules_filepath=None,
+                         cache_filepath='compiled_inputs.pickle'):
+    '''
+    Returns the compiled inputs of a run (see 'compile_inputs') from the binary
+        file 'cache_filepath', if none of the files that they were compiled
+        from have changed since; otherwise, compiles them and saves them to
+        'cache_filepath' for later runs
+    The files are identified by their sizes and modification times (see
+        'file_signature'), so checking that the saved inputs are up to date
+        doesn't read the files; within a process, the inputs are loaded only
+        once
+    Inputs saved by another version of the code (see 'source_code_version'),
+        or that can't be loaded at all, are compiled again
+    '''
+
+    import os
+    import pickle
+
+    cache_version = (1, source_code_version())
+
+    if rules_filepath is None:
+        rules_filepath = default_rules_filepath()
+
+    source_filepaths = [os.path.abspath(f) for f in
+                        [characters_only_filepath, characters_filepath,
+                         patty_filepath, rules_filepath]]
+    signatures = [(f, file_signature(f)) for f in source_filepaths]
+    cache_key = ('compiled_inputs', os.path.abspath(cache_filepath),
+                 tuple(signatures))
+
+    if cache_key in loaded_files_cache:
+        return(loaded_files_cache[cache_key])
+
+    inputs = None
+
+    try:
+        with open(cache_filepath, 'rb') as cache_file:
+            cached = pickle.load(cache_file)
+        if (cached.get('version') == cache_version and
+                cached.get('signatures') == signatures):
+            inputs = cached['inputs']
+    except Exception:
+        # e.g., a truncated file, or classes that this code no longer has
+        inputs = None
+
+    if inputs is None:
+        inputs = compile_inputs(characters_only_filepath, characters_filepath,
+                                patty_filepath, rules_filepath)
+        temp_filepath = cache_filepath + '.tmp'
+        with open(temp_filepath, 'wb') as cache_file:
+            pickle.dump({'version': cache_version, 'signatures': signatures,
+                         'inputs': inputs}, cache_file,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_filepath, cache_filepath)
+
+    loaded_files_cache[cache_key] = inputs
+
+    return(inputs)
+
+
+def default_rules_filepath():
+    '''
+    Returns path of the correction rules file 'correction_rules.json' in the
+        same directory as this script
+    '''
+
+    import os
+
+    script_path = os.path.dirname(os.path.abspath(__file__))
+    rules_filepath = os.path.join(script_path, 'correction_rules.json')
+
+    return(rules_filepath)
+
+
+def load_scenarios(scenarios_filepath, rules_filepath=None):
+    '''
+    Reads the scenarios of a batch run (see 'main') from the 'json' file
+        'scenarios_filepath'; the file has a 'version' and a list of
+        'scenarios', each a dictionary with:
+        'name' - name of the scenario and of the folder that its results are
+            saved to
+        'characters' - file of the words/phrases to search for
+            ('characters_and_more.txt' by default)
+        'characters_only' - file of the characters ('characters_only.txt' by
+            default)
+        'rules' - correction rules file ('rules_filepath' by default)
+        'possessives' - whether the possessives of the words/phrases are
+            searched for ('true' by default)
+        'rule_updates' - sections of the correction rules that replace those
+            of the rules file, e.g., '{"misidentifications": []}' to skip the
+            corrections of misidentified characters
+    Returns list of the scenarios, with the defaults filled in
+    '''
+
+    import json
+
+    supported_version = 1
+    defaults = {'characters': 'characters_and_more.txt',
+                'characters_only': 'characters_only.txt',
+                'rules': rules_filepath, 'possessives': True,
+                'rule_updates': {}}
+    rule_sections = ['merges', 'patty', 'appearances', 'misidentifications',
+                     'combined_columns']
+
+    with open(scenarios_filepath) as scenarios_file:
+        config = json.load(scenarios_file)
+
+    if config.get('version') != supported_version:
+        raise ValueError('Scenarios file {0} has version {1}; only version '
+                         '{2} is supported'.format(scenarios_filepath,
+                                                   config.get('version'),
+                                                   supported_version))
+
+    scenarios = []
+
+    for scenario in config['scenarios']:
+        unknown_keys = set(scenario) - set(defaults) - {'name'}
+        if 'name' not in scenario or unknown_keys:
+            raise ValueError('Each scenario needs a name and can only have '
+                             'the keys {0}; got {1}'.format(
+                                 sorted(defaults), sorted(scenario)))
+        unknown_sections = set(scenario.get('rule_updates', {})).difference(
+            rule_sections)
+        if unknown_sections:
+            raise ValueError("Scenario '{0}' updates unknown rule sections "
+                             '{1}'.format(scenario['name'],
+                                          sorted(unknown_sections)))
+        scenarios.append(dict(defaults, **scenario))
+
+    names = [scenario['name'] for scenario in scenarios]
+    if len(set(names)) != len(names) or not names:
+        raise ValueError('Scenarios must have distinct names; got {0}'
+                         .format(names))
+
+    return(scenarios)
+
+
+def union_word_pairs(word_lists):
+    '''
+    Returns list of the distinct adjacent pairs of words/phrases of all of
+        'word_lists' (e.g., a word and its possessive; see 'compile_inputs'),
+        in the order that they first appear, so that counting the list (see
+        'count_characters') counts each column of each of 'word_lists' once
+    '''
+
+    union = []
+    seen = set()
+
+    for word_list in word_lists:
+        for pair in zip(word_list[0::2], word_list[1::2]):
+            if pair not in seen:
+                seen.add(pair)
+                union.extend(pair)
+
+    return(union)
+
+
+def load_correction_rules(rules_filepath=None):
+    '''
+    Reads the rules for correcting the counts from the 'json' file
+        'rules_filepath' ('correction_rules.json' next to this script by
+        default); the rules are:
+        'merges' - names of columns to be merged (keys) and the names of the
+            new, merged columns (values)
+        'patty' - names of Patty and Peppermint Patty and the number of dates
+            at the end of the Peppermint Patty dates on which she is referred
+            to only as 'Patty'
+        'appearances' - first and last appearance dates of characters
+        'misidentifications' - dates on which a character was misidentified,
+            with the incorrect and correct characters
+        'combined_columns' - names of new columns (keys) that combine the
+            counts of several columns (values)
+    The rules file has a 'version' so that older or newer formats are not
+        misread
+    The rules are read from the file only once per process, unless the file
+        changes; each call returns its own copy of them
+    '''
+
+    import copy
+    import json
+    import os
+
+    supported_version = 1
+
+    if rules_filepath is None:
+        rules_filepath = default_rules_filepath()
+
+    # the file is read only once per process, unless it changes
+    rules_filepath = os.path.abspath(rules_filepath)
+    cache_key = ('rules', rules_filepath, file_signature(rules_filepath))
+
+    if cache_key not in loaded_files_cache:
+        with open(rules_filepath) as rules_file:
+            rules = json.load(rules_file)
+
+        if rules.get('version') != supported_version:
+            raise ValueError('Rules file {0} has version {1}; only version '
+                             '{2} is supported'.format(rules_filepath,
+                                                       rules.get('version'),
+                                                       supported_version))
+        n_reassigned_dates = rules['patty']['n_reassigned_dates']
+        if (not isinstance(n_reassigned_dates, int) or
+                isinstance(n_reassigned_dates, bool) or
+                n_reassigned_dates < 0):
+            raise ValueError("Rules file {0} has 'n_reassigned_dates' {1}; it "
+                             "must be a whole number of dates, '0' or more"
+                             .format(rules_filepath, n_reassigned_dates))
+        loaded_files_cache[cache_key] = rules
+
+    return(copy.deepcopy(loaded_files_cache[cache_key]))
+
+
+def characters_merge_dict(rules=None):
+    '''
+    Creates dictionary of keys naming characters and values of the names that
+        the keys should be reclassified under; this allows the data associated
+        with the keys to be associated with the value
+    The names are the 'merges' in the correction rules (see
+        'load_correction_rules'); if 'rules' aren't provided, they are read
+        from the default rules file
+    '''
+
+    if rules is None:
+        rules = load_correction_rules()
+
+    chars = dict(rules['merges'])
+
+    return(chars)
+
+
+def resolve_column_merges(column_names, merge_dict):
+    '''
+    Works out, from the column names alone, which columns are merged by the
+        repeated merging of two columns, including chains of merges in which a
+        merged column's new name is itself a key in 'merge_dict'
+    A column is merged if it's a key in 'merge_dict'; the key's value is the
+        new name for the merged column; if the new name is already a column,
+        the two columns are merged under it; otherwise, the column is merged
+        with a later column that has the same new name
+    The first column that can be merged is always merged first, and each
+        merged column is moved to the end of the columns, so the merged
+        columns are in the same order as if each pair of columns had been
+        merged in the table itself
+    Returns list of the names of the columns after all merges and list of
+        the positions in 'column_names' of the columns that were merged into
+        each of them
+    '''
+
+    names = list(column_names)
+    sources = [[j] for j in range(len(names))]
+    i = 0       # ensures termination of loop in case of unanticipated error
+
+    while i < len(names):
+
+        # a column can be merged if its new name is already a column or if
+        #   another column has the same new name
+        present = set(names)
+        n_with_new_name = {}
+        for name in names:
+            if name in merge_dict:
+                new_name = merge_dict[name]
+                n_with_new_name[new_name] = (
+                    n_with_new_name.get(new_name, 0) + 1)
+
+        col1_name, col2_name, new_name = '', '', ''
+
+        for j in range(len(names)):
+            if names[j] not in merge_dict:
+                continue
+            new_name = merge_dict[names[j]]
+            if new_name in present:
+                col1_name, col2_name = names[j], new_name
+                break
+            if n_with_new_name[new_name] > 1:
+                col1_name = names[j]
+                col2_name = [n for n in names[j+1:]
+                             if merge_dict.get(n) == new_name][0]
+                break
+
+        if not col1_name:
+            break
+
+        merged_sources = []
+        keep_names = []
+        keep_sources = []
+
+        for name, source in zip(names, sources):
+            if name in (col1_name, col2_name):
+                merged_sources.extend(source)
+            else:
+                keep_names.append(name)
+                keep_sources.append(source)
+
+        names = keep_names + [new_name]
+        sources = keep_sources + [sorted(merged_sources)]
+        i += 1
+
+    return(names, sources)
+
+
+def merge_count_matrix_columns(count_table, merged_names, merged_sources):
+    '''
+    Returns new 'CountMatrix' with one column for each name in 'merged_names';
+        each column is the Boolean disjunction ('or') of the columns of
+        'count_table' at the positions in the corresponding list in
+        'merged_sources' (see 'resolve_column_merges')
+    All columns are merged in a single pass over the rows of 'count_table'
+    '''
+
+    import numpy as np
+
+    order = [j for source in merged_sources for j in source]
+    group_starts = np.cumsum([0] + [len(source) for source in merged_sources])
+    n_bytes = (len(merged_names) + 7) // 8
+    bits = np.zeros(count_table.bits.shape[:-1] + (n_bytes, ), dtype=np.uint8)
+
+    for rows in count_matrix_row_chunks(count_table):
+        values = unpack_count_matrix(count_table, rows)[..., order]
+        merged = np.logical_or.reduceat(values, group_starts[:-1], axis=-1)
+        bits[..., rows, :] = np.packbits(merged, axis=-1)
+
+    return(CountMatrix(bits, list(merged_names)))
+
+
+def merge_character_counts_into_single_columns(count_table,
+                                               column_merges=None, rules=None):
+    '''
+    Inputs:  'count_table' is a 'CountMatrix' that tallies whether a
+        word or phrase (naming characters) appeared in items of text; each word
+        has its own column; each row corresponds to an item of text; if a word
+        appeared in a text item, the corresponding cell in the 'count_table'
+        is '1', otherwise it's '0'
+    Merges columns in 'count_table' as specified in the dictionary
+        'characters_merge', which names the columns to be merged (keys) and the
+        names of the new, merged columns (values)
+    The original columns that are merged are deleted from the 'count_table',
+        while the new, merged columns are added to the table
+    This allows characters with alternate spellings or names (e.g., 'Pig-Pen'
+        and 'Pig Pen' to be reclassified under a single column
+    'column_merges' - names and source columns of the merged columns from
+        'resolve_column_merges'; if not provided, they are resolved here from
+        the merges of the correction 'rules' (see 'characters_merge_dict')
+    Output:  'count_table' with the new, merged columns
+    '''
+
+    if column_merges is None:
+        column_merges = resolve_column_merges(count_table.columns,
+                                              characters_merge_dict(rules))
+
+    merged_names, merged_sources = column_merges
+    count_table = merge_count_matrix_columns(count_table, merged_names,
+                                             merged_sources)
+
+    return(count_table)
+
+
+def merge_characters_multiple_tables(counts, rules=None):
+    '''
+    Loops function 'merge_character_counts_into_single_columns' for each
+        count table in 'counts'
+    Description of 'merge_character_counts_into_single_columns':
+        Inputs:  'count_table' is a 'CountMatrix' that tallies whether a
+            word or phrase (naming characters) appeared in items of text; each word
+            has its own column; each row corresponds to an item of text; if a word
+            appeared in a text item, the corresponding cell in the 'count_table'
+            is '1', otherwise it's '0'
+        Merges columns in 'count_table' as specified in the dictionary
+            'characters_merge', which names the columns to be merged (keys) and the
+            names of the new, merged columns (values)
+        The original columns that are merged are deleted from the 'count_table',
+            while the new, merged columns are added to the table
+        This allows characters with alternate spellings or names (e.g., 'Pig-Pen'
+            and 'Pig Pen' to be reclassified under a single column
+    The merges are resolved once for all tables that have the same columns,
+        from the correction 'rules' (the default rules, if not provided)
+    If 'counts' is a stacked 'CountMatrix' (see 'count_characters'), all of its
+        tables are merged at once
+    '''
+
+    if isinstance(counts, CountMatrix):
+        return(merge_character_counts_into_single_columns(counts, rules=rules))
+
+    characters_merge = characters_merge_dict(rules)
+    column_merges = {}
+
+    for i in range(len(counts)):
+        columns = tuple(counts[i].columns)
+        if columns not in column_merges:
+            column_merges[columns] = resolve_column_merges(columns,
+                                                           characters_merge)
+        counts[i] = merge_character_counts_into_single_columns(
+            counts[i], column_merges[columns])
+
+    return(counts)
+
+
+def build_date_index(dates_column):
+    '''
+    Builds an index of the rows of each date in 'dates_column', a Pandas Data
+        Series with dates/filenames, so that the rows of any date or range of
+        dates can be found without scanning 'dates_column'
+    The rows must be sorted by date, with all panels of a comic in adjacent
+        rows, so that each date's rows are a single range of rows
+    Returns dictionary with NumPy arrays of the sorted, unique dates ('dates')
+        and the first row ('starts') and the row after the last row ('stops')
+        of each date
+    '''
+
+    import numpy as np
+
+    dates = np.asarray(dates_column.values)
+    n_rows = len(dates)
+
+    if n_rows == 0:
+        return({'dates': dates, 'starts': np.zeros(0, dtype=np.int64),
+                'stops': np.zeros(0, dtype=np.int64)})
+
+    changes = np.flatnonzero(dates[1:] != dates[:-1]) + 1
+    starts = np.concatenate([[0], changes]).astype(np.int64)
+    stops = np.concatenate([changes, [n_rows]]).astype(np.int64)
+    unique_dates = dates[starts]
+
+    if (unique_dates[1:] <= unique_dates[:-1]).any():
+        raise ValueError('Rows must be sorted by date, with all panels of a '
+                         'comic in adjacent rows')
+
+    date_index = {'dates': unique_dates, 'starts': starts, 'stops': stops}
+
+    return(date_index)
+
+
+def date_index_rows(date_index, dates):
+    '''
+    Returns NumPy array of the rows of each date in 'dates' that is in the
+        index from 'build_date_index'; dates that are not in the index have no
+        rows
+    '''
+
+    import numpy as np
+
+    dates = np.asarray(sorted(set(dates)), dtype=object)
+    positions = np.searchsorted(date_index['dates'], dates)
+    positions = positions[positions < len(date_index['dates'])]
+    positions = positions[np.isin(date_index['dates'][positions], dates)]
+
+    rows = [np.arange(date_index['starts'][p], date_index['stops'][p])
+            for p in positions]
+    rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+
+    return(rows)
+
+
+def date_index_row_range(date_index, start_date, end_date):
+    '''
+    Returns the first row with a date on or after 'start_date' and the row
+        after the last row with a date on or before 'end_date' from the index
+        from 'build_date_index'
+    '''
+
+    import numpy as np
+
+    first = np.searchsorted(date_index['dates'], start_date, side='left')
+    last = np.searchsorted(date_index['dates'], end_date, side='right')
+
+    if first < len(date_index['starts']):
+        start_row = date_index['starts'][first]
+    else:
+        start_row = date_index['stops'][-1] if len(date_index['stops']) else 0
+
+    stop_row = date_index['stops'][last - 1] if last > 0 else 0
+
+    return(start_row, stop_row)
+
+
+def patty_reassigned_dates(pep_patty_dates, patty):
+    '''
+    Returns the last dates of 'pep_patty_dates', on which Peppermint Patty is
+        referred to only as 'Patty'; their number is 'n_reassigned_dates' of
+        the 'patty' correction rule (see 'load_correction_rules')
+    Raises 'ValueError' if the rule names more dates than there are
+    '''
+
+    n_reassigned_dates = patty['n_reassigned_dates']
+
+    if n_reassigned_dates > len(pep_patty_dates):
+        raise ValueError("The 'patty' rule reassigns {0} dates, but there are "
+                         "only {1} Peppermint Patty dates".format(
+                             n_reassigned_dates, len(pep_patty_dates)))
+
+    return(pep_patty_dates[len(pep_patty_dates) - n_reassigned_dates:])
+
+
+def adjust_patty_counts_in_table(dates_column, count_table, pep_patty_dates,
+                                 date_index=None, rules=None):
+    '''
+    Adjusts counts for Patty and Peppermint Patty
+    On her last few dates, Peppermint Patty is referred to only as 'Patty', so
+        'patty' counts are reassigned to 'peppermint patty' for these dates
+    Peppermint Patty and Patty never appear in a comic together, so all 'patty'
+        counts on Peppermint Patty appearance dates are set to '0', indicating
+        that she didn't appear
+    The names and the number of reassigned dates are the 'patty' rule of the
+        correction 'rules' (see 'load_correction_rules'); if 'rules' aren't
+        provided, they are read from the default rules file
+    'date_index' - index of the rows of each date from 'build_date_index'; if
+        not provided, it is built here from 'dates_column'
+    '''
+
+    if date_index is None:
+        date_index = build_date_index(dates_column)
+    if rules is None:
+        rules = load_correction_rules()
+
+    patty = rules['patty']
+
+    # the dates at end are when Peppermint Patty is referred to only as 'Patty'
+    add_pep_dates = patty_reassigned_dates(pep_patty_dates, patty)
+
+    # for these dates, assign 'patty' counts to 'peppermint patty'
+    idx = date_index_rows(date_index, add_pep_dates)
+    set_count_matrix_column(count_table, patty['other_character'],
+                            get_count_matrix_column(count_table,
+                                                    patty['character'], idx),
+                            idx)
+
+    # for dates when Peppermint Patty appears, remove any appearances for 'Patty'
+    # (they never appear in a comic together)
+    idx = date_index_rows(date_index, pep_patty_dates)
+    set_count_matrix_column(count_table, patty['character'], 0, idx)
+
+    return(count_table)
+
+
+def adjust_patty_counts_multiple_tables(dates_column, counts, pep_patty_dates,
+                                        date_index=None, rules=None):
+    '''
+    Loops function 'adjust_patty_counts_in_table' for each
+        count table in 'counts'
+    Description of 'adjust_patty_counts_in_table':
+        Adjusts counts for Patty and Peppermint Patty
+        For 5 dates, Peppermint Patty is referred to only as 'Patty', so 'patty'
+            counts are reassigned to 'peppermint patty' for these dates
+        Peppermint Patty and Patty never appear in a comic together, so all 'patty'
+            counts on Peppermint Patty appearance dates are set to '0', indicating
+            that she didn't appear
+    The index of the rows of each date ('date_index', see 'build_date_index')
+        is built once for all tables, and the correction 'rules' are read once
+        if they aren't provided
+    If 'counts' is a stacked 'CountMatrix' (see 'count_characters'), all of its
+        tables are adjusted at once
+    '''
+
+    if date_index is None:
+        date_index = build_date_index(dates_column)
+    if rules is None:
+        rules = load_correction_rules()
+
+    if isinstance(counts, CountMatrix):
+        return(adjust_patty_counts_in_table(dates_column, counts,
+                                            pep_patty_dates, date_index,
+                                            rules))
+
+    for i in range(len(counts)):
+        counts[i] = adjust_patty_counts_in_table(dates_column, counts[i],
+                                                 pep_patty_dates, date_index,
+                                                 rules)
+
+    return(counts)
+
+
+def create_appearances_dict(rules=None):
+    '''
+    Creates dictionary of first and last appearances (or mentions, sometimes)
+        for several characters in the Peanuts comic strip
+    The dates are the 'appearances' in the correction rules (see
+        'load_correction_rules'); if 'rules' aren't provided, they are read
+        from the default rules file
+    '''
+
+    if rules is None:
+        rules = load_correction_rules()
+
+    dates = {character: [appearance['first'], appearance['last']]
+             for character, appearance in rules['appearances'].items()}
+
+    return(dates)
+
+
+def adjust_counts_by_appearance_dates_in_table(dates_column, count_table,
+                                               date_index=None, rules=None):
+    '''
+    Adjusts counts so that characters can't appear before their debut dates or
+        after their final dates in the comic strip
+    Characters might erroneously appear outside their appearance dates because
+        of typoes or non-specific uses of their names (e.g., 'sally', 'rerun',
+        'violet', and 'spike' have meanings beyond the characters' names
+    The dates are the 'appearances' of the correction 'rules' (see
+        'create_appearances_dict'); if 'rules' aren't provided, they are read
+        from the default rules file
+    'date_index' - index of the rows of each date from 'build_date_index'; if
+        not provided, it is built here from 'dates_column'
+    '''
+
+    if date_index is None:
+        date_index = build_date_index(dates_column)
+
+    dates = create_appearances_dict(rules)
+    column_names = count_table.columns
+
+    for i in range(len(column_names)):
+
+        if column_names[i] in dates:
+            start_end_dates = dates[column_names[i]]
+            start_idx, end_idx = date_index_row_range(
+                date_index, start_end_dates[0], start_end_dates[1])
+            set_count_matrix_column(count_table, i, 0, slice(None, start_idx))
+            set_count_matrix_column(count_table, i, 0, slice(end_idx, None))
+
+    return(count_table)
+
+
+def adjust_counts_by_appearance_dates_multiple_tables(dates_column, counts,
+                                                      date_index=None,
+                                                      rules=None):
+    '''
+    Loops function 'adjust_counts_in_table_by_appearance_dates' for each
+        count table in 'counts'
+    Description of 'adjust_counts_in_table_by_appearance_dates':
+        Adjusts counts so that characters can't appear before their debut dates or
+            after their final dates in the comic strip
+        Characters might erroneously appear outside their appearance dates because
+            of typoes or non-specific uses of their names (e.g., 'sally', 'rerun',
+            'violet', and 'spike' have meanings beyond the characters' names
+    The index of the rows of each date ('date_index', see 'build_date_index')
+        is built once for all tables, and the correction 'rules' are read once
+        if they aren't provided
+    If 'counts' is a stacked 'CountMatrix' (see 'count_characters'), all of its
+        tables are adjusted at once
+    '''
+
+    if date_index is None:
+        date_index = build_date_index(dates_column)
+    if rules is None:
+        rules = load_correction_rules()
+
+    if isinstance(counts, CountMatrix):
+        return(adjust_counts_by_appearance_dates_in_table(dates_column, counts,
+                                                          date_index, rules))
+
+    for i in range(len(counts)):
+        counts[i] = adjust_counts_by_appearance_dates_in_table(dates_column,
+                                                               counts[i],
+                                                               date_index,
+                                                               rules)
+
+    return(counts)
+
+
+def correct_misidentified_characters_in_table(dates_column, count_table,
+                                              misidentifications,
+                                              date_index=None):
+    '''
+    Switches characters' counts on dates when a character was misidentified
+    'dates_column' - Pandas Data Series with dates/filenames
+    'count_table' - 'CountMatrix' that tallies whether a word or phrase
+        (naming characters) appeared in items of text; each word has its own
+        column; each row corresponds to an item of text; if a word appeared in a
+        text item, the corresponding cell in the 'count_table' is '1', otherwise
+        it's '0'
+    'misidentifications' - list of lists, each of which contains 3 items:
+        the date/filename of the comic in which a character was misidentified,
+        the incorrect character that appears in the text description of the
+        comic, and the correct character who actually appears in the comic
+    'date_index' - index of the rows of each date from 'build_date_index'; if
+        not provided, it is built here from 'dates_column'
+    Returns corrected 'count_table'
+    '''
+
+    if date_index is None:
+        date_index = build_date_index(dates_column)
+
+    for i in range(len(misidentifications)):
+
+        idx = date_index_rows(date_index, [misidentifications[i][0]])
+        temp = get_count_matrix_column(count_table, misidentifications[i][2],
+                                       idx)
+        other = get_count_matrix_column(count_table, misidentifications[i][1],
+                                        idx)
+        set_count_matrix_column(count_table, misidentifications[i][2], other,
+                                idx)
+        set_count_matrix_column(count_table, misidentifications[i][1], temp,
+                                idx)
+
+    return(count_table)
+
+
+def correct_misidentified_characters_multiple_tables(dates_column, counts,
+                                                     misidentifications,
+                                                     date_index=None):
+    '''
+    Loops function 'correct_misidentified_characters_in_table' for each
+        count table in 'counts'
+    Description of 'correct_misidentified_characters_in_table':
+        Switches characters' counts on dates when a character was misidentified
+        'dates_column' - Pandas Data Series with dates/filenames
+        'count_table' - 'CountMatrix' that tallies whether a word or phrase
+            (naming characters) appeared in items of text; each word has its own
+            column; each row corresponds to an item of text; if a word appeared in a
+            text item, the corresponding cell in the 'count_table' is '1', otherwise
+            it's '0'
+        'misidentifications' - list of lists, each of which contains 3 items:
+            the date/filename of the comic in which a character was misidentified,
+            the incorrect character that appears in the text description of the
+            comic, and the correct character who actually appears in the comic
+        Returns corrected 'count_table'
+    The index of the rows of each date ('date_index', see 'build_date_index')
+        is built once for all tables
+    If 'counts' is a stacked 'CountMatrix' (see 'count_characters'), all of its
+        tables are corrected at once
+    '''
+
+    if date_index is None:
+        date_index = build_date_index(dates_column)
+
+    if isinstance(counts, CountMatrix):
+        return(correct_misidentified_characters_in_table(
+            dates_column, counts, misidentifications, date_index))
+
+    for i in range(len(counts)):
+        counts[i] = correct_misidentified_characters_in_table(dates_column,
+                                                counts[i], misidentifications,
+                                                date_index)
+
+    return(counts)
+
+
+def snoopy_and_personas_in_table(count_table, rules=None):
+    '''
+    Adds column to 'count_table' that counts Snoopy and his personas, in case
+        some text descriptions refer to him by the persona and not by 'Snoopy',
+        which would undercount Snoopy's appearances
+    The personas are the 'combined_columns' of 'snoopy and personas' in the
+        correction 'rules' (see 'load_correction_rules'); if 'rules' aren't
+        provided, they are read from the default rules file
+    '''
+
+    if rules is None:
+        rules = load_correction_rules()
+    personas = rules['combined_columns']['snoopy and personas']
+
+    count_table = append_count_matrix_column(
+        count_table, 'snoopy and personas',
+        count_matrix_rows_with_any(count_table, personas))
+
+    return(count_table)
+
+
+def snoopy_and_personas_multiple_tables(counts, rules=None):
+    '''
+    Loops function 'snoopy_and_personas_in_table' for each
         count table in 'counts'
-    Description of 'adjust_counts_in_table_by_appearance_dates':
-        Adjusts counts so that characters can't appear before their debut dates or
-            after their final dates in the comic strip
-        Characters might erroneously appear outside their appearance dates because
-            of typoes or non-specific uses of their names (e.g., 'sally', 'rerun',
-            'violet', and 'spike' have meanings beyond the characters' names
+    Description of 'snoopy_and_personas_in_table':
+        Adds column to 'count_table' that counts Snoopy and his personas, in case
+            some text descriptions refer to him by the persona and not by 'Snoopy',
+            which would undercount Snoopy's appearances
+    The correction 'rules' are read once if they aren't provided
+    If 'counts' is a stacked 'CountMatrix' (see 'count_characters'), the column
+        is added to all of its tables at once
+    '''
+
+    if rules is None:
+        rules = load_correction_rules()
+
+    if isinstance(counts, CountMatrix):
+        return(snoopy_and_personas_in_table(counts, rules))
+
+    for i in range(len(counts)):
+        counts[i] = snoopy_and_personas_in_table(counts[i], rules)
+
+    return(counts)
+
+
+def compile_rule_plan(rules, column_names, date_index, pep_patty_dates):
+    '''
+    Compiles the correction rules (see 'load_correction_rules') for count
+        tables with the columns 'column_names' into an ordered plan of steps
+    Dates are looked up in 'date_index' (see 'build_date_index') and the
+        merged columns are resolved (see 'resolve_column_merges') only once,
+        when the plan is compiled, so applying the plan only updates the rows
+        and columns named in each step
+    'pep_patty_dates' - dates when Peppermint Patty appears
+    Returns list of stages, in the order that they are applied; each stage is
+        a tuple of its name and its list of steps; each step is a tuple whose
+        first item names its action:
+        ('merge', merged_names, merged_sources) - merges columns
+        ('copy', source_column, target_column, rows) - copies counts
+        ('set', column, value, rows) - sets counts to 'value'
+        ('swap', column1, column2, rows) - switches counts of 2 columns
+        ('combine', new_column, source_columns) - adds column that combines
+            the counts of 'source_columns' with Boolean 'or'
+    '''
+
+    plan = []
+
+    # merge counts for multiple search terms into single column with single
+    # name, e.g., counts for 'Pig-Pen' and 'Pig Pen' are merged together under
+    # 'Pig-Pen'
+    merged_names, merged_sources = resolve_column_merges(column_names,
+                                                         rules['merges'])
+    plan.append(('merge', [('merge', merged_names, merged_sources)]))
+
+    # correct counts to distinguish between Patty and Peppermint Patty; on the
+    # last few dates Peppermint Patty is referred to only as 'Patty', and they
+    # never appear in a comic together
+    patty = rules['patty']
+    add_pep_dates = patty_reassigned_dates(pep_patty_dates, patty)
+    steps = [('copy', patty['character'], patty['other_character'],
+              date_index_rows(date_index, add_pep_dates)),
+             ('set', patty['character'], 0,
+              date_index_rows(date_index, pep_patty_dates))]
+    plan.append(('patty', steps))
+
+    # remove appearances/mentions that occur outside a character's appearance
+    # dates
+    appearances = rules['appearances']
+    steps = []
+    for j in range(len(merged_names)):
+        if merged_names[j] in appearances:
+            appearance = appearances[merged_names[j]]
+            start_row, stop_row = date_index_row_range(
+                date_index, appearance['first'], appearance['last'])
+            steps.append(('set', j, 0, slice(None, start_row)))
+            steps.append(('set', j, 0, slice(stop_row, None)))
+    plan.append(('appearances', steps))
+
+    # correct counts for characters misidentified in text descriptions
+    steps = [('swap', m['incorrect'], m['correct'],
+              date_index_rows(date_index, [m['date']]))
+             for m in rules['misidentifications']]
+    plan.append(('misidentifications', steps))
+
+    # add columns that combine several columns, e.g., Snoopy and his personas
+    steps = [('combine', new_column, source_columns)
+             for new_column, source_columns in
+             rules['combined_columns'].items()]
+    plan.append(('combined_columns', steps))
+
+    return(plan)
+
+
+def apply_rule_steps(counts, steps):
+    '''
+    Applies the steps of a stage of a rule plan (see 'compile_rule_plan') to
+        'counts', a 'CountMatrix'; if 'counts' stacks several count tables (see
+        'count_characters'), each step is applied to all tables at once
+    Each step updates only the rows and columns that it names
+    '''
+
+    for step in steps:
+        action = step[0]
+
+        if action == 'merge':
+            counts = merge_count_matrix_columns(counts, step[1], step[2])
+
+        elif action == 'copy':
+            values = get_count_matrix_column(counts, step[1], step[3])
+            set_count_matrix_column(counts, step[2], values, step[3])
+
+        elif action == 'set':
+            set_count_matrix_column(counts, step[1], step[2], step[3])
+
+        elif action == 'swap':
+            values1 = get_count_matrix_column(counts, step[1], step[3])
+            values2 = get_count_matrix_column(counts, step[2], step[3])
+            set_count_matrix_column(counts, step[1], values2, step[3])
+            set_count_matrix_column(counts, step[2], values1, step[3])
+
+        elif action == 'combine':
+            counts = append_count_matrix_column(
+                counts, step[1], count_matrix_rows_with_any(counts, step[2]))
+
+        else:
+            raise ValueError('Unknown rule step {0}'.format(action))
+
+    return(counts)
+
+
+def column_sums_in_rows(counts, column, rows=slice(None)):
+    '''
+    Returns NumPy array of the sums of the counts in 'rows' of 'column' of each
+        count table of 'counts', a stacked 'CountMatrix' (see
+        'count_characters'), and of the Boolean 'or' of count tables 1 to 4, in
+        the order of 'counts_summary_column_sums', along with the counts
+        themselves
+    '''
+
+    import numpy as np
+
+    values = get_count_matrix_column(counts, column, rows)
+    sums = np.append(values.sum(axis=-1), values[1:5].any(axis=0).sum())
+
+    return(sums, values)
+
+
+def rule_audit_record(step_number, action, column, changed_counts, delta):
+    '''
+    Returns dictionary that records the change that a step of a rule plan (see
+        'compile_rule_plan') made to a column:  the number of counts that it
+        changed, i.e., of the column's rows in all count tables that had a
+        count before the step and not after it, or the reverse, and the change
+        in each column of the column's summary (see
+        'counts_summary_table_from_sums') that it made, from the change in the
+        column's sums 'delta' (see 'column_sums_in_rows')
+    '''
+
+    record = {'step': step_number, 'action': action, 'column': column,
+              'changed_counts': int(changed_counts),
+              'overall': int(delta[0]), 'nontalk': int(delta[1] + delta[4]),
+              'talk': int(delta[2]), 'oddq': int(delta[3]),
+              'sum': int(delta[5])}
+
+    return(record)
+
+
+def apply_rule_steps_with_sums(counts, steps, column_sums):
+    '''
+    Applies the steps of a stage of a rule plan to 'counts', a stacked
+        'CountMatrix', as 'apply_rule_steps' does, and updates its column sums
+        'column_sums' (see 'counts_summary_column_sums') by the changes that
+        each step makes, so that the corrected counts don't have to be summed
+        again:
+        'copy', 'set' and 'swap' - only the rows and columns that the step
+            changes are summed, before and after the step
+        'merge' - the sums of columns that aren't merged with any other column
+            are kept; only columns merged from several columns are summed
+        'combine' - only the new column is summed
+    Returns the corrected counts, their column sums, and list of the changes
+        that each step made to each column (see 'rule_audit_record')
+    '''
+
+    import numpy as np
+    import pandas as pd
+
+    sums = np.array([s.values for s in column_sums], dtype=np.int64)
+    audit = []
+
+    for i, step in enumerate(steps):
+        action = step[0]
+
+        if action == 'merge':
+            merged_names, merged_sources = step[1], step[2]
+            merged = [j for j in range(len(merged_names))
+                      if len(merged_sources[j]) > 1]
+            # the counts that a merged column had under its name, if any
+            before_values = {
+                j: (get_count_matrix_column(counts, merged_names[j])
+                    if merged_names[j] in counts.columns else False)
+                for j in merged}
+            counts = apply_rule_steps(counts, [step])
+            merged_sums = np.zeros((len(sums), len(merged_names)),
+                                   dtype=np.int64)
+            for j in range(len(merged_names)):
+                if len(merged_sources[j]) == 1:
+                    merged_sums[:, j] = sums[:, merged_sources[j][0]]
+            if merged:
+                merged_column_sums = counts_summary_column_sums(
+                    select_count_matrix_columns(counts, merged))
+                merged_sums[:, merged] = np.array(
+                    [s.values for s in merged_column_sums])
+            for j in merged:
+                # the counts of the merged columns that were in the same rows
+                delta = (merged_sums[:, j] -
+                         sums[:, merged_sources[j]].sum(axis=-1))
+                after_values = get_count_matrix_column(counts,
+                                                       merged_names[j])
+                audit.append(rule_audit_record(
+                    i, action, merged_names[j],
+                    (before_values[j] != after_values).sum(), delta))
+            sums = merged_sums
+
+        elif action in ('copy', 'set', 'swap'):
+            rows = step[3]
+            changed_columns = {'copy': [step[2]], 'set': [step[1]],
+                               'swap': [step[1], step[2]]}[action]
+            before = [column_sums_in_rows(counts, c, rows)
+                      for c in changed_columns]
+            counts = apply_rule_steps(counts, [step])
+            for column, (before_sums, before_values) in zip(changed_columns,
+                                                            before):
+                after_sums, after_values = column_sums_in_rows(counts, column,
+                                                               rows)
+                j = count_matrix_column_index(counts, column)
+                sums[:, j] += after_sums - before_sums
+                audit.append(rule_audit_record(
+                    i, action, counts.columns[j],
+                    (before_values != after_values).sum(),
+                    after_sums - before_sums))
+
+        elif action == 'combine':
+            if step[1] in counts.columns:
+                before_sums, before_values = column_sums_in_rows(counts,
+                                                                 step[1])
+            else:
+                before_sums = np.zeros(len(sums), dtype=np.int64)
+                before_values = False
+                sums = np.concatenate(
+                    [sums, np.zeros((len(sums), 1), dtype=np.int64)], axis=1)
+            counts = apply_rule_steps(counts, [step])
+            after_sums, after_values = column_sums_in_rows(counts, step[1])
+            sums[:, count_matrix_column_index(counts, step[1])] = after_sums
+            audit.append(rule_audit_record(
+                i, action, step[1], (before_values != after_values).sum(),
+                after_sums - before_sums))
+
+        else:
+            raise ValueError('Unknown rule step {0}'.format(action))
+
+    column_sums = [pd.Series(sums[k], index=counts.columns)
+                   for k in range(len(sums))]
+
+    return(counts, column_sums, audit)
+
+
+def rule_audit_table(audit):
+    '''
+    Returns table of the changes that the steps of a rule plan made to each
+        column (see 'apply_rule_steps_with_sums'), indexed by stage, step,
+        action and column; 'audit' is a list of the changes of each stage
+        with the stage's name as 'stage', possibly of several chunks of rows,
+        whose changes are added together
+    '''
+
+    import pandas as pd
+
+    keys = ['stage', 'step', 'action', 'column']
+    values = ['changed_counts', 'overall', 'nontalk', 'talk', 'oddq', 'sum']
+    table = pd.DataFrame(audit, columns=keys + values)
+    table = table.groupby(keys, sort=False)[values].sum()
+
+    return(table)
+
+
+def save_tables_to_csv(list_of_tables, list_of_filenames, mode='w',
+                       first_row=0):
+    '''
+    Saves Pandas DataFrames/tables in a list to 'csv' files
+    Each 'CountMatrix' in the list is expanded into a table a chunk of rows at
+        a time, so that the whole table is never expanded at once; its rows are
+        numbered from 'first_row'
+    If 'mode' is 'a', the tables are appended to the files without their
+        headers, so that a table can be saved one chunk of rows at a time
+    '''
+
+    for i in range(len(list_of_tables)):
+        if isinstance(list_of_tables[i], CountMatrix):
+            table_mode = mode
+            for rows in count_matrix_row_chunks(list_of_tables[i]):
+                table = count_matrix_to_dataframe(list_of_tables[i], rows)
+                table.index += first_row
+                table.to_csv(list_of_filenames[i] + '.csv', sep=',',
+                             index=True, mode=table_mode,
+                             header=(table_mode == 'w'))
+                table_mode = 'a'
+        else:
+            list_of_tables[i].to_csv(list_of_filenames[i] + '.csv',
+                                     sep=',', index=True, mode=mode,
+                                     header=(mode == 'w'))
+
+
+def save_tables_to_parquet(list_of_tables, list_of_filenames,
+                           parquet_writers, first_row=0):
+    '''
+    Saves Pandas DataFrames/tables in a list to compressed, columnar 'parquet'
+        files, with the index of each table as its first column
+    Each 'CountMatrix' in the list is expanded into a table of Boolean counts a
+        chunk of rows at a time, with its rows numbered from 'first_row'
+    'parquet_writers' - dictionary of the file names and the open
+        'ParquetWriter' of each file; each table is appended to its file as new
+        row groups, so that a table can be saved one chunk of rows at a time;
+        the files are complete only after 'close_parquet_writers'
+    '''
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    for i in range(len(list_of_tables)):
+        filename = list_of_filenames[i] + '.parquet'
+
+        if isinstance(list_of_tables[i], CountMatrix):
+            tables = []
+            for rows in count_matrix_row_chunks(list_of_tables[i]):
+                table = count_matrix_to_dataframe(list_of_tables[i],
+                                                  rows).astype(bool)
+                table.index += first_row
+                tables.append(table)
+        else:
+            tables = [list_of_tables[i]]
+
+        for table in tables:
+            arrow_table = pa.Table.from_pandas(table, preserve_index=True)
+            if filename not in parquet_writers:
+                parquet_writers[filename] = pq.ParquetWriter(
+                    filename, arrow_table.schema, compression='zstd')
+            parquet_writers[filename].write_table(arrow_table)
+
+
+def close_parquet_writers(parquet_writers):
+    '''
+    Closes the open 'ParquetWriter' of each file in 'parquet_writers' (see
+        'save_tables_to_parquet')
+    '''
+
+    for filename in list(parquet_writers.keys()):
+        parquet_writers.pop(filename).close()
+
+
+def save_tables(list_of_tables, list_of_filenames, mode='w', first_row=0,
+                output_format='csv', parquet_writers=None):
+    '''
+    Saves Pandas DataFrames/tables and 'CountMatrix' in a list to 'csv' files
+        (see 'save_tables_to_csv') or to 'parquet' files (see
+        'save_tables_to_parquet'), depending on 'output_format'
+    'parquet_writers' - dictionary of open 'parquet' files that the tables are
+        appended to; required if 'output_format' is 'parquet'
+    '''
+
+    if output_format == 'csv':
+        save_tables_to_csv(list_of_tables, list_of_filenames, mode, first_row)
+
+    elif output_format == 'parquet':
+        save_tables_to_parquet(list_of_tables, list_of_filenames,
+                               parquet_writers, first_row)
+
+    else:
+        raise ValueError("'output_format' must be 'csv' or 'parquet'")
+
+
+def new_table_writer(workers=1, max_pending_mb=1024, output_format='csv'):
+    '''
+    Returns a new writer that saves tables in the background (see
+        'submit_tables'), so that the tables are written while the next stages
+        are computed, until it is closed (see 'close_table_writer')
+    'workers' - number of threads that save the tables; the writes to each
+        file are always made in the order that they were submitted, so that
+        the chunks of a table are appended in order
+    'max_pending_mb' - megabytes of submitted tables that may wait to be
+        written; a submission that would exceed it waits until enough tables
+        have been written, so that tables aren't produced faster than they can
+        be written while memory is held for them
+    'output_format' - 'csv' or 'parquet' (see 'save_tables')
+    '''
+
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+
+    if output_format not in ('csv', 'parquet'):
+        raise ValueError("'output_format' must be 'csv' or 'parquet'")
+
+    writer = {'executor': ThreadPoolExecutor(max_workers=max(1, workers)),
+              'output_format': output_format, 'parquet_writers': {},
+              'max_pending_bytes': max_pending_mb * 1024 * 1024,
+              'pending_bytes': 0, 'condition': threading.Condition(),
+              'last_writes': {}, 'errors': [], 'tables': 0,
+              'write_seconds': 0.0, 'wait_seconds': 0.0}
+
+    return(writer)
+
+
+def table_nbytes(table):
+    '''
+    Returns the number of bytes of memory of the values of 'table', a Pandas
+        DataFrame or a 'CountMatrix'
+    '''
+
+    if isinstance(table, CountMatrix):
+        return(table.bits.nbytes)
+
+    return(int(table.memory_usage(index=True).sum()))
+
+
+def submit_write(writer, filename, write_function, nbytes=0):
+    '''
+    Submits 'write_function', which writes the file 'filename', to the
+        background threads of 'writer' (see 'new_table_writer') once the
+        earlier writes to 'filename' have finished
+    Waits first while the tables already waiting to be written and the 'nbytes'
+        of this write would exceed the writer's 'max_pending_mb'
+    If the write fails, the error is kept until 'close_table_writer' and the
+        later writes to 'filename' are skipped
+    '''
+
+    import time
+    from concurrent.futures import wait
+
+    condition = writer['condition']
+    start = time.perf_counter()
+
+    with condition:
+        while (writer['pending_bytes'] and
+               writer['pending_bytes'] + nbytes > writer['max_pending_bytes']):
+            condition.wait()
+        writer['pending_bytes'] += nbytes
+
+    writer['wait_seconds'] += time.perf_counter() - start
+    previous_write = writer['last_writes'].get(filename)
+
+    def write():
+        try:
+            if previous_write is not None:
+                wait([previous_write])
+            if any(error[0] == filename for error in writer['errors']):
+                return
+            write_start = time.perf_counter()
+            write_function()
+            with condition:
+                writer['write_seconds'] += time.perf_counter() - write_start
+        except Exception as error:
+            with condition:
+                writer['errors'].append((filename, error))
+        finally:
+            with condition:
+                writer['pending_bytes'] -= nbytes
+                condition.notify_all()
+
+    writer['last_writes'][filename] = writer['executor'].submit(write)
+
+
+def submit_tables(writer, list_of_tables, list_of_filenames, mode='w',
+                  first_row=0):
+    '''
+    Submits each table in 'list_of_tables' to be saved in the background by
+        'writer' (see 'new_table_writer'), as 'save_tables' saves it
+    The tables must not be changed after they are submitted
+    '''
+
+    for i in range(len(list_of_tables)):
+        table = list_of_tables[i]
+        filename = list_of_filenames[i]
+
+        def write_table(table=table, filename=filename):
+            save_tables([table], [filename], mode, first_row,
+                        writer['output_format'], writer['parquet_writers'])
+
+        submit_write(writer, filename, write_table, table_nbytes(table))
+        writer['tables'] += 1
+
+
+def close_table_writer(writer):
+    '''
+    Waits until all tables submitted to 'writer' (see 'new_table_writer') are
+        written, then stops its threads and closes its 'parquet' files
+    Returns dictionary of the number of 'tables' written, the seconds spent
+        writing them in the background ('write_seconds') and the seconds that
+        submissions waited for memory ('wait_seconds')
+    Raises 'IOError' naming every file that couldn't be written, from the first
+        of their errors
+    '''
+
+    writer['executor'].shutdown(wait=True)
+    close_parquet_writers(writer['parquet_writers'])
+
+    if writer['errors']:
+        filenames = sorted(set(error[0] for error in writer['errors']))
+        raise IOError('{0} of the output files could not be written:  {1}'
+                      .format(len(filenames), ', '.join(filenames))
+                      ) from writer['errors'][0][1]
+
+    return({'tables': writer['tables'],
+            'write_seconds': writer['write_seconds'],
+            'wait_seconds': writer['wait_seconds']})
+
+
+def counts_by_comic_multiple_tables(dates_column, num_panels_column,
+                                    panels_with_characters, counts,
+                                    date_index=None):
+    '''
+    Groups panels by comic strip date, so that each row represents a comic (with
+        1 or more panels) instead of a panel
+    'dates_column' - Pandas Data Series with dates/filenames
+    'num_panels_column' - Pandas Data Series with number of panels in that comic
+    'counts' - stacked 'CountMatrix' (see 'count_characters') or list of
+        'CountMatrix' that tally whether a word or phrase
+        (naming characters) appeared in items of text (each item corresponds to
+        a panel); each word has its own column; each row corresponds to an item
+        of text; if a word appeared in a text item, the corresponding cell in
+        the 'count_table' is '1', otherwise it's '0'
+    'panel_counts_by_comic' - counts are summed over panels per comic, i.e., in
+        how many panels did this character appear in the comic?
+    'counts_by_comic' - panel counts per comic are transformed into Boolean; did
+        the character appear in this comic, yes or no?
+    'proportions_by_comic' - summed counts per comic are divided by the number
+        of panels in that comic
+    'props_w_chars_by_comic' - summed counts per comic are divided by the number
+        of panels that include a mention of a character in that comic; e.g., if
+        the text description of a 4-panel comic mentions 'Snoopy' only once in
+        the 1st panel and thereafter refers to him as 'he', then
+        'proportions_by_comic' counts Snoopy's proportion as 1 / 4 = 0.25,
+        whereas 'props_w_chars_by_comic' counts Snoopy at 1 / 1 = 1
+    'date_index' - index of the rows of each date (see 'build_date_index');
+        the panels of each comic are adjacent rows, so all per-comic counts
+        are summed over the comics' ranges of rows at once (see
+        'sum_count_matrix_by_segments') instead of grouping the rows by date
+    '''
+
+    import numpy as np
+    import pandas as pd
+
+    if date_index is None:
+        date_index = build_date_index(dates_column)
+    if not isinstance(counts, CountMatrix):
+        counts = stack_count_matrices(counts)
+
+    starts = date_index['starts']
+    comics = pd.Index(date_index['dates'], name=dates_column.name)
+
+    # each panel of a comic has the comic's number of panels
+    num_panels = np.asarray(num_panels_column.values)
+    if len(starts) and (np.minimum.reduceat(num_panels, starts) ==
+                        np.maximum.reduceat(num_panels, starts)).all():
+        num_panels_by_comic = num_panels[starts].astype(np.float64)
+    else:
+        num_panels_by_comic = (
+            num_panels_column.groupby(dates_column).median().values)
+
+    if len(starts):
+        num_panels_w_chars_by_comic = np.add.reduceat(
+            np.asarray(panels_with_characters, dtype=np.int64), starts)
+    else:
+        num_panels_w_chars_by_comic = np.zeros(0, dtype=np.int64)
+
+    sums = sum_count_matrix_by_segments(counts, starts)
+
+    panel_counts_by_comic = []
+    counts_by_comic = []
+    proportions_by_comic = []
+    props_w_chars_by_comic = []
+
+    # comics without panels with characters have proportions of 'NaN' or 'inf'
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for i in range(len(sums)):
+            panel_counts_by_comic.append(pd.DataFrame(
+                sums[i], index=comics, columns=counts.columns))
+            counts_by_comic.append(pd.DataFrame(
+                sums[i] > 0, index=comics, columns=counts.columns))
+            proportions_by_comic.append(pd.DataFrame(
+                sums[i] / num_panels_by_comic[:, np.newaxis], index=comics,
+                columns=counts.columns))
+            props_w_chars_by_comic.append(pd.DataFrame(
+                sums[i] / num_panels_w_chars_by_comic[:, np.newaxis],
+                index=comics, columns=counts.columns))
+
+    return(panel_counts_by_comic, counts_by_comic, proportions_by_comic,
+           props_w_chars_by_comic)
+
+
+def fill_missing_proportions(table):
+    '''
+    Returns copy of the per-comic proportions in 'table' with the 'NaN' and
+        infinite proportions of comics without panels with characters (see
+        'counts_by_comic_multiple_tables') set to '0', as the plots do
+    '''
+
+    import numpy as np
+
+    values = table.values.astype(np.float64)
+    values[~np.isfinite(values)] = 0
+    table = table.__class__(values, index=table.index, columns=table.columns)
+
+    return(table)
+
+
+def order_columns_by_sums(table):
+    '''
+    Returns 'table' with its columns ordered from the largest column sum to
+        the smallest, so that the most prominent characters are first; columns
+        with equal sums keep their order
+    '''
+
+    import numpy as np
+
+    column_order = np.argsort(-table.values.sum(axis=0), kind='mergesort')
+    table = table.iloc[:, column_order]
+
+    return(table)
+
+
+def rolling_means(values, window_size, align='center'):
+    '''
+    Returns NumPy array of the means of 'values', a NumPy array of rows x
+        columns, over a rolling window of 'window_size' rows, for all columns
+        at once
+    'align' - 'center' for windows centered on each row (with an even
+        'window_size', the window has 1 more row after the row than before it,
+        as in the R package 'zoo'), or 'trailing' for windows that end at each
+        row
+    Rows whose window extends beyond the first or last row are 'NaN'
+    The sums of all windows are differences of a single cumulative sum, so the
+        time doesn't depend on 'window_size'
+    '''
+
+    import numpy as np
+
+    values = np.asarray(values, dtype=np.float64)
+    n_rows = values.shape[0]
+    cumulative_sums = np.zeros((n_rows + 1, ) + values.shape[1:])
+    np.cumsum(values, axis=0, out=cumulative_sums[1:])
+
+    if align == 'center':
+        last_offset = window_size // 2
+    elif align == 'trailing':
+        last_offset = 0
+    else:
+        raise ValueError("'align' must be 'center' or 'trailing'")
+
+    means = np.full(values.shape, np.nan)
+    window_starts = np.arange(n_rows) + last_offset - window_size + 1
+    complete = (window_starts >= 0) & (window_starts + window_size <= n_rows)
+    window_starts = window_starts[complete]
+    means[complete] = ((cumulative_sums[window_starts + window_size] -
+                        cumulative_sums[window_starts]) / window_size)
+
+    return(means)
+
+
+def dynamic_rolling_means(values, window_size, margin_size):
+    '''
+    Returns NumPy array of the means of 'values', a NumPy array of rows x
+        columns, over a rolling window of 'window_size' rows, as the dynamic
+        rolling average of 'proportions_graphs.R' calculates them:  in the
+        middle of the rows, each row is in the middle of its window; in the
+        first and last 'margin_size' rows, the row gradually moves from the
+        edge of its window to its middle, so that no row is left without a
+        mean
+    As in 'rolling_means', all windows are differences of a single cumulative
+        sum
+    '''
+
+    import numpy as np
+
+    values = np.asarray(values, dtype=np.float64)
+    n_rows = values.shape[0]
+    cumulative_sums = np.zeros((n_rows + 1, ) + values.shape[1:])
+    np.cumsum(values, axis=0, out=cumulative_sums[1:])
+
+    # the first row of the window of each row, numbered from '1' as in the R
+    # script
+    window_half = int(round(window_size / 2))
+    rows = np.arange(1, n_rows + 1)
+    window_starts = rows - window_half
+    margin = np.arange(1, min(margin_size, n_rows) + 1)
+    if len(margin):
+        # as in R, a window of 1 row has no middle and so no transition
+        transition_step = (margin_size / window_half if window_half
+                           else np.inf)
+        margin_starts = margin - np.trunc(margin / transition_step).astype(
+            np.int64)
+        window_starts[margin - 1] = margin_starts
+        # the last margin is the first margin of the reversed rows
+        window_starts[n_rows - margin] = (n_rows + 2 - window_size -
+                                          margin_starts)
+
+    means = np.full(values.shape, np.nan)
+    complete = ((window_starts >= 1) &
+                (window_starts + window_size - 1 <= n_rows))
+    starts = window_starts[complete] - 1
+    means[complete] = ((cumulative_sums[starts + window_size] -
+                        cumulative_sums[starts]) / window_size)
+
+    return(means)
+
+
+def aggregate_by_period(table, period='year'):
+    '''
+    Returns the means of the per-comic values in 'table' over the comics of
+        each year or month ('period' is 'year' or 'month'); the comics must be
+        sorted by date and indexed by their dates/filenames, which start with
+        the date, e.g., '1950-10-02'
+    The comics of a period are adjacent rows, so the rows are summed over the
+        periods with a single 'np.add.reduceat'
+    '''
+
+    import numpy as np
+    import pandas as pd
+
+    prefix_lengths = {'year': 4, 'month': 7}
+    if period not in prefix_lengths:
+        raise ValueError("'period' must be 'year' or 'month'")
+
+    periods = np.array([str(d)[:prefix_lengths[period]] for d in table.index],
+                       dtype=object)
+    if len(periods) == 0:
+        return(table.iloc[:0])
+
+    starts = np.flatnonzero(np.concatenate([[True],
+                                            periods[1:] != periods[:-1]]))
+    n_comics = np.diff(np.append(starts, len(periods)))
+    sums = np.add.reduceat(table.values.astype(np.float64), starts, axis=0)
+    means = pd.DataFrame(sums / n_comics[:, np.newaxis],
+                         index=pd.Index(periods[starts], name=period),
+                         columns=table.columns)
+
+    return(means)
+
+
+def rolling_prominence(props_by_comic, window_size, align='dynamic'):
+    '''
+    Calculates the prominence of each character over time from
+        'props_by_comic', a table of per-comic proportions (see
+        'counts_by_comic_multiple_tables'), as 'proportions_graphs.R' does
+    Missing and infinite proportions are set to '0' (see
+        'fill_missing_proportions') and the characters are ordered from the
+        most prominent to the least (see 'order_columns_by_sums')
+    'align' - 'center' or 'trailing' for a rolling mean over 'window_size'
+        comics (see 'rolling_means'), or 'dynamic' for the rolling mean of the
+        R script, with margins of 3 windows (see 'dynamic_rolling_means')
+    Returns tables of the rolling means per comic, and of the means per year
+        and per month (see 'aggregate_by_period')
+    '''
+
+    import pandas as pd
+
+    props_by_comic = order_columns_by_sums(
+        fill_missing_proportions(props_by_comic))
+
+    if align == 'dynamic':
+        means = dynamic_rolling_means(props_by_comic.values, window_size,
+                                      3 * window_size)
+    else:
+        means = rolling_means(props_by_comic.values, window_size, align)
+
+    rolling = pd.DataFrame(means, index=props_by_comic.index,
+                           columns=props_by_comic.columns)
+    by_year = aggregate_by_period(props_by_comic, 'year')
+    by_month = aggregate_by_period(props_by_comic, 'month')
+
+    return(rolling, by_year, by_month)
+
+
+def co_occurrence_matrix(pairs, n_tables, n_columns):
+    '''
+    Returns NumPy array of 'n_tables' x 'n_columns' x 'n_columns' of the
+        co-occurrence counts of the pairs of columns 'pairs' (see
+        'co_occurrence_pairs'), i.e., of the number of rows in which each pair
+        of columns are both 'True'; the diagonal is the number of rows in
+        which each column is 'True'
+    Only the saved tables of all pairs of characters need the whole matrix;
+        otherwise, the co-occurrences are kept as the pairs that appear
+        together
     '''
 
-    for i in range(len(counts)):
-        counts[i] = adjust_counts_by_appearance_dates_in_table(dates_column,
-                                                               counts[i])
+    import numpy as np
+
+    counts = np.zeros((n_tables, n_columns, n_columns), dtype=np.int64)
+
+    tables, first_columns, second_columns, pair_counts = pairs
+    counts[tables, first_columns, second_columns] = pair_counts
+    counts[tables, second_columns, first_columns] = pair_counts
 
     return(counts)
 
 
-def correct_misidentified_characters_in_table(dates_column, count_table,
-                                              misidentifications):
+def co_occurrence_statistics(counts, n_rows):
     '''
-    Switches characters' counts on dates when a character was misidentified
-    'dates_column' - Pandas Data Series with dates/filenames
-    'count_table' - Pandas DataFrame/table that tallies whether a word or phrase
-        (naming characters) appeared in items of text; each word has its own
-        column; each row corresponds to an item of text; if a word appeared in a
-        text item, the corresponding cell in the 'count_table' is '1', otherwise
-        it's '0'
-    'misidentifications' - list of lists, each of which contains 3 items:
-        the date/filename of the comic in which a character was misidentified,
-        the incorrect character that appears in the text description of the
-        comic, and the correct character who actually appears in the comic
-    Returns corrected 'count_table'
+    Returns NumPy arrays of the lift and of the pointwise mutual information
+        (PMI, in bits) of each pair of columns from their co-occurrence
+        'counts' over 'n_rows' rows (see 'co_occurrence_matrix')
+    The lift is how many more times 2 characters appear together than they
+        would if they appeared independently of each other; the PMI is its
+        logarithm; pairs that never appear together have a PMI of '-inf', and
+        pairs with a character that never appears have 'NaN'
     '''
-    for i in range(len(misidentifications)):
 
-        idx = dates_column[dates_column == misidentifications[i][0]].index.values
-        temp = count_table.ix[idx, misidentifications[i][2]]
-        count_table.ix[idx, misidentifications[i][2]] = count_table.ix[idx,
-                                                        misidentifications[i][1]]
-        count_table.ix[idx, misidentifications[i][1]] = temp
+    import numpy as np
+
+    appearances = np.diagonal(counts, axis1=-2, axis2=-1).astype(np.float64)
+    expected = (appearances[..., :, np.newaxis] *
+                appearances[..., np.newaxis, :])
 
-    return(count_table)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        lift = counts * float(n_rows) / expected
+        pmi = np.log2(lift)
 
+    return(lift, pmi)
 
-def correct_misidentified_characters_multiple_tables(dates_column, counts,
-                                                     misidentifications):
+
+def co_occurrence_pairs(presence, block_rows=16384):
     '''
-    Loops function 'correct_misidentified_characters_in_table' for each
-        count table in 'counts'
-    Description of 'correct_misidentified_characters_in_table':
-        Switches characters' counts on dates when a character was misidentified
-        'dates_column' - Pandas Data Series with dates/filenames
-        'count_table' - Pandas DataFrame/table that tallies whether a word or phrase
-            (naming characters) appeared in items of text; each word has its own
-            column; each row corresponds to an item of text; if a word appeared in a
-            text item, the corresponding cell in the 'count_table' is '1', otherwise
-            it's '0'
-        'misidentifications' - list of lists, each of which contains 3 items:
-            the date/filename of the comic in which a character was misidentified,
-            the incorrect character that appears in the text description of the
-            comic, and the correct character who actually appears in the comic
-        Returns corrected 'count_table'
+    Returns NumPy arrays of the tables, first columns, second columns and
+        counts of the pairs of columns of 'presence' that are both 'True' in
+        any row, with each pair listed once (first column <= second column) in
+        the order of tables, first columns and second columns, so that sparse
+        co-occurrences take little space
+    'presence' - Boolean NumPy array of tables x rows x columns, e.g., whether
+        each character appears in each comic (see
+        'counts_by_comic_multiple_tables') of each count table
+    Each pair of the columns that are 'True' in a row is coded as a single
+        number, and the codes of the rows are counted in blocks of
+        'block_rows' rows
     '''
 
-    for i in range(len(counts)):
-        counts[i] = correct_misidentified_characters_in_table(dates_column,
-                                                counts[i], misidentifications)
+    import numpy as np
 
-    return(counts)
+    n_tables, n_rows, n_columns = presence.shape
+    codes = np.zeros(0, dtype=np.int64)
+    code_counts = np.zeros(0, dtype=np.int64)
 
+    for start in range(0, n_rows, block_rows):
+        block = presence[:, start:start + block_rows]
+        tables, rows, columns = np.nonzero(block)
+        if len(columns) == 0:
+            continue
 
-def snoopy_and_personas_in_table(count_table):
+        # each column that is 'True' in a row is paired with itself and with
+        # the later columns that are 'True' in that row
+        row_codes = tables.astype(np.int64) * block.shape[1] + rows
+        row_starts = np.flatnonzero(np.concatenate(
+            [[True], row_codes[1:] != row_codes[:-1]]))
+        row_lengths = np.diff(np.append(row_starts, len(row_codes)))
+        positions = np.arange(len(columns)) - np.repeat(row_starts,
+                                                        row_lengths)
+        n_pairs = np.repeat(row_lengths, row_lengths) - positions
+        pair_firsts = np.repeat(np.arange(len(columns)), n_pairs)
+        pair_seconds = (pair_firsts + np.arange(n_pairs.sum()) -
+                        np.repeat(np.cumsum(n_pairs) - n_pairs, n_pairs))
+
+        block_codes, block_counts = np.unique(
+            (tables[pair_firsts].astype(np.int64) * n_columns +
+             columns[pair_firsts]) * n_columns + columns[pair_seconds],
+            return_counts=True)
+        codes, inverse = np.unique(np.concatenate([codes, block_codes]),
+                                   return_inverse=True)
+        code_counts = np.bincount(
+            inverse, np.concatenate([code_counts, block_counts]),
+            minlength=len(codes)).astype(np.int64)
+
+    first_codes, second_columns = np.divmod(codes, n_columns)
+    tables, first_columns = np.divmod(first_codes, n_columns)
+
+    return(tables, first_columns, second_columns, code_counts)
+
+
+def combine_co_occurrence_pairs(list_of_pairs):
     '''
-    Adds column to 'count_table' that counts Snoopy and his personas, in case
-        some text descriptions refer to him by the persona and not by 'Snoopy',
-        which would undercount Snoopy's appearances
+    Combines the pairs of columns (see 'co_occurrence_pairs') of successive
+        chunks of rows, adding up the counts of pairs that are in several
+        chunks
     '''
 
-    count_table['snoopy and personas'] = (count_table['snoopy'] |
-                                          count_table['world famous'] |
-                                          count_table['joe cool'] |
-                                          count_table['joe motocross'] |
-                                          count_table['joe blackjack'] |
-                                          count_table['joe sandbagger'] |
-                                          count_table['joe grunge'] |
-                                          count_table['flying ace'] |
-                                          count_table['literary ace'] |
-                                          count_table['masked marvel'] |
-                                          count_table['easter beagle'] |
-                                          count_table['lone beagle'] |
-                                          count_table['revolutionary war patriot'] |
-                                          count_table['legionnaire'])
+    import numpy as np
 
-    return(count_table)
+    tables, first_columns, second_columns, pair_counts = [
+        np.concatenate(arrays) for arrays in zip(*list_of_pairs)]
 
+    order = np.lexsort((second_columns, first_columns, tables))
+    tables = tables[order]
+    first_columns = first_columns[order]
+    second_columns = second_columns[order]
+    starts = np.flatnonzero(np.concatenate(
+        [[len(order) > 0],
+         (tables[1:] != tables[:-1]) |
+         (first_columns[1:] != first_columns[:-1]) |
+         (second_columns[1:] != second_columns[:-1])]))
+    pair_counts = (np.add.reduceat(pair_counts[order], starts)
+                   if len(starts) else pair_counts)
 
-def snoopy_and_personas_multiple_tables(counts):
+    return(tables[starts], first_columns[starts], second_columns[starts],
+           pair_counts)
+
+
+def co_occurrence_by_period(presence, comic_dates, period='year'):
     '''
-    Loops function 'snoopy_and_personas_in_table' for each
-        count table in 'counts'
-    Description of 'snoopy_and_personas_in_table':
-        Adds column to 'count_table' that counts Snoopy and his personas, in case
-            some text descriptions refer to him by the persona and not by 'Snoopy',
-            which would undercount Snoopy's appearances
+    Returns table/Pandas DataFrame of the co-occurrence counts of the comics of
+        each year or month ('period' is 'year' or 'month'), as pairs of
+        columns (see 'co_occurrence_pairs'), with columns 'period', 'table',
+        'first', 'second' and 'comics'
+    Also returns Pandas Series of the number of comics of each period
+    'comic_dates' - sorted dates/filenames of the comics, i.e., of the rows of
+        'presence', which start with the date, e.g., '1950-10-02'
+    The counts of periods whose comics are split over several calls can be
+        added together (see 'combine_co_occurrence_by_period')
     '''
 
-    for i in range(len(counts)):
-        counts[i] = snoopy_and_personas_in_table(counts[i])
+    import numpy as np
+    import pandas as pd
 
-    return(counts)
+    prefix_lengths = {'year': 4, 'month': 7}
+    if period not in prefix_lengths:
+        raise ValueError("'period' must be 'year' or 'month'")
+
+    periods = np.array([str(d)[:prefix_lengths[period]] for d in comic_dates],
+                       dtype=object)
+    starts = np.flatnonzero(np.concatenate([[len(periods) > 0],
+                                            periods[1:] != periods[:-1]]))
+    stops = np.append(starts[1:], len(periods))
+    pairs = []
+
+    for start, stop in zip(starts, stops):
+        tables, first, second, comics = co_occurrence_pairs(
+            presence[:, start:stop])
+        pairs.append(pd.DataFrame({'period': periods[start], 'table': tables,
+                                   'first': first, 'second': second,
+                                   'comics': comics},
+                                  columns=['period', 'table', 'first',
+                                           'second', 'comics']))
+
+    pairs = (pd.concat(pairs, ignore_index=True) if pairs else
+             pd.DataFrame(columns=['period', 'table', 'first', 'second',
+                                   'comics']))
+    n_comics = pd.Series(stops - starts, index=periods[starts])
+
+    return(pairs, n_comics)
 
 
-def save_tables_to_csv(list_of_tables, list_of_filenames):
+def combine_co_occurrence_by_period(list_of_by_period):
     '''
-    Saves Pandas DataFrames/tables in a list to 'csv' files
+    Combines the co-occurrences per period (see 'co_occurrence_by_period') of
+        successive chunks of comics, adding up the counts of periods that are
+        split over several chunks
     '''
 
-    for i in range(len(list_of_tables)):
-        list_of_tables[i].to_csv(list_of_filenames[i] + '.csv',
-                                 sep=',', index=True)
+    import pandas as pd
 
+    pairs = pd.concat([b[0] for b in list_of_by_period], ignore_index=True)
+    pairs = pairs.groupby(['period', 'table', 'first', 'second'],
+                          as_index=False, sort=True)['comics'].sum()
+    n_comics = pd.concat([b[1] for b in list_of_by_period])
+    n_comics = n_comics.groupby(level=0, sort=True).sum()
 
-def counts_by_comic_multiple_tables(dates_column, num_panels_column,
-                                    panels_with_characters, counts):
+    return(pairs, n_comics)
+
+
+def co_occurrence_by_period_table(by_period, columns, table_names):
     '''
-    Groups panels by comic strip date, so that each row represents a comic (with
-        1 or more panels) instead of a panel
-    'dates_column' - Pandas Data Series with dates/filenames
-    'num_panels_column' - Pandas Data Series with number of panels in that comic
-    'count_table' - Pandas DataFrame/table that tallies whether a word or phrase
-        (naming characters) appeared in items of text (each item corresponds to
-        a panel); each word has its own column; each row corresponds to an item
-        of text; if a word appeared in a text item, the corresponding cell in
-        the 'count_table' is '1', otherwise it's '0'
-    'panel_counts_by_comic' - counts are summed over panels per comic, i.e., in
-        how many panels did this character appear in the comic?
-    'counts_by_comic' - panel counts per comic are transformed into Boolean; did
-        the character appear in this comic, yes or no?
-    'proportions_by_comic' - summed counts per comic are divided by the number
-        of panels in that comic
-    'props_w_chars_by_comic' - summed counts per comic are divided by the number
-        of panels that include a mention of a character in that comic; e.g., if
-        the text description of a 4-panel comic mentions 'Snoopy' only once in
-        the 1st panel and thereafter refers to him as 'he', then
-        'proportions_by_comic' counts Snoopy's proportion as 1 / 4 = 0.25,
-        whereas 'props_w_chars_by_comic' counts Snoopy at 1 / 1 = 1
+    Returns table/Pandas DataFrame of the co-occurrences per period (see
+        'co_occurrence_by_period') with the names of the count tables and of
+        the characters, and with the lift and PMI (see
+        'co_occurrence_statistics') of each pair within its period
     '''
 
-    num_panels_by_comic = num_panels_column.groupby(dates_column).median()
-    num_panels_w_chars_by_comic = panels_with_characters.groupby(dates_column).sum()
-    panel_counts_by_comic = []
-    counts_by_comic = []
-    proportions_by_comic = []
-    props_w_chars_by_comic = []
+    import numpy as np
 
-    for i in range(len(counts)):
-        panel_counts_by_comic.append(counts[i].groupby(dates_column).sum())
-        counts_by_comic.append(panel_counts_by_comic[i] > 0)
-        proportions_by_comic.append(panel_counts_by_comic[i].divide(
-            num_panels_by_comic, axis='index'))
-        props_w_chars_by_comic.append(panel_counts_by_comic[i].divide(
-            num_panels_w_chars_by_comic, axis='index'))
+    pairs, n_comics = by_period
+    pairs = pairs.sort_values(['period', 'table', 'first', 'second'])
+
+    # the number of comics in which each character appears is the count of the
+    # pair of the character with itself
+    same = pairs[pairs['first'] == pairs['second']]
+    appearances = {(p, t, c): n for p, t, c, n in
+                   zip(same['period'], same['table'], same['first'],
+                       same['comics'])}
+    first_appearances = np.array(
+        [appearances[k] for k in zip(pairs['period'], pairs['table'],
+                                     pairs['first'])], dtype=np.float64)
+    second_appearances = np.array(
+        [appearances[k] for k in zip(pairs['period'], pairs['table'],
+                                     pairs['second'])], dtype=np.float64)
+    period_comics = n_comics.reindex(pairs['period']).values.astype(np.float64)
+
+    table = pairs.copy()
+    table['table'] = [table_names[t] for t in pairs['table']]
+    table['first'] = [columns[c] for c in pairs['first']]
+    table['second'] = [columns[c] for c in pairs['second']]
+    table['lift'] = (pairs['comics'].values * period_comics /
+                     (first_appearances * second_appearances))
+    table['pmi'] = np.log2(table['lift'].values)
+    table = table.rename(columns={'first': 'character',
+                                  'second': 'other_character'})
+
+    return(table.reset_index(drop=True))
+
+
+def boolean_postings(values, first_row=0):
+    '''
+    Returns posting lists of 'values', a Boolean NumPy array of tables x rows x
+        columns:  for each table, a list with a sorted NumPy array for each
+        column of the rows that are 'True' in that column, numbered from
+        'first_row'
+    '''
 
-    return(panel_counts_by_comic, counts_by_comic, proportions_by_comic,
-           props_w_chars_by_comic)
+    import numpy as np
+
+    postings = []
+
+    for table_values in values:
+        rows, columns = np.nonzero(table_values)
+        order = np.argsort(columns, kind='mergesort')   # rows stay sorted
+        rows = rows[order].astype(np.int64) + first_row
+        bounds = np.searchsorted(columns[order],
+                                 np.arange(table_values.shape[1] + 1))
+        postings.append([rows[bounds[j]:bounds[j + 1]]
+                         for j in range(table_values.shape[1])])
+
+    return(postings)
+
+
+def count_matrix_postings(count_matrix, first_row=0):
+    '''
+    Returns posting lists (see 'boolean_postings') of the rows with a count in
+        each column of each table of the stacked 'count_matrix', numbered from
+        'first_row'; the rows are unpacked a chunk at a time
+    '''
+
+    import numpy as np
+
+    postings = None
+
+    for rows in count_matrix_row_chunks(count_matrix):
+        values = unpack_count_matrix(count_matrix, rows).astype(bool)
+        postings = add_postings(postings, boolean_postings(
+            values, first_row + rows.start))
+
+    if postings is None:
+        postings = boolean_postings(np.zeros(
+            count_matrix.bits.shape[:-2] + (0, len(count_matrix.columns)),
+            dtype=bool))
+
+    return(postings)
+
+
+def add_postings(postings, more_postings):
+    '''
+    Appends the posting lists 'more_postings' of later rows to 'postings' (see
+        'boolean_postings'); 'postings' can be 'None' for the first rows
+    '''
+
+    import numpy as np
 
+    if postings is None:
+        return(more_postings)
 
-def main():
+    postings = [[np.concatenate([postings[i][j], more_postings[i][j]])
+                 for j in range(len(postings[i]))]
+                for i in range(len(postings))]
+
+    return(postings)
+
+
+def save_character_index_part(part_filepath, panel_postings, comic_postings,
+                              comic_dates, comic_starts):
+    '''
+    Saves the posting lists of panels and of comics (see 'boolean_postings') of
+        each view and column of a chunk of comics, with the date/filename and
+        the first panel of each of its comics, to the NumPy 'npz' file
+        'part_filepath', so that the postings of the whole table don't have to
+        be kept in memory until the index is written (see
+        'write_character_index')
+    The posting lists of each level are concatenated in the order of their
+        views and columns into a single array, with an array of the offset of
+        each view's and column's list
+    '''
+
+    import numpy as np
+
+    arrays = {}
+
+    for level, postings in [('panel', panel_postings),
+                            ('comic', comic_postings)]:
+        lists = [rows for view_postings in postings for rows in view_postings]
+        arrays[level + '_rows'] = (np.concatenate(lists).astype(np.int64)
+                                   if lists else np.zeros(0, np.int64))
+        arrays[level + '_offsets'] = np.concatenate(
+            [[0], np.cumsum([len(rows) for rows in lists],
+                            dtype=np.int64)]).astype(np.int64)
+
+    arrays['comic_dates'] = np.asarray(comic_dates, dtype=str)
+    arrays['comic_starts'] = np.asarray(comic_starts, dtype=np.int64)
+
+    np.savez(part_filepath, **arrays)
+
+
+def merge_index_part_postings(part_filepaths, level, n_positions,
+                              deltas_filepath):
+    '''
+    Merges the posting lists of 'level' ('panel' or 'comic') of the index parts
+        in 'part_filepaths' (see 'save_character_index_part'), in the order of
+        their rows, into the NumPy 'npy' file 'deltas_filepath'
+    Each merged list is stored as the differences between its successive rows,
+        which are small enough for 32-bit integers; the file is written through
+        a memory map, one part at a time, so only a single part is in memory
+    Returns NumPy array of the offset of each of the 'n_positions' views and
+        columns in the merged lists
+    '''
+
+    import numpy as np
+
+    lengths = np.zeros(n_positions, dtype=np.int64)
+    for part_filepath in part_filepaths:
+        with np.load(part_filepath) as part:
+            lengths += np.diff(part[level + '_offsets'])
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+
+    # an empty file can't be memory-mapped
+    if offsets[-1] == 0:
+        np.save(deltas_filepath, np.zeros(0, dtype=np.uint32))
+        return(offsets)
+
+    deltas = np.lib.format.open_memmap(deltas_filepath, mode='w+',
+                                       dtype=np.uint32,
+                                       shape=(int(offsets[-1]), ))
+    next_positions = offsets[:-1].copy()
+    last_rows = np.zeros(n_positions, dtype=np.int64)
+
+    for part_filepath in part_filepaths:
+        with np.load(part_filepath) as part:
+            rows = part[level + '_rows']
+            part_offsets = part[level + '_offsets']
+        part_lengths = np.diff(part_offsets)
+        nonempty = np.flatnonzero(part_lengths)
+
+        # each list continues from the last row of the list in earlier parts
+        previous_rows = np.empty_like(rows)
+        previous_rows[1:] = rows[:-1]
+        previous_rows[part_offsets[nonempty]] = last_rows[nonempty]
+        element_positions = np.repeat(np.arange(n_positions), part_lengths)
+        destinations = (next_positions[element_positions] +
+                        np.arange(len(rows)) -
+                        part_offsets[:-1][element_positions])
+        deltas[destinations] = rows - previous_rows
+
+        next_positions += part_lengths
+        last_rows[nonempty] = rows[part_offsets[nonempty + 1] - 1]
+
+    deltas.flush()
+    del deltas
+
+    return(offsets)
+
+
+def write_character_index(index_filepath, views, columns, part_filepaths,
+                          n_panels, merges=None):
+    '''
+    Saves an inverted index of the comics and panels in which each character
+        appears in each view (see 'count_views') as a 'npz' file that
+        'load_character_index' reads
+    'columns' - canonical names of the characters, i.e., the merged columns of
+        the count tables
+    'part_filepaths' - the postings of each chunk of comics, in order (see
+        'save_character_index_part'); 'n_panels' - number of panels
+    'merges' - the names that were merged into each column by the run's
+        correction rules (see 'characters_merge_dict'), so that queries can
+        look characters up by any of their names
+    Each posting list is stored as the differences between its successive
+        rows, which are small enough for 32-bit integers, and the lists of
+        each level are concatenated into a single array with an array of the
+        offset of each view's and column's list
+    The lists are merged from the parts into files that are then stored in the
+        'npz' file as they are (see 'merge_index_part_postings'), so the
+        index is written without holding all of its postings in memory
+    '''
+
+    import json
+    import os
+    import shutil
+    import tempfile
+    import zipfile
+    import numpy as np
+
+    temp_path = tempfile.mkdtemp(
+        prefix='character_index_',
+        dir=os.path.dirname(os.path.abspath(index_filepath)))
+
+    try:
+        array_filepaths = {}
+
+        for level in ['panel', 'comic']:
+            array_filepaths[level + '_deltas'] = os.path.join(
+                temp_path, level + '_deltas.npy')
+            offsets = merge_index_part_postings(
+                part_filepaths, level, len(views) * len(columns),
+                array_filepaths[level + '_deltas'])
+            array_filepaths[level + '_offsets'] = os.path.join(
+                temp_path, level + '_offsets.npy')
+            np.save(array_filepaths[level + '_offsets'], offsets)
+
+        comic_dates = []
+        comic_starts = []
+        for part_filepath in part_filepaths:
+            with np.load(part_filepath) as part:
+                comic_dates.append(part['comic_dates'])
+                comic_starts.append(part['comic_starts'])
+
+        header = {'version': 1, 'views': list(views), 'columns': list(columns),
+                  'n_panels': int(n_panels)}
+        if merges is not None:
+            header['merges'] = dict(merges)
+        small_arrays = {
+            'header': np.array(json.dumps(header)),
+            'comic_dates': (np.concatenate(comic_dates) if comic_dates
+                            else np.zeros(0, dtype=str)),
+            'comic_starts': (np.concatenate(comic_starts) if comic_starts
+                             else np.zeros(0, dtype=np.int64))}
+        for key, values in small_arrays.items():
+            array_filepaths[key] = os.path.join(temp_path, key + '.npy')
+            np.save(array_filepaths[key], values)
+
+        # an 'npz' file is a 'zip' file of 'npy' files
+        temp_index_filepath = os.path.join(temp_path, 'index.npz')
+        with zipfile.ZipFile(temp_index_filepath, 'w', zipfile.ZIP_STORED,
+                             allowZip64=True) as index_file:
+            for key in sorted(array_filepaths):
+                index_file.write(array_filepaths[key], key + '.npy')
+        os.replace(temp_index_filepath, index_filepath)
+
+    finally:
+        shutil.rmtree(temp_path)
+
+
+def load_character_index(index_filepath='character_index.npz'):
+    '''
+    Reads the inverted index saved by 'write_character_index'
+    Returns dictionary of the index's views, its characters' names and their
+        positions ('column_positions'), the names merged into them ('merges',
+        see 'write_character_index'), and its arrays
+    Indexes saved without their merges take them from the default rules file
+    '''
+
+    import json
+    import numpy as np
+
+    with np.load(index_filepath) as index_file:
+        index = {key: index_file[key] for key in index_file.files}
+
+    header = json.loads(str(index.pop('header')))
+    if header['version'] != 1:
+        raise ValueError('Unknown character index version {0}'
+                         .format(header['version']))
+
+    index['views'] = header['views']
+    index['columns'] = header['columns']
+    index['column_positions'] = {c: j for j, c in enumerate(header['columns'])}
+    index['n_panels'] = header['n_panels']
+    index['merges'] = (header['merges'] if 'merges' in header
+                       else characters_merge_dict())
+
+    return(index)
+
+
+def character_index_postings(index, character, view='overall', level='comic'):
+    '''
+    Returns sorted NumPy array of the comics ('level' is 'comic') or panels
+        ('level' is 'panel') in which 'character' appears in 'view' (e.g.,
+        'overall' or 'talk'), from 'index' (see 'load_character_index')
+    Comics are numbered in date order and panels are numbered by their row in
+        'expanded_table'
+    'character' can be a canonical name or any name that is merged into it
+        by the index's 'merges'
+    '''
+
+    import numpy as np
+
+    if character not in index['column_positions']:
+        character = index['merges'].get(character, character)
+    if character not in index['column_positions']:
+        raise KeyError('No character {0} in the index'.format(character))
+
+    view_position = index['views'].index(view)
+    position = (view_position * len(index['columns']) +
+                index['column_positions'][character])
+    offsets = index[level + '_offsets']
+    deltas = index[level + '_deltas'][offsets[position]:offsets[position + 1]]
+
+    return(np.cumsum(deltas, dtype=np.int64))
+
+
+def comic_date_range(comic_dates, start_date=None, end_date=None):
+    '''
+    Returns the first comic on or after 'start_date' and the comic after the
+        last comic on or before 'end_date', from the sorted dates/filenames of
+        the comics 'comic_dates'; without a date, the range starts at the first
+        comic or stops after the last comic
+    Dates can be partial, e.g., '1965' or '1970-06'; a partial 'end_date'
+        includes all dates/filenames that start with it
+    '''
+
+    import numpy as np
+
+    first_comic = (0 if start_date is None else
+                   int(np.searchsorted(comic_dates, start_date, side='left')))
+    stop_comic = (len(comic_dates) if end_date is None else
+                  int(np.searchsorted(comic_dates, end_date + '\uffff',
+                                      side='right')))
+
+    return(first_comic, max(stop_comic, first_comic))
+
+
+def query_character_index(index, all_of=(), any_of=(), view='overall',
+                          level='comic', start_date=None, end_date=None):
+    '''
+    Returns sorted NumPy array of the comics or panels (see
+        'character_index_postings') in which all of the characters in
+        'all_of' and at least 1 of the characters in 'any_of' appear in
+        'view', from 'index' (see 'load_character_index')
+    'start_date' and 'end_date' - if given, only comics on or after
+        'start_date' and on or before 'end_date' are included; dates can be
+        partial, e.g., '1965' or '1970-06'
+    E.g., comics between 1965 and 1970 with both Linus and Sally in talk text:
+        query_character_index(index, ['linus', 'sally'], view='talk',
+                              start_date='1965', end_date='1970')
+    Comics can be converted to their dates with 'index['comic_dates']'
+    '''
+
+    import numpy as np
+
+    first_comic, stop_comic = comic_date_range(index['comic_dates'],
+                                               start_date, end_date)
+
+    if level == 'comic':
+        first, stop = first_comic, stop_comic
+    else:
+        starts = np.append(index['comic_starts'], index['n_panels'])
+        first, stop = starts[first_comic], starts[stop_comic]
+
+    def postings_in_range(character):
+        postings = character_index_postings(index, character, view, level)
+        bounds = np.searchsorted(postings, [first, stop])
+        return(postings[bounds[0]:bounds[1]])
+
+    result = None
+
+    for character in all_of:
+        postings = postings_in_range(character)
+        result = (postings if result is None else
+                  np.intersect1d(result, postings, assume_unique=True))
+
+    if any_of:
+        union = np.unique(np.concatenate([postings_in_range(c)
+                                          for c in any_of]))
+        result = (union if result is None else
+                  np.intersect1d(result, union, assume_unique=True))
+
+    if result is None:
+        result = np.arange(first, max(stop, first), dtype=np.int64)
+
+    return(result)
+
+
+def new_scenario_results(name, inputs, output_path=''):
+    '''
+    Returns the results of a scenario of a run (see 'main'), before any chunk
+        of the table has been counted:  the scenario's 'inputs' (see
+        'compile_inputs') and the sums, co-occurrences and changes made by
+        the corrections ('audit') that are added up over the chunks (see
+        'correct_and_save_chunk') and saved after the last one (see
+        'save_scenario_results')
+    The postings of each chunk for the index of characters are saved to a
+        temporary folder ('index_parts_path') instead, and their files are
+        listed in 'index_parts'
+    'output_path' - folder that the scenario's results are saved to; the
+        working directory by default
+    '''
+
+    results = {'name': name, 'inputs': inputs, 'output_path': output_path,
+               'summary_sums': {}, 'rule_plan': None, 'columns': None,
+               'props_by_comic_chunks': [], 'index_parts_path': None,
+               'index_parts': [], 'co_occurrences': None,
+               'co_occurrences_by_year': [], 'audit': []}
+
+    return(results)
+
+
+def scenario_filepaths(results, filenames):
+    '''
+    Returns list of the paths of 'filenames' in the output folder of the
+        scenario 'results' (see 'new_scenario_results')
+    '''
+
+    import os
+
+    return([os.path.join(results['output_path'], f) for f in filenames])
+
+
+def correct_and_save_chunk(results, counts, expanded_table, date_index,
+                           first_row, first_comic, writer, mode='w',
+                           report=None, rolling_window=None,
+                           co_occurrence=False, co_occurrence_by_year=False,
+                           character_index=False):
+    '''
+    Corrects the counts of a chunk of comics of 'expanded_table' with the rules
+        of the scenario 'results' (see 'new_scenario_results'), aggregates them
+        per comic and submits the count tables to 'writer' (see
+        'submit_tables'), adding the chunk's summaries, postings and
+        co-occurrences to 'results'
+    'counts' - stacked 'CountMatrix' of the words/phrases of the scenario's
+        inputs (see 'count_characters'); it isn't changed, as the first
+        correction (the merges) makes a new 'CountMatrix'
+    'date_index' - index of the rows of each date of the chunk (see
+        'build_date_index')
+    'first_row' and 'first_comic' - positions of the chunk's first panel and
+        first comic in the whole table
+    The chunk's postings for the index of characters are saved to a file in
+        the scenario's temporary folder (see 'save_character_index_part'), so
+        that they aren't kept in memory until the last chunk
+    'mode' - 'w' for the first chunk, 'a' to append later chunks to the files
+    'rolling_window', 'co_occurrence', 'co_occurrence_by_year' and
+        'character_index' - as in 'main'
+    '''
+
+    import os
+    import tempfile
+    import numpy as np
+
+    inputs = results['inputs']
+    summary_sums = results['summary_sums']
+    n_rows = len(expanded_table)
+    dates_column = expanded_table.ix[:, 'filename']
+    count_types = count_type_names()
+    counts_filenames = ['counts_by_panel_' + e for e in count_types]
+    counts_by_comic_filenames = ['counts_by_comic_' + e for e in count_types]
+    proportions_by_comic_filenames = ['proportions_by_comic_' + e
+                                      for e in count_types]
+    props_w_chars_by_comic_filenames = ['proportions_with_chars_by_comic_' + e
+                                        for e in count_types]
+
+    with report_stage(report, 'summaries'):
+        column_sums = counts_summary_column_sums(counts)
+        summary_sums['counts'] = add_column_sums(summary_sums.get('counts'),
+                                                 column_sums)
+
+    # the corrections, in order (see 'compile_rule_plan'):
+    #   'merge' - merge counts for multiple search terms into single column
+    #       with single name, e.g., counts for 'Pig-Pen' and 'Pig Pen' are
+    #       merged together under 'Pig-Pen'
+    #   'patty' - distinguish between Patty and Peppermint Patty
+    #   'appearances' - remove appearances/mentions that occur outside a
+    #       character's appearance dates
+    #   'misidentifications' - correct counts for characters misidentified
+    #       in text descriptions
+    #   'combined_columns' - some text descriptions might refer to Snoopy
+    #       only by one of his personas, which would produce and
+    #       undercount of Snoopy's appearances under 'snoopy'; so, add a
+    #       new column that includes appearances/mentions of Snoopy and
+    #       his major personas combined
+    with report_stage(report, 'compile rules'):
+        rule_plan = compile_rule_plan(inputs['rules'], counts.columns,
+                                      date_index, inputs['pep_patty_dates'])
+    results['rule_plan'] = rule_plan
+
+    # each stage updates the column sums by the changes that it makes, instead
+    # of summing all the counts again, and records the changes of each step
+    # for the audit table (see 'apply_rule_steps_with_sums')
+    for stage_name, steps in rule_plan:
+        with report_stage(report, stage_name) as stage:
+            counts, column_sums, audit = apply_rule_steps_with_sums(
+                counts, steps, column_sums)
+            stage['rows'] = n_rows
+        with report_stage(report, 'summaries'):
+            summary_sums[stage_name] = add_column_sums(
+                summary_sums.get(stage_name), column_sums)
+            results['audit'].extend(dict(record, stage=stage_name)
+                                    for record in audit)
+    results['columns'] = counts.columns
+
+    # calculate counts per comic, instead of per panel
+    with report_stage(report, 'per-comic aggregation') as stage:
+        num_panels_column = expanded_table.ix[:, 'num_panels']
+        panels_with_characters = count_matrix_rows_with_any(
+            count_matrix_view(counts, 0), inputs['characters_only'])
+        (panel_counts_by_comic, counts_by_comic,
+         proportions_by_comic, props_w_chars_by_comic) = (
+             counts_by_comic_multiple_tables(
+                 dates_column, num_panels_column, panels_with_characters,
+                 counts, date_index))
+        stage['rows'] = n_rows
+    with report_stage(report, 'summaries'):
+        summary_sums['panel_counts_by_comic'] = add_column_sums(
+            summary_sums.get('panel_counts_by_comic'),
+            counts_summary_column_sums(panel_counts_by_comic))
+        summary_sums['counts_by_comic'] = add_column_sums(
+            summary_sums.get('counts_by_comic'),
+            counts_summary_column_sums(counts_by_comic))
+
+    # save counts tables
+    with report_stage(report, 'write') as stage:
+        submit_tables(writer,
+                      [count_matrix_view(counts, i)
+                       for i in range(len(count_types))] +
+                      counts_by_comic + props_w_chars_by_comic,
+                      scenario_filepaths(results, counts_filenames +
+                                         counts_by_comic_filenames +
+                                         props_w_chars_by_comic_filenames),
+                      mode, first_row)
+        stage['rows'] = n_rows
+    #submit_tables(writer, proportions_by_comic,
+    #              scenario_filepaths(results, proportions_by_comic_filenames),
+    #              mode, first_row)
+
+    if rolling_window:
+        results['props_by_comic_chunks'].append(props_w_chars_by_comic[0])
+
+    # comics and panels in which each character appears, for queries
+    comic_presence = np.stack([table.values for table in counts_by_comic])
+    if character_index:
+        with report_stage(report, 'index characters') as stage:
+            if results['index_parts_path'] is None:
+                results['index_parts_path'] = tempfile.mkdtemp(
+                    prefix='character_index_parts_',
+                    dir=os.path.abspath(results['output_path']))
+            part_filepath = os.path.join(
+                results['index_parts_path'],
+                'part_{0:06d}.npz'.format(len(results['index_parts'])))
+            save_character_index_part(
+                part_filepath, count_matrix_postings(counts, first_row),
+                boolean_postings(comic_presence, first_comic),
+                date_index['dates'], date_index['starts'] + first_row)
+            results['index_parts'].append(part_filepath)
+            stage['rows'] = n_rows
+
+    # comics in which each pair of characters appear together
+    if co_occurrence or co_occurrence_by_year:
+        with report_stage(report, 'co-occurrence') as stage:
+            pairs = co_occurrence_pairs(comic_presence)
+            if results['co_occurrences'] is not None:
+                pairs = combine_co_occurrence_pairs(
+                    [results['co_occurrences'], pairs])
+            results['co_occurrences'] = pairs
+            if co_occurrence_by_year:
+                results['co_occurrences_by_year'].append(
+                    co_occurrence_by_period(comic_presence,
+                                            date_index['dates'], 'year'))
+            stage['rows'] = len(date_index['dates'])
+
+
+def save_scenario_results(results, n_comics, n_panels,
+                          writer, report=None, rolling_window=None,
+                          rolling_align='dynamic', co_occurrence=False,
+                          co_occurrence_by_year=False, character_index=False):
+    '''
+    Submits the summaries, the rolling prominences and the co-occurrences that
+        were added up over the chunks of the scenario 'results' (see
+        'correct_and_save_chunk') to 'writer' (see 'submit_tables') and saves
+        the scenario's index of characters (see 'write_character_index')
+    'n_comics' and 'n_panels' - numbers of comics and of panels of the table
+    'rolling_window', 'rolling_align', 'co_occurrence',
+        'co_occurrence_by_year' and 'character_index' - as in 'main'
+    '''
+
+    import shutil
+    import pandas as pd
+
+    summary_sums = results['summary_sums']
+    rule_plan = results['rule_plan']
+    columns = results['columns']
+    count_types = count_type_names()
+    summary_numbers = {'merge': 2, 'patty': 3, 'appearances': 4,
+                       'misidentifications': 6, 'combined_columns': 7}
+
+    summaries = {'counts': counts_summary_table_from_sums(
+        summary_sums['counts'])}
+    for stage_name, _ in rule_plan:
+        summaries[stage_name] = counts_summary_table_from_sums(
+            summary_sums[stage_name])
+
+    # counts removed by appearance dates
+    counts_summary_5 = summaries['patty'] - summaries['appearances']
+
+    panel_counts_by_comic_summary = counts_summary_table_from_sums(
+        summary_sums['panel_counts_by_comic'])
+    counts_by_comic_summary = counts_summary_table_from_sums(
+        summary_sums['counts_by_comic'])
+
+    summary_tables = ([summaries['counts']] +
+                      [summaries[stage_name] for stage_name, _ in rule_plan] +
+                      [counts_summary_5, counts_by_comic_summary,
+                       rule_audit_table(results['audit'])])
+    summary_filenames = (['counts_summary_01'] +
+                         ['counts_summary_{0:02d}'.format(
+                             summary_numbers[stage_name])
+                          for stage_name, _ in rule_plan] +
+                         ['counts_summary_05', 'counts_by_comic_summary',
+                          'counts_corrections_audit'])
+    #summary_tables.append(panel_counts_by_comic_summary)
+    #summary_filenames.append('panel_counts_by_comic_summary')
+    with report_stage(report, 'write'):
+        submit_tables(writer, summary_tables,
+                      scenario_filepaths(results, summary_filenames))
+
+    # prominence of each character over time
+    if rolling_window:
+        with report_stage(report, 'rolling prominence') as stage:
+            props_by_comic = pd.concat(results['props_by_comic_chunks'])
+            prominence_tables = rolling_prominence(
+                props_by_comic, rolling_window, rolling_align)
+            stage['rows'] = len(props_by_comic)
+        prominence_filenames = ['prominence_rolling_1_overall',
+                                'prominence_by_year_1_overall',
+                                'prominence_by_month_1_overall']
+        with report_stage(report, 'write'):
+            submit_tables(writer, list(prominence_tables),
+                          scenario_filepaths(results, prominence_filenames))
+
+    if co_occurrence or co_occurrence_by_year:
+        with report_stage(report, 'co-occurrence'):
+            co_occurrences = co_occurrence_matrix(
+                results['co_occurrences'], len(count_types), len(columns))
+            co_occurrence_tables = []
+            co_occurrence_filenames = []
+            lift, pmi = co_occurrence_statistics(co_occurrences, n_comics)
+            for i in range(len(count_types)):
+                for name, values in [('counts', co_occurrences),
+                                     ('lift', lift), ('pmi', pmi)]:
+                    co_occurrence_tables.append(pd.DataFrame(
+                        values[i], index=columns, columns=columns))
+                    co_occurrence_filenames.append(
+                        'co_occurrence_{0}_{1}'.format(name, count_types[i]))
+            if co_occurrence_by_year:
+                co_occurrence_tables.append(co_occurrence_by_period_table(
+                    combine_co_occurrence_by_period(
+                        results['co_occurrences_by_year']),
+                    columns, [t.split('_', 1)[1] for t in count_types]))
+                co_occurrence_filenames.append('co_occurrence_by_year')
+        with report_stage(report, 'write'):
+            submit_tables(writer, co_occurrence_tables,
+                          scenario_filepaths(results, co_occurrence_filenames))
+
+    if character_index:
+        with report_stage(report, 'write'):
+            write_character_index(
+                scenario_filepaths(results, ['character_index.npz'])[0],
+                [t.split('_', 1)[1] for t in count_types], columns,
+                results['index_parts'], n_panels,
+                results['inputs']['rules']['merges'])
+            shutil.rmtree(results['index_parts_path'])
+
+
+def main(workers=1, rules_filepath=None, incremental=False,
+         chunk_rows=None, output_format='csv', output_workers=1,
+         output_queue_mb=1024, rolling_window=None, rolling_align='dynamic',
+         profile=None, co_occurrence=False, co_occurrence_by_year=False,
+         tokenizer_backend='enchant', scenarios_filepath=None,
+         fuzzy_distance=0, fuzzy_min_length=5, run_report=False,
+         character_index=False):
     '''
     Searches for words or phrases (mostly character names) in text descriptions
         of Peanuts and marks whether each word or phrase appears in each
@@ -726,123 +4455,371 @@ def main():
         panels of that comic); also provides per-comic data as proportions
         (i.e., in what proportion of panels did the word/phrase appear for that
         comic?)
-    Also provides summary tables of per-panel and per-comic count data
+    Also provides summary tables of per-panel and per-comic count data, and,
+        optionally, an index of the comics and panels in which each character
+        appears, for queries without the count tables (see
+        'query_character_index')
+    'workers' - number of processes that count the characters (see
+        'count_characters')
+    'rules_filepath' - 'json' file with the rules for adjusting the counts (see
+        'load_correction_rules'); 'correction_rules.json' next to this script
+        by default
+    'incremental' - if 'True', only text that has changed since the last
+        incremental run with the same tokenizer is searched for all characters
+        (see 'count_characters_incrementally'), in a single process
+    'chunk_rows' - if given, the table is read about 'chunk_rows' rows at a
+        time, and each chunk of comics is counted, corrected and appended to
+        the output files before the next chunk is read (see
+        'read_table_in_chunks'), so that memory use is bounded by the size of
+        a chunk instead of the size of the table; the outputs are the same as
+        when the whole table is read at once
+        The rolling prominences need the proportions of all comics at once, so
+        they can't be saved in chunks:  they can be queried from the outputs
+        with 'query_service.py' instead
+    'output_format' - 'csv' to save the result tables to 'csv' files, or
+        'parquet' to save them to compressed, columnar 'parquet' files (see
+        'save_tables')
+    'output_workers' - number of threads that save the result tables in the
+        background while the next stages are computed (see
+        'new_table_writer')
+    'output_queue_mb' - megabytes of result tables that may wait to be saved
+        before the computation waits for the saving to catch up
+    'rolling_window' - if given, the prominence of each character over time is
+        also calculated as a rolling mean over this many comics of the
+        overall proportions per comic, along with means per year and per month
+        (see 'rolling_prominence'); 'rolling_align' is the alignment of the
+        rolling window
+    'profile' - 'cprofile' or 'tracemalloc' to also profile the function calls
+        or the memory allocations of each stage in the run report (see
+        'new_run_report' and 'run_report'); a profiled run always saves its
+        run report
+    'co_occurrence' - if 'True', the number of comics in which each pair of
+        characters appear together in each count table is also saved, along
+        with its lift and PMI (see 'co_occurrence_statistics');
+        'co_occurrence_by_year' saves them for each year, too
+    'tokenizer_backend' - 'enchant' to tokenize the text with 'enchant', or
+        'regex' to tokenize it without 'enchant' (see 'get_text_tokenizer');
+        the tokens of the two can be compared with 'compare_tokenizers'
+    'scenarios_filepath' - if given, the 'json' file of several scenarios,
+        i.e., variants of the words/phrases and of the correction rules (see
+        'load_scenarios'); the table is read, tokenized and searched only once
+        for the words/phrases of all the scenarios, then the counts of each
+        scenario's words/phrases are corrected, aggregated and saved to the
+        scenario's own folder
+    'fuzzy_distance' - if more than zero, words/phrases of at least
+        'fuzzy_min_length' characters also match tokens within this many edits
+        of them that aren't English words, e.g., typos in the text
+        descriptions (see 'compile_word_matcher'); these matches are counted,
+        and each of them is saved to 'fuzzy_hits' so that they can be audited
+        The English words are looked up with 'enchant', even with the 'regex'
+        tokenizer, so 'enchant' must be installed
+    'run_report' - if 'True', the wall time, CPU time, rows per second and peak
+        memory of each stage of the run are saved to 'run_report.json' (see
+        'write_run_report')
+    'character_index' - if 'True', the index of the comics and panels in which
+        each character appears is saved to 'character_index.npz' (see
+        'write_character_index')
     '''
 
     import os
 
+    if run_report or profile is not None:
+        report = new_run_report(profile)
+    else:
+        report = None
+
     table_folder = '07_separate_talk'
     table_file = 'expanded_table.csv'
     source_path = get_sibling_directory_path(table_folder)
     table_filepath = os.path.join(source_path, table_file)
 
+    # in chunks, the table is read, counted, corrected and saved one chunk of
+    # comics at a time; otherwise, the whole table is a single chunk
     text_col_names = ['comics_speakers', 'text_nontalk', 'text_talk']
-    expanded_table = read_table(table_filepath, text_col_names)
-    expanded_table.to_csv('expanded_table.csv', sep='^', index=False)
-    dates_column = expanded_table.ix[:, 'filename']         # convenient for later use
-
-    # reading 'expanded_table' from the 'csv' file produces 11 NaN values in
-    # each of the columns 'text_by_panels' and 'text_spell_corrected'; manual
-    # inspection of each case showed that no text was being lost; deleting the
-    # rows may disrupt some subsequent loops, and the NaNs won't affect the
-    # character counts
-    nan_n = expanded_table.ix[:, 'text_by_panels'].isnull().sum()
-    panels_n = len(expanded_table) - nan_n
-    #expanded_table.ix[:, 'text_by_panels'].fillna('', inplace=True)
-    expanded_table.ix[:, 'text_spell_corrected'].fillna('', inplace=True)
+    if incremental and fuzzy_distance:
+        raise ValueError("'incremental' counts can't match words within edits")
+    if incremental and workers > 1:
+        raise ValueError("'incremental' counts are searched in a single "
+                         "process; 'workers' must be 1")
+    if chunk_rows:
+        if incremental:
+            raise ValueError("'incremental' counts can't be read in chunks")
+        if rolling_window:
+            raise ValueError("the rolling prominences can't be saved in "
+                             "chunks; query them with 'query_service.py'")
+        tables = report_stage_iterations(
+            report, 'read',
+            read_table_in_chunks(table_filepath, text_col_names, chunk_rows),
+            lambda chunk: len(chunk[1]))
+        read_from_csv = True
+        copy_table = True
+    else:
+        with report_stage(report, 'read') as stage:
+            expanded_table, read_from_csv = read_expanded_table(
+                table_filepath, text_col_names)
+            stage['rows'] = len(expanded_table)
+        tables = [(0, expanded_table)]
+        copy_table = (read_from_csv or
+                      not os.path.exists('expanded_table.csv'))
 
     # names of characters to be counted
     # NOTE:  any non_character words included in the 'character_file' could
     # adversely affect the proportions in 'props_w_chars_by_comic'
     # 'characters_only.txt' includes characters only and is used for calculating
     # proportions in 'props_w_chars_by_comic'
-    character_file = 'characters_only.txt'
-    characters_only = read_text_file(character_file)
-    character_file = 'characters_and_more.txt'
-    characters = read_text_file(character_file)
-    characters = [s.lower() for s in characters]
-    characters = add_possessives_to_word_list(characters)   # tokenizer includes possessives
-
-    # count the characters' appearances/mentions
-    counts = count_characters(expanded_table, characters)
-    counts_summary_1 = counts_summary_table(counts)
-    counts_summary_1.to_csv('counts_summary_01.csv', sep=',', index=True)
-
-    # merge counts for multiple search terms into single column with single name
-    # e.g., counts for 'Pig-Pen' and 'Pig Pen' are merged together under 'Pig-Pen'
-    counts = merge_characters_multiple_tables(counts)
-    counts_summary_2 = counts_summary_table(counts)
-    counts_summary_2.to_csv('counts_summary_02.csv', sep=',', index=True)
-
-    # correct counts to distinguish between Patty and Peppermint Patty
+    # the lists of characters, the dates of Peppermint Patty (to distinguish
+    # her from Patty) and the correction rules are compiled once and reused
+    # by later runs until any of their files change (see
+    # 'load_compiled_inputs')
     patty_folder = '06_character_talk'
     patty_file = 'peppermint_patty_dates.txt'
     patty_path = get_sibling_directory_path(patty_folder)
     patty_filepath = os.path.join(patty_path, patty_file)
-    pep_patty_dates = read_text_file(patty_filepath)
+    # with a file of scenarios, the table is read, tokenized and searched once
+    # for the words/phrases of all scenarios, and only the corrections and the
+    # aggregations are run for each scenario, which saves its results in its
+    # own folder (see 'load_scenarios')
+    with report_stage(report, 'load inputs'):
+        if scenarios_filepath:
+            scenarios = load_scenarios(scenarios_filepath, rules_filepath)
+            results = []
+            for scenario in scenarios:
+                inputs = compile_inputs(
+                    scenario['characters_only'], scenario['characters'],
+                    patty_filepath, scenario['rules'],
+                    scenario['possessives'], scenario['rule_updates'])
+                results.append(new_scenario_results(
+                    scenario['name'], inputs, scenario['name']))
+                os.makedirs(scenario['name'], exist_ok=True)
+            characters = union_word_pairs(
+                [r['inputs']['characters'] for r in results])
+            matcher = compile_word_matcher(characters)
+            possessives = [scenario['possessives'] for scenario in scenarios]
+        else:
+            inputs = load_compiled_inputs('characters_only.txt',
+                                          'characters_and_more.txt',
+                                          patty_filepath, rules_filepath)
+            results = [new_scenario_results('', inputs)]
+            characters = inputs['characters']
+            matcher = inputs['matcher']
+            possessives = True
+        if fuzzy_distance:
+            matcher = compile_word_matcher(characters, fuzzy_distance,
+                                           fuzzy_min_length)
+    pep_patty_dates = results[0]['inputs']['pep_patty_dates']
     write_list_to_text_file(pep_patty_dates, patty_file, 'w')
 
-    counts = adjust_patty_counts_multiple_tables(dates_column, counts,
-                                                 pep_patty_dates)
-    counts_summary_3 = counts_summary_table(counts)
-    counts_summary_3.to_csv('counts_summary_03.csv', sep=',', index=True)
-
-    # remove appearances/mentions that occur outside a character's appearance dates
-    counts = adjust_counts_by_appearance_dates_multiple_tables(dates_column,
-                                                               counts)
-    counts_summary_4 = counts_summary_table(counts)
-    counts_summary_4.to_csv('counts_summary_04.csv', sep=',', index=True)
-    counts_summary_5 = counts_summary_3 - counts_summary_4
-    counts_summary_5.to_csv('counts_summary_05.csv', sep=',', index=True)
-
-    # characters misidentified in text descriptions:  date, incorrect character,
-    # correct character
-    misidentifications = [['1999-09-19', 'linus', 'rerun'],
-                          ['1999-11-23', 'linus', 'rerun'],
-                          ['1999-12-05', 'rerun', 'linus']]
-    # correct counts for misidentified characters
-    counts = correct_misidentified_characters_multiple_tables(dates_column,
-                                                    counts, misidentifications)
-    counts_summary_6 = counts_summary_table(counts)
-    counts_summary_6.to_csv('counts_summary_06.csv', sep=',', index=True)
-
-    # some text descriptions might refer to Snoopy only by one of his personas,
-    # which would produce and undercount of Snoopy's appearances under 'snoopy';
-    # so, add a new column that includes appearances/mentions of Snoopy and
-    # his major personas combined
-    counts = snoopy_and_personas_multiple_tables(counts)
-    counts_summary_7 = counts_summary_table(counts)
-    counts_summary_7.to_csv('counts_summary_07.csv', sep=',', index=True)
-
-    # calculate counts per comic, instead of per panel
-    num_panels_column = expanded_table.ix[:, 'num_panels']
-    panels_with_characters = counts[0][characters_only].any(axis=1)
-    (panel_counts_by_comic, counts_by_comic,
-     proportions_by_comic, props_w_chars_by_comic) = (
-         counts_by_comic_multiple_tables(dates_column, num_panels_column,
-                                         panels_with_characters, counts))
-    panel_counts_by_comic_summary = counts_summary_table(panel_counts_by_comic)
-    #panel_counts_by_comic_summary.to_csv('panel_counts_by_comic_summary.csv',
-    #                                     sep=',', index=True)
-    counts_by_comic_summary = counts_summary_table(counts_by_comic)
-    counts_by_comic_summary.to_csv('counts_by_comic_summary.csv',
-                                   sep=',', index=True)
-
-    # save counts tables
-    count_types = ['1_overall', '2_nontalk', '3_talk',
-                   '4_odd_quotes', '5_no_quotes']
-    counts_filenames = ['counts_by_panel_' + e for e in count_types]
-    counts_by_comic_filenames = ['counts_by_comic_' + e for e in count_types]
-    proportions_by_comic_filenames = ['proportions_by_comic_' + e
-                                      for e in count_types]
-    props_w_chars_by_comic_filenames = ['proportions_with_chars_by_comic_' + e
-                                        for e in count_types]
+    # each column of the counts is a pair of words/phrases (see
+    # 'combine_column_pairs'); each scenario corrects and aggregates the
+    # columns of its own pairs, or all columns if it has all the pairs
+    pair_positions = {}
+    for j, pair in enumerate(zip(characters[0::2], characters[1::2])):
+        pair_positions.setdefault(pair, j)
+    scenario_columns = []
+    for scenario_results in results:
+        scenario_characters = scenario_results['inputs']['characters']
+        positions = [pair_positions[pair] for pair in
+                     zip(scenario_characters[0::2], scenario_characters[1::2])]
+        if positions == list(range(len(pair_positions))):
+            positions = None
+        scenario_columns.append(positions)
+
+    # the positions of the next chunk's first panel and first comic
+    first_row = 0
+    n_rows = 0
+    n_comics = 0
+    fuzzy_hits = [] if fuzzy_distance else None
+    mode = 'w'
+    writer = new_table_writer(output_workers, output_queue_mb, output_format)
+    output_options = {'rolling_window': rolling_window,
+                      'co_occurrence': co_occurrence,
+                      'co_occurrence_by_year': co_occurrence_by_year,
+                      'character_index': character_index}
+
+    for first_row, expanded_table in tables:
+
+        n_rows = len(expanded_table)
+
+        with report_stage(report, 'index dates') as stage:
+            dates_column = expanded_table.ix[:, 'filename'] # convenient for later use
+            date_index = build_date_index(dates_column)     # rows of each date
+            stage['rows'] = n_rows
+
+        # reading 'expanded_table' from the 'csv' file produces 11 NaN values
+        # in each of the columns 'text_by_panels' and 'text_spell_corrected';
+        # manual inspection of each case showed that no text was being lost;
+        # deleting the rows may disrupt some subsequent loops, and the NaNs
+        # won't affect the character counts
+        nan_n = expanded_table.ix[:, 'text_by_panels'].isnull().sum()
+        panels_n = len(expanded_table) - nan_n
+        #expanded_table.ix[:, 'text_by_panels'].fillna('', inplace=True)
+        expanded_table.ix[:, 'text_spell_corrected'].fillna('', inplace=True)
+
+        # a copy of the 'csv' file is kept with the results; filling the NaNs
+        # above doesn't change the 'csv' file
+        if copy_table:
+            copied_table = expanded_table
+            # the texts read from the columnar file are arrays, which are
+            #   saved as the lists of the 'csv' file
+            if not read_from_csv:
+                copied_table = expanded_table.copy()
+                for column in text_col_names:
+                    copied_table[column] = [
+                        text.tolist() for text in copied_table[column].values]
+            with report_stage(report, 'write'):
+                submit_write(
+                    writer, 'expanded_table.csv',
+                    lambda table=copied_table, mode=mode: table.to_csv(
+                        'expanded_table.csv', sep='^', index=False,
+                        mode=mode, header=(mode == 'w')),
+                    table_nbytes(copied_table))
+
+        # count the characters' appearances/mentions
+        if incremental:
+            with report_stage(report, 'tokenize and match') as stage:
+                counts = count_characters_incrementally(
+                    expanded_table, characters,
+                    tokenizer_backend=tokenizer_backend,
+                    possessives=possessives)
+                stage['rows'] = n_rows
+        else:
+            chunk_fuzzy_hits = [] if fuzzy_distance else None
+            counts = count_characters(expanded_table, characters, workers,
+                                      report, matcher, tokenizer_backend,
+                                      chunk_fuzzy_hits)
+            if fuzzy_distance:
+                for text_column, row, column, term, token in chunk_fuzzy_hits:
+                    fuzzy_hits.append((first_row + row, dates_column.iloc[row],
+                                       text_column, column, term, token))
+
+        for scenario_results, positions in zip(results, scenario_columns):
+            if positions is None:
+                scenario_counts = counts
+            else:
+                with report_stage(report, 'select scenario columns'):
+                    scenario_counts = select_count_matrix_columns(counts,
+                                                                  positions)
+            correct_and_save_chunk(scenario_results, scenario_counts,
+                                   expanded_table, date_index, first_row,
+                                   n_comics, writer, mode, report,
+                                   **output_options)
+
+        n_comics += len(date_index['dates'])
+        mode = 'a'
+
+    for scenario_results in results:
+        save_scenario_results(scenario_results, n_comics,
+                              first_row + n_rows, writer, report,
+                              rolling_align=rolling_align, **output_options)
+
+    # the fuzzy matches of all scenarios are saved once, in the working
+    # directory
+    if fuzzy_distance:
+        with report_stage(report, 'write') as stage:
+            submit_tables(writer, [fuzzy_hits_table(fuzzy_hits,
+                                                    fuzzy_distance)],
+                          ['fuzzy_hits'])
+            stage['rows'] = len(fuzzy_hits)
+
+    # wait for the tables that are still being saved in the background
+    with report_stage(report, 'flush writes') as stage:
+        writes = close_table_writer(writer)
+        stage['rows'] = writes['tables']
+    print('Saved {0} tables in {1:.1f} s in the background; computing waited '
+          '{2:.1f} s for them'.format(writes['tables'],
+                                      writes['write_seconds'],
+                                      writes['wait_seconds']))
+
+    if report is not None:
+        write_run_report(report)
+
+
+def parse_command_line_arguments():
+    '''
+    Parses options for 'main' from the command line
+    '''
 
-    save_tables_to_csv(counts, counts_filenames)
-    save_tables_to_csv(counts_by_comic, counts_by_comic_filenames)
-    #save_tables_to_csv(proportions_by_comic, proportions_by_comic_filenames)
-    save_tables_to_csv(props_w_chars_by_comic, props_w_chars_by_comic_filenames)
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Counts appearances of Peanuts characters in text '
+                    'descriptions of the comics')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of processes that count the characters')
+    parser.add_argument('--rules', dest='rules_filepath', default=None,
+                        help='json file with the rules for adjusting the '
+                             'counts (default: correction_rules.json next to '
+                             'this script)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='search only text that has changed since the '
+                             'last incremental run, using the matches saved '
+                             'in incremental_state.npz')
+    parser.add_argument('--chunk-rows', type=int, default=None,
+                        help='read, count and save the table about this many '
+                             'rows at a time, keeping all panels of a comic '
+                             'together, to bound memory use')
+    parser.add_argument('--output-format', choices=['csv', 'parquet'],
+                        default='csv',
+                        help='file format of the result tables (default: '
+                             'csv)')
+    parser.add_argument('--output-workers', type=int, default=1,
+                        help='number of threads that save the result tables '
+                             'in the background')
+    parser.add_argument('--output-queue-mb', type=int, default=1024,
+                        help='megabytes of result tables that may wait to be '
+                             'saved before computing waits (default: 1024)')
+    parser.add_argument('--rolling-window', type=int, default=None,
+                        help='also save the rolling mean of the overall '
+                             'proportions over this many comics, and their '
+                             'means per year and month')
+    parser.add_argument('--rolling-align',
+                        choices=['dynamic', 'center', 'trailing'],
+                        default='dynamic',
+                        help='alignment of the rolling window; dynamic is '
+                             'the window of proportions_graphs.R (default: '
+                             'dynamic)')
+    parser.add_argument('--profile', choices=['cprofile', 'tracemalloc'],
+                        default=None,
+                        help='also profile the function calls or the memory '
+                             'allocations of each stage in the run report '
+                             '(implies --run-report)')
+    parser.add_argument('--co-occurrence', action='store_true',
+                        help='also save the number of comics in which each '
+                             'pair of characters appear together, with its '
+                             'lift and PMI')
+    parser.add_argument('--co-occurrence-by-year', action='store_true',
+                        help='also save the co-occurrences of each year')
+    parser.add_argument('--tokenizer', dest='tokenizer_backend',
+                        choices=['enchant', 'regex'], default='enchant',
+                        help='tokenize the text with enchant or with a '
+                             'regular expression that finds the same words '
+                             'without enchant (default: enchant)')
+    parser.add_argument('--scenarios', dest='scenarios_filepath',
+                        default=None,
+                        help='json file of scenarios (variants of the '
+                             'searched-for words and of the correction '
+                             'rules); the text is searched once for all of '
+                             'them, and the results of each are saved to a '
+                             'folder named after it')
+    parser.add_argument('--fuzzy-distance', type=int, default=0,
+                        help='also match searched-for words within this many '
+                             'edits (e.g., typos) of the words of the text '
+                             'that aren\'t in the English dictionary of '
+                             'enchant; the matches are saved to fuzzy_hits '
+                             'for review (default: 0, exact matches only)')
+    parser.add_argument('--fuzzy-min-length', type=int, default=5,
+                        help='only words of at least this many characters '
+                             'are matched within edits (default: 5)')
+    parser.add_argument('--run-report', action='store_true',
+                        help='save the time, memory and rows of each stage of '
+                             'the run to run_report.json')
+    parser.add_argument('--character-index', action='store_true',
+                        help='save the index of the comics and panels in '
+                             'which each character appears to '
+                             'character_index.npz, e.g., for query_service.py')
+
+    return(parser.parse_args())
 
 
 if __name__ == '__main__':
-    main()
+    main(**vars(parse_command_line_arguments()))
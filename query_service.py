@@ -0,0 +1,639 @@
+#! /usr/bin/env python3
+
+'''
+Answers questions about the prominence of the characters from the results of
+    'character_appear.py' without re-running it or reading its tables for each
+    question:  a long-running local HTTP server loads the per-comic proportions
+    and the index of the comics and panels of each character (see
+    'write_character_index'; saved with the option '--character-index') once,
+    keeps them in memory as NumPy arrays and answers each query with 'json'
+The answers of recent queries are kept in a least-recently-used cache, and the
+    results are loaded again in the background when a new run of
+    'character_appear.py' finishes, i.e., when it saves its 'run_report.json'
+    (with the option '--run-report')
+Queries (all dates can be partial, e.g., '1962' or '1962-06'):
+    /character?character=schroeder&start_date=1962&end_date=1962
+    /rank?start_date=1980&end_date=1989&top=10
+    /period?characters=linus,lucy&period=year&view=talk
+    /rolling?characters=snoopy&window=100&align=trailing
+    /comics?all_of=linus,sally&view=talk&start_date=1965&end_date=1970
+    /status
+'''
+
+
+def read_result_table(filepath):
+    '''
+    Reads the table that 'save_tables' saved as 'filepath' plus '.csv' or
+        '.parquet'; if both files exist, the newer one is read, since it is
+        from the latest run
+    '''
+
+    import os
+    import pandas as pd
+
+    filepaths = [filepath + extension for extension in ['.csv', '.parquet']
+                 if os.path.exists(filepath + extension)]
+    if not filepaths:
+        raise IOError('No table {0}.csv or {0}.parquet'.format(filepath))
+
+    filepath = max(filepaths, key=os.path.getmtime)
+
+    if filepath.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        table = pq.read_table(filepath).to_pandas()
+    else:
+        table = pd.read_csv(filepath, index_col=0)
+
+    return(table)
+
+
+def load_query_data(results_path='.'):
+    '''
+    Loads the results of a run of 'character_appear.py' from the folder
+        'results_path' for answering queries:  the index of the comics and
+        panels in which each character appears (see 'load_character_index')
+        and the per-comic proportions with characters of each view, with
+        missing proportions set to '0' as the plots do (see
+        'fill_missing_proportions')
+    Returns dictionary of the index ('index'), its views, characters and
+        comics, the proportions as a NumPy array of views x comics x characters
+        ('proportions'), the names that the run's correction rules merged
+        into each character ('aliases', see 'load_character_index') and the
+        time it took to load them
+    '''
+
+    import os
+    import time
+    import numpy as np
+    import character_appear as ca
+
+    start = time.perf_counter()
+
+    index = ca.load_character_index(os.path.join(results_path,
+                                                 'character_index.npz'))
+    columns = index['columns']
+    comic_dates = index['comic_dates']
+    count_types = ca.count_type_names()
+    proportions = np.zeros((len(count_types), len(comic_dates), len(columns)))
+
+    for i, count_type in enumerate(count_types):
+        table = read_result_table(os.path.join(
+            results_path, 'proportions_with_chars_by_comic_' + count_type))
+        if len(table) != len(comic_dates):
+            raise ValueError('The proportions of {0} and the character index '
+                             'are from different runs'.format(count_type))
+        proportions[i] = ca.fill_missing_proportions(table[columns]).values
+
+    data = {'index': index, 'views': index['views'], 'columns': columns,
+            'comic_dates': comic_dates, 'proportions': proportions,
+            'aliases': index['merges'],
+            'loaded': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'load_seconds': time.perf_counter() - start}
+
+    return(data)
+
+
+def resolve_character(data, character):
+    '''
+    Returns the canonical name and the column position of 'character', which
+        can be any name that is merged into a canonical name, in the query
+        data 'data' (see 'load_query_data')
+    '''
+
+    positions = data['index']['column_positions']
+    character = character.lower()
+
+    if character not in positions:
+        character = data['aliases'].get(character, character)
+    if character not in positions:
+        raise KeyError('No character {0} in the results'.format(character))
+
+    return(character, positions[character])
+
+
+def view_position(data, view):
+    '''
+    Returns the position of 'view' (e.g., 'overall' or 'talk') among the views
+        of the query data 'data' (see 'load_query_data')
+    '''
+
+    if view not in data['views']:
+        raise ValueError('View must be one of {0}'.format(
+            ', '.join(data['views'])))
+
+    return(data['views'].index(view))
+
+
+def json_values(values):
+    '''
+    Returns list of the numbers in 'values' with 'NaN' and infinite numbers
+        as 'None', since 'json' has no such numbers
+    '''
+
+    import math
+
+    return([float(v) if math.isfinite(v) else None for v in values])
+
+
+def character_prominence(data, character, view='overall', start_date=None,
+                         end_date=None):
+    '''
+    Returns the proportion of panels with characters in which 'character'
+        appears, and the number of panels in which it appears, in each comic
+        from 'start_date' to 'end_date' in 'view', with its mean proportion and
+        the number of those comics and panels in which it appears
+    The panels are counted from the character's postings in the index (see
+        'character_index_postings'), so the per-panel tables aren't needed
+    '''
+
+    import numpy as np
+    import character_appear as ca
+
+    character, position = resolve_character(data, character)
+    first, stop = ca.comic_date_range(data['comic_dates'], start_date,
+                                      end_date)
+    proportions = data['proportions'][view_position(data, view),
+                                      first:stop, position]
+
+    index = data['index']
+    panel_postings = ca.character_index_postings(index, character, view,
+                                                 'panel')
+    comic_bounds = np.append(index['comic_starts'], index['n_panels'])
+    panels = np.diff(np.searchsorted(panel_postings,
+                                     comic_bounds[first:stop + 1]))
+
+    answer = {'character': character, 'view': view,
+              'comics': int(stop - first),
+              'comics_with_character': int((panels > 0).sum()),
+              'panels_with_character': int(panels.sum()),
+              'mean_proportion': json_values([proportions.mean()
+                                              if len(proportions)
+                                              else np.nan])[0],
+              'dates': data['comic_dates'][first:stop].tolist(),
+              'proportions': json_values(proportions),
+              'panels': panels.tolist()}
+
+    return(answer)
+
+
+def rank_characters(data, view='overall', start_date=None, end_date=None,
+                    top=10, by='proportion', characters=()):
+    '''
+    Returns the 'top' characters of 'view' from 'start_date' to 'end_date',
+        ranked by their mean proportion per comic ('by' is 'proportion') or by
+        the number of comics in which they appear ('by' is 'comics'), among
+        'characters' or among all characters if none are given
+    Characters with equal values keep the order of the results' columns
+    '''
+
+    import numpy as np
+    import character_appear as ca
+
+    if by not in ('proportion', 'comics'):
+        raise ValueError("'by' must be 'proportion' or 'comics'")
+
+    first, stop = ca.comic_date_range(data['comic_dates'], start_date,
+                                      end_date)
+    if characters:
+        names, positions = zip(*[resolve_character(data, c)
+                                 for c in characters])
+    else:
+        names, positions = data['columns'], list(range(len(data['columns'])))
+
+    proportions = data['proportions'][view_position(data, view),
+                                      first:stop][:, list(positions)]
+    with np.errstate(invalid='ignore'):
+        means = proportions.mean(axis=0)
+    comics = (proportions > 0).sum(axis=0)
+    values = means if by == 'proportion' else comics
+    order = np.argsort(-np.nan_to_num(values), kind='mergesort')[:top]
+
+    ranking = [{'rank': rank + 1, 'character': names[j],
+                'mean_proportion': json_values([means[j]])[0],
+                'comics': int(comics[j])}
+               for rank, j in enumerate(order)]
+
+    return({'view': view, 'comics': int(stop - first), 'by': by,
+            'ranking': ranking})
+
+
+def prominence_by_period(data, characters=(), view='overall', start_date=None,
+                         end_date=None, period='year'):
+    '''
+    Returns the mean proportion per comic of each of 'characters' (all
+        characters if none are given) in 'view' in each year or month
+        ('period' is 'year' or 'month') from 'start_date' to 'end_date' (see
+        'aggregate_by_period')
+    '''
+
+    import pandas as pd
+    import character_appear as ca
+
+    first, stop = ca.comic_date_range(data['comic_dates'], start_date,
+                                      end_date)
+    if characters:
+        names, positions = zip(*[resolve_character(data, c)
+                                 for c in characters])
+    else:
+        names, positions = data['columns'], list(range(len(data['columns'])))
+
+    table = pd.DataFrame(
+        data['proportions'][view_position(data, view),
+                            first:stop][:, list(positions)],
+        index=data['comic_dates'][first:stop], columns=names)
+    means = ca.aggregate_by_period(table, period)
+
+    return({'view': view, 'period': period,
+            'periods': [str(p) for p in means.index],
+            'characters': {name: json_values(means[name].values)
+                           for name in names}})
+
+
+def rolling_prominence_query(data, characters, window, view='overall',
+                             align='dynamic', start_date=None, end_date=None):
+    '''
+    Returns the rolling mean proportion of each of 'characters' in 'view' over
+        'window' comics (see 'rolling_prominence'), for the comics from
+        'start_date' to 'end_date'
+    The means are calculated over all comics before the comics are selected,
+        so that they are the same as those of the whole run
+    '''
+
+    import character_appear as ca
+
+    if not characters:
+        raise ValueError("'characters' are required")
+    if window < 1:
+        raise ValueError("'window' must be at least 1")
+
+    names, positions = zip(*[resolve_character(data, c) for c in characters])
+    values = data['proportions'][view_position(data, view)][:,
+                                                            list(positions)]
+
+    if align == 'dynamic':
+        means = ca.dynamic_rolling_means(values, window, 3 * window)
+    else:
+        means = ca.rolling_means(values, window, align)
+
+    first, stop = ca.comic_date_range(data['comic_dates'], start_date,
+                                      end_date)
+
+    return({'view': view, 'window': window, 'align': align,
+            'dates': data['comic_dates'][first:stop].tolist(),
+            'characters': {name: json_values(means[first:stop, j])
+                           for j, name in enumerate(names)}})
+
+
+def comics_with_characters(data, all_of=(), any_of=(), view='overall',
+                           level='comic', start_date=None, end_date=None,
+                           limit=1000):
+    '''
+    Returns the number of comics or panels ('level' is 'comic' or 'panel') from
+        'start_date' to 'end_date' in which all of the characters in 'all_of'
+        and at least 1 of the characters in 'any_of' appear in 'view' (see
+        'query_character_index'), with the first 'limit' of their dates
+        (comics) or rows of 'expanded_table' (panels)
+    '''
+
+    import character_appear as ca
+
+    if level not in ('comic', 'panel'):
+        raise ValueError("'level' must be 'comic' or 'panel'")
+    view_position(data, view)
+
+    result = ca.query_character_index(
+        data['index'], [resolve_character(data, c)[0] for c in all_of],
+        [resolve_character(data, c)[0] for c in any_of], view, level,
+        start_date, end_date)
+
+    answer = {'view': view, 'level': level, 'count': len(result)}
+    if level == 'comic':
+        answer['dates'] = data['comic_dates'][result[:limit]].tolist()
+    else:
+        answer['panels'] = result[:limit].tolist()
+
+    return(answer)
+
+
+def query_functions():
+    '''
+    Returns dictionary of the path of each query and the function that answers
+        it; the parameters of the query are the function's keyword arguments
+    '''
+
+    functions = {'/character': character_prominence,
+                 '/rank': rank_characters,
+                 '/period': prominence_by_period,
+                 '/rolling': rolling_prominence_query,
+                 '/comics': comics_with_characters}
+
+    return(functions)
+
+
+def query_arguments(parameters):
+    '''
+    Returns dictionary of the keyword arguments of a query function (see
+        'query_functions') from the parameters of the query string:  lists of
+        characters are separated by commas, and counts are integers
+    '''
+
+    list_parameters = ['characters', 'all_of', 'any_of']
+    integer_parameters = ['top', 'window', 'limit']
+    arguments = {}
+
+    for name, value in parameters:
+        if name in list_parameters:
+            arguments[name] = [v.strip() for v in value.split(',')
+                               if v.strip()]
+        elif name in integer_parameters:
+            arguments[name] = int(value)
+        else:
+            arguments[name] = value
+
+    return(arguments)
+
+
+def new_query_cache(max_entries=256):
+    '''
+    Returns an empty least-recently-used cache of the answers of up to
+        'max_entries' queries, with counts of its hits and misses
+    '''
+
+    from collections import OrderedDict
+
+    cache = {'entries': OrderedDict(), 'max_entries': max_entries, 'hits': 0,
+             'misses': 0}
+
+    return(cache)
+
+
+def cached_answer(cache, key, compute_answer):
+    '''
+    Returns the answer of the query 'key' from 'cache' (see 'new_query_cache'),
+        or the answer from calling 'compute_answer', which is added to the
+        cache in place of the least recently used answer if the cache is full
+    '''
+
+    entries = cache['entries']
+
+    if key in entries:
+        entries.move_to_end(key)
+        cache['hits'] += 1
+        return(entries[key])
+
+    cache['misses'] += 1
+    answer = compute_answer()
+    entries[key] = answer
+    if len(entries) > cache['max_entries']:
+        entries.popitem(last=False)
+
+    return(answer)
+
+
+def new_query_service(results_path='.', run_report_filepath='run_report.json',
+                      cache_entries=256):
+    '''
+    Loads the results in 'results_path' (see 'load_query_data') for the query
+        service
+    Returns dictionary of the service's state:  the loaded data, the signature
+        of 'run_report_filepath' (see 'file_signature') when they were loaded,
+        the cache of answers (see 'new_query_cache') and the number of reloads
+    'run_report_filepath' - the report that 'character_appear.py' saves at the
+        end of each run with the option 'run_report' (see 'write_run_report');
+        when it changes, the run has finished and the results are loaded again
+        (see 'reload_when_changed')
+    '''
+
+    import character_appear as ca
+
+    signature = ca.file_signature(run_report_filepath)
+    service = {'results_path': results_path,
+               'run_report_filepath': run_report_filepath,
+               'data': load_query_data(results_path), 'signature': signature,
+               'cache': new_query_cache(cache_entries), 'reloads': 0}
+
+    return(service)
+
+
+def service_status(service):
+    '''
+    Returns dictionary of the loaded results and of the cache of the query
+        service 'service' (see 'new_query_service')
+    '''
+
+    data = service['data']
+    cache = service['cache']
+    status = {'results_path': service['results_path'],
+              'loaded': data['loaded'], 'load_seconds': data['load_seconds'],
+              'reloads': service['reloads'], 'views': data['views'],
+              'characters': data['columns'],
+              'comics': len(data['comic_dates']),
+              'panels': data['index']['n_panels'],
+              'cache': {'entries': len(cache['entries']),
+                        'max_entries': cache['max_entries'],
+                        'hits': cache['hits'], 'misses': cache['misses']}}
+
+    return(status)
+
+
+def answer_request(service, method, target):
+    '''
+    Answers the HTTP request for 'target', a path and query string, with the
+        query service 'service' (see 'new_query_service')
+    Returns the HTTP status and the answer as 'json'-encoded bytes; answers are
+        cached (see 'cached_answer'), except for the service's status
+    Unknown characters are 'Not Found' (404) and invalid parameters are a 'Bad
+        Request' (400); any other error while answering is an 'Internal Server
+        Error' (500), so that the connection is still answered
+    '''
+
+    import json
+    import time
+    from urllib.parse import parse_qsl, urlsplit
+
+    if method != 'GET':
+        return(405, json.dumps({'error': 'Only GET is supported'}).encode())
+
+    url = urlsplit(target)
+    functions = query_functions()
+
+    if url.path == '/status':
+        return(200, json.dumps(service_status(service)).encode())
+    if url.path not in functions:
+        message = 'No query {0}; queries are {1}'.format(
+            url.path, ', '.join(sorted(functions) + ['/status']))
+        return(404, json.dumps({'error': message}).encode())
+
+    parameters = parse_qsl(url.query)
+    key = (url.path, tuple(sorted(parameters)))
+    start = time.perf_counter()
+
+    def compute_answer():
+        answer = functions[url.path](service['data'],
+                                     **query_arguments(parameters))
+        # an answer that isn't valid 'json' is an error of the service, not
+        #   of the request
+        try:
+            return(json.dumps(answer, allow_nan=False).encode())
+        except (TypeError, ValueError) as error:
+            raise RuntimeError('The answer is not valid json:  {0}'.format(
+                error))
+
+    try:
+        answer = cached_answer(service['cache'], key, compute_answer)
+    except KeyError as error:
+        return(404, json.dumps({'error': error.args[0]}).encode())
+    except (TypeError, ValueError) as error:
+        return(400, json.dumps({'error': str(error)}).encode())
+    except Exception as error:
+        print('{0} failed:  {1!r}'.format(target, error))
+        return(500, json.dumps({'error': 'Internal error:  {0!r}'.format(
+            error)}).encode())
+
+    print('{0} {1:.1f} ms'.format(target,
+                                  1000 * (time.perf_counter() - start)))
+
+    return(200, answer)
+
+
+async def handle_connection(service, reader, writer):
+    '''
+    Reads an HTTP request from 'reader' and writes the answer of the query
+        service 'service' to 'writer' (see 'answer_request'); each connection
+        answers a single request
+    '''
+
+    import json
+
+    reasons = {200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+               405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+    request_line = await reader.readline()
+    header_line = request_line
+    while header_line not in (b'\r\n', b'\n', b''):
+        header_line = await reader.readline()
+
+    try:
+        method, target, _ = request_line.decode('latin-1').split(' ', 2)
+    except ValueError:
+        status, body = 400, json.dumps({'error': 'Bad request line'}).encode()
+    else:
+        status, body = answer_request(service, method, target)
+
+    writer.write('HTTP/1.1 {0} {1}\r\nContent-Type: application/json\r\n'
+                 'Content-Length: {2}\r\nConnection: close\r\n\r\n'
+                 .format(status, reasons[status], len(body)).encode('latin-1'))
+    writer.write(body)
+    await writer.drain()
+    writer.close()
+
+
+async def reload_when_changed(service, interval_seconds=2.0):
+    '''
+    Checks every 'interval_seconds' whether the run report of the query service
+        'service' (see 'new_query_service') has changed and, if it has, loads
+        the new results in a thread while queries are still answered from the
+        loaded results, then replaces them and empties the cache
+    If the new results can't be loaded, the loaded results are kept and the
+        loading is tried again at the next check
+    '''
+
+    import asyncio
+    import character_appear as ca
+
+    loop = asyncio.get_event_loop()
+
+    while True:
+        await asyncio.sleep(interval_seconds)
+
+        signature = ca.file_signature(service['run_report_filepath'])
+        if signature == service['signature']:
+            continue
+
+        try:
+            data = await loop.run_in_executor(None, load_query_data,
+                                              service['results_path'])
+        except Exception as error:
+            print('Keeping the loaded results; the new results could not be '
+                  'loaded:  {0}'.format(error))
+            continue
+
+        service['data'] = data
+        service['signature'] = signature
+        service['cache'] = new_query_cache(service['cache']['max_entries'])
+        service['reloads'] += 1
+        print('Reloaded the results in {0:.2f} s'.format(data['load_seconds']))
+
+
+def main(results_path='.', run_report_filepath='run_report.json',
+         host='127.0.0.1', port=8080, cache_entries=256, reload_seconds=2.0):
+    '''
+    Serves queries about the results of 'character_appear.py' in the folder
+        'results_path' over HTTP on 'host' and 'port' until interrupted (see
+        'answer_request'), keeping the answers of up to 'cache_entries' recent
+        queries and checking every 'reload_seconds' whether a new run has
+        finished (see 'reload_when_changed')
+    '''
+
+    import asyncio
+
+    service = new_query_service(results_path, run_report_filepath,
+                                cache_entries)
+    print('Loaded {0} comics and {1} characters in {2:.2f} s'.format(
+        len(service['data']['comic_dates']), len(service['data']['columns']),
+        service['data']['load_seconds']))
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    server = loop.run_until_complete(asyncio.start_server(
+        lambda reader, writer: handle_connection(service, reader, writer),
+        host, port))
+    reload_task = loop.create_task(reload_when_changed(service,
+                                                       reload_seconds))
+    print('Serving queries on http://{0}:{1}/'.format(host, port))
+
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reload_task.cancel()
+        server.close()
+        loop.run_until_complete(server.wait_closed())
+        loop.close()
+
+
+def parse_command_line_arguments():
+    '''
+    Parses options for 'main' from the command line
+    '''
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Serves queries about the prominence of the characters '
+                    'from the results of character_appear.py over HTTP/JSON')
+    parser.add_argument('--results', dest='results_path', default='.',
+                        help='folder of the results, e.g., the folder of a '
+                             'scenario (default: the working directory)')
+    parser.add_argument('--run-report', dest='run_report_filepath',
+                        default='run_report.json',
+                        help='run report that each run of character_appear.py '
+                             'saves when it finishes, with --run-report; the '
+                             'results are loaded again when it changes '
+                             '(default: run_report.json)')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='address to serve on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8080,
+                        help='port to serve on (default: 8080)')
+    parser.add_argument('--cache-entries', type=int, default=256,
+                        help='number of recent answers to keep (default: 256)')
+    parser.add_argument('--reload-seconds', type=float, default=2.0,
+                        help='seconds between checks for a new run (default: '
+                             '2)')
+
+    return(parser.parse_args())
+
+
+if __name__ == '__main__':
+    main(**vars(parse_command_line_arguments()))
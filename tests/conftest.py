@@ -0,0 +1,56 @@
+'''
+Shared fixtures of the tests of 'character_appear.py'
+The tests run on small synthetic corpora (see 'benchmark.py'), since the
+    Peanuts data aren't part of the repository
+'''
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def rules():
+    '''
+    Returns the default correction rules (see 'load_correction_rules')
+    '''
+
+    import character_appear as ca
+
+    return(ca.load_correction_rules())
+
+
+@pytest.fixture
+def corpus(tmpdir, rules):
+    '''
+    Writes a synthetic corpus of about 1500 panels (see
+        'write_synthetic_corpus') and returns the path of its 'work' folder,
+        where 'main' runs
+    '''
+
+    import benchmark
+
+    return(benchmark.write_synthetic_corpus(str(tmpdir), 1500, rules))
+
+
+def run_main(work_path, **options):
+    '''
+    Runs 'character_appear.main' with 'options' in 'work_path', with the
+        'regex' tokenizer so that 'enchant' isn't needed, and returns the
+        names of the files it saved
+    '''
+
+    import character_appear as ca
+
+    options.setdefault('tokenizer_backend', 'regex')
+    current_path = os.getcwd()
+    os.chdir(work_path)
+    try:
+        ca.main(**options)
+    finally:
+        os.chdir(current_path)
+
+    return(sorted(os.listdir(work_path)))
@@ -0,0 +1,81 @@
+'''
+Tests that compiled inputs are reused only while their files and the code
+    that compiled them are unchanged, and that unreadable caches are compiled
+    again
+'''
+
+import os
+
+import pytest
+
+import character_appear as ca
+
+
+@pytest.fixture
+def input_filepaths(corpus):
+    return([os.path.join(corpus, 'characters_only.txt'),
+            os.path.join(corpus, 'characters_and_more.txt'),
+            os.path.join(os.path.dirname(corpus), '06_character_talk',
+                         'peppermint_patty_dates.txt')])
+
+
+@pytest.fixture
+def compilations(monkeypatch):
+    '''
+    Counts the calls of 'compile_inputs', starting from an empty cache of
+        loaded files
+    '''
+
+    calls = []
+    compile_inputs = ca.compile_inputs
+
+    def counted_compile_inputs(*args, **kwargs):
+        calls.append(args)
+        return(compile_inputs(*args, **kwargs))
+
+    monkeypatch.setattr(ca, 'compile_inputs', counted_compile_inputs)
+    monkeypatch.setattr(ca, 'loaded_files_cache', {})
+
+    return(calls)
+
+
+def load(input_filepaths, cache_filepath):
+    # a new process doesn't have the inputs in memory
+    ca.loaded_files_cache.pop(next((k for k in ca.loaded_files_cache
+                                    if k[0] == 'compiled_inputs'), None), None)
+    return(ca.load_compiled_inputs(*input_filepaths,
+                                   cache_filepath=cache_filepath))
+
+
+def test_cache_is_reused_until_code_changes(input_filepaths, compilations,
+                                            tmpdir, monkeypatch):
+    cache_filepath = str(tmpdir.join('compiled_inputs.pickle'))
+
+    inputs = load(input_filepaths, cache_filepath)
+    assert load(input_filepaths, cache_filepath)['characters'] == \
+        inputs['characters']
+    assert len(compilations) == 1
+
+    monkeypatch.setattr(ca, 'source_code_version', lambda: 'other code')
+    load(input_filepaths, cache_filepath)
+    assert len(compilations) == 2
+
+
+@pytest.mark.parametrize('cache_bytes', [
+    b'',                                            # empty file
+    b'\x80\x03cno_such_module\nInputs\nq\x00.',     # class that isn't found
+    b'\x80\x09',                                    # unknown protocol
+    b'\x80\x03}q\x00.',                             # no inputs
+])
+def test_unreadable_cache_is_compiled_again(input_filepaths, compilations,
+                                            tmpdir, cache_bytes):
+    cache_filepath = str(tmpdir.join('compiled_inputs.pickle'))
+    with open(cache_filepath, 'wb') as cache_file:
+        cache_file.write(cache_bytes)
+
+    inputs = load(input_filepaths, cache_filepath)
+    assert len(compilations) == 1
+    assert inputs['characters']
+    assert load(input_filepaths, cache_filepath)['characters'] == \
+        inputs['characters']
+    assert len(compilations) == 1
@@ -0,0 +1,49 @@
+'''
+Tests that the co-occurrences counted from the pairs of characters in each
+    comic are those of the matrix product of the presences
+'''
+
+import numpy as np
+
+import character_appear as ca
+
+
+def test_co_occurrence_pairs_match_matrix_product():
+    random = np.random.RandomState(0)
+    presence = random.rand(3, 500, 12) < 0.2
+    presence[:, 100:150] = False
+
+    pairs = ca.co_occurrence_pairs(presence, block_rows=64)
+    counts = ca.co_occurrence_matrix(pairs, 3, 12)
+    values = presence.astype(np.int64)
+    assert (counts == np.matmul(values.transpose(0, 2, 1), values)).all()
+
+    tables, first, second, pair_counts = pairs
+    assert (first <= second).all()
+    assert (pair_counts == counts[tables, first, second]).all()
+    assert (pair_counts > 0).all()
+    assert len(pair_counts) == (np.triu(counts) > 0).sum()
+
+
+def test_co_occurrence_pairs_of_chunks_are_combined():
+    random = np.random.RandomState(1)
+    presence = random.rand(2, 300, 8) < 0.3
+
+    combined = ca.combine_co_occurrence_pairs(
+        [ca.co_occurrence_pairs(presence[:, start:start + 70])
+         for start in range(0, 300, 70)])
+    for combined_values, values in zip(combined,
+                                       ca.co_occurrence_pairs(presence)):
+        assert (combined_values == values).all()
+
+
+def test_co_occurrence_of_no_comics():
+    presence = np.zeros((2, 0, 4), dtype=bool)
+
+    pairs = ca.co_occurrence_pairs(presence)
+    assert (ca.co_occurrence_matrix(pairs, 2, 4) == 0).all()
+    assert all(len(values) == 0 for values in
+               ca.combine_co_occurrence_pairs([pairs, pairs]))
+    pairs, n_comics = ca.co_occurrence_by_period(presence, [])
+    assert len(pairs) == 0
+    assert len(n_comics) == 0
@@ -0,0 +1,55 @@
+'''
+Tests that a run that reads the table from the columnar file (see
+    'read_expanded_table') saves the same outputs as the run that read the
+    'csv' file
+'''
+
+import os
+
+import pytest
+
+import character_appear as ca
+from conftest import run_main
+
+
+def read_outputs(work_path, filenames):
+    outputs = {}
+    for filename in filenames:
+        if filename.endswith('.csv'):
+            with open(os.path.join(work_path, filename), 'rb') as output_file:
+                outputs[filename] = output_file.read()
+
+    return(outputs)
+
+
+def test_columnar_table_saves_same_outputs(corpus):
+    pytest.importorskip('pyarrow')
+
+    filenames = run_main(corpus)
+    assert 'expanded_table.arrow' in filenames
+    csv_outputs = read_outputs(corpus, filenames)
+
+    # the copy of the 'csv' file is saved again from the columnar file
+    os.remove(os.path.join(corpus, 'expanded_table.csv'))
+    assert run_main(corpus) == filenames
+    assert read_outputs(corpus, filenames) == csv_outputs
+
+
+def test_columnar_table_texts_are_joined(corpus):
+    pytest.importorskip('pyarrow')
+
+    text_col_names = ['comics_speakers', 'text_nontalk', 'text_talk']
+    table_filepath = os.path.join(os.path.dirname(corpus), '07_separate_talk',
+                                  'expanded_table.csv')
+    columnar_filepath = os.path.join(corpus, 'expanded_table.arrow')
+    table, read_from_csv = ca.read_expanded_table(
+        table_filepath, text_col_names, columnar_filepath)
+    assert read_from_csv
+    columnar_table, read_from_csv = ca.read_expanded_table(
+        table_filepath, text_col_names, columnar_filepath)
+    assert not read_from_csv
+
+    assert list(columnar_table.columns) == list(table.columns)
+    for column in text_col_names:
+        assert ([ca.join_row_text(text) for text in columnar_table[column]] ==
+                [ca.join_row_text(text) for text in table[column]])
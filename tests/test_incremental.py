@@ -0,0 +1,77 @@
+'''
+Tests that incremental counts are identical to counting all rows again after
+    rows and words change, and that matches made with other settings aren't
+    reused
+'''
+
+import os
+
+import pytest
+
+import character_appear as ca
+
+
+@pytest.fixture
+def table_and_characters(rules):
+    import benchmark
+
+    characters_and_more, _ = benchmark.make_term_lists(rules)
+    table = benchmark.make_synthetic_table(2000, characters_and_more)
+    characters = ca.add_possessives_to_word_list(characters_and_more)
+
+    return(table, characters)
+
+
+def count_incrementally(table, characters, state_filepath, **options):
+    return(ca.count_characters_incrementally(
+        table, characters, state_filepath, tokenizer_backend='regex',
+        **options))
+
+
+def test_incremental_counts_match_full_counts(table_and_characters, tmpdir):
+    table, characters = table_and_characters
+    state_filepath = os.path.join(str(tmpdir), 'state.npz')
+
+    counts = count_incrementally(table, characters, state_filepath)
+    full_counts = ca.count_characters(table, characters,
+                                      tokenizer_backend='regex')
+    assert (counts.bits == full_counts.bits).all()
+
+    # one row's text and one word change
+    table = table.copy()
+    texts = list(table['text_spell_corrected'])
+    texts[3] = 'Linus and Sally and Woodstock'
+    table['text_spell_corrected'] = texts
+    nontalk = list(table['text_nontalk'])
+    nontalk[3] = ['the sighs of Marcie']
+    table['text_nontalk'] = nontalk
+    characters = characters[:-2] + ['grief', "grief's"]
+
+    counts = count_incrementally(table, characters, state_filepath)
+    full_counts = ca.count_characters(table, characters,
+                                      tokenizer_backend='regex')
+    assert counts.columns == full_counts.columns
+    assert (counts.bits == full_counts.bits).all()
+    assert ca.count_matrix_column_sums(counts)[
+        0, counts.columns.index('grief')] > 0
+
+
+def test_state_of_other_settings_is_not_reused(table_and_characters, tmpdir):
+    table, characters = table_and_characters
+    state_filepath = os.path.join(str(tmpdir), 'state.npz')
+    settings = {'tokenizer_backend': 'regex', 'possessives': True}
+
+    count_incrementally(table, characters, state_filepath)
+
+    assert ca.load_incremental_state(state_filepath, settings) is not None
+    assert ca.load_incremental_state(
+        state_filepath, dict(settings, tokenizer_backend='enchant')) is None
+    assert ca.load_incremental_state(
+        state_filepath, dict(settings, possessives=False)) is None
+
+
+def test_incremental_counts_reject_workers(corpus):
+    from conftest import run_main
+
+    with pytest.raises(ValueError, match='single process'):
+        run_main(corpus, incremental=True, workers=2)
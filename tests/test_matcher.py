@@ -0,0 +1,117 @@
+'''
+Tests that the compiled matcher finds the same words as the loop over each
+    word of the word list that it replaced
+'''
+
+import sys
+
+import pytest
+
+import character_appear as ca
+from conftest import run_main
+
+
+def tally_word_counts_by_loop(tokenized_column, word_list):
+    '''
+    Returns list of the sets of columns of 'word_list' that appear in each row
+        of 'tokenized_column', searching for one word at a time as the original
+        loop did:  phrases and hyphenated words in the text, single words among
+        the tokens
+    '''
+
+    found = []
+
+    for row in tokenized_column:
+        columns = set()
+        if row is not None:
+            text, tokens = row
+            for j, word in enumerate(word_list):
+                if (' ' in word) or ('-' in word):
+                    if word in text:
+                        columns.add(j)
+                elif word in tokens:
+                    columns.add(j)
+        found.append(columns)
+
+    return(found)
+
+
+def test_compiled_matcher_matches_loop(rules):
+    import benchmark
+
+    characters_and_more, _ = benchmark.make_term_lists(rules)
+    word_list = ca.add_possessives_to_word_list(characters_and_more)
+    # duplicate words are counted in each of their columns
+    word_list = word_list + word_list[:4]
+    table = benchmark.make_synthetic_table(3000, characters_and_more)
+    tokenized_column = ca.tokenize_text_column(
+        table['text_spell_corrected'], len(table),
+        ca.get_text_tokenizer('regex'), message_interval=None)
+
+    counts = ca.tally_word_counts_in_tokens(tokenized_column, word_list)
+    values = ca.unpack_count_matrix(counts)
+    expected = tally_word_counts_by_loop(tokenized_column, word_list)
+
+    assert values.sum() > 0
+    for i, columns in enumerate(expected):
+        assert set(values[i].nonzero()[0]) == columns
+
+
+def test_phrases_match_inside_words():
+    word_list = ['pig pen', 'pig-pen', 'hat', 'linus']
+    matcher = ca.compile_word_matcher(word_list)
+    text = 'big pig pens and a pig-pen, that linus'
+
+    found = ca.match_words_in_text(matcher, text, {'big', 'pig', 'pens', 'and',
+                                                   'a', 'that', 'linus'})
+
+    assert found == {0, 1, 3}
+
+
+class EnglishWords(object):
+    '''
+    Stands in for the dictionary of 'enchant' (see 'load_english_dictionary')
+    '''
+
+    def __init__(self, words):
+        self.words = set(words)
+
+    def check(self, word):
+        return(word in self.words)
+
+
+def test_fuzzy_matches_exclude_possessives_and_english_words(monkeypatch):
+    monkeypatch.setitem(ca.dictionary_cache, 'dictionary',
+                        EnglishWords(['and', 'ball', 'rally']))
+    word_list = ca.add_possessives_to_word_list(['andy', 'bill', 'sally',
+                                                 'snoopy'])
+    fuzzy_index = ca.compile_word_matcher(word_list, 1)['fuzzy_index']
+
+    def matches(token):
+        return(ca.find_fuzzy_matches(fuzzy_index, token))
+
+    # short names are too short to match within edits, with possessives, too
+    assert matches("and's") == []
+    assert matches("ball's") == []
+    assert matches('bil') == []
+    # a possessive matches only possessives
+    assert matches("snopy's") == ["snoopy's"]
+    assert matches('snopy') == ['snoopy']
+    # English words aren't typos
+    assert matches('rally') == []
+    assert matches("rally's") == []
+    assert matches('salli') == ['sally']
+
+
+def test_fuzzy_matches_need_enchant(monkeypatch, corpus):
+    # 'None' in 'sys.modules' makes the import fail, as if 'enchant' weren't
+    #   installed
+    monkeypatch.setitem(sys.modules, 'enchant', None)
+    monkeypatch.setattr(ca, 'dictionary_cache', {})
+
+    # exact matches don't need the dictionary
+    ca.compile_word_matcher(['snoopy', 'sally'])
+    with pytest.raises(ImportError, match='enchant'):
+        ca.compile_word_matcher(['snoopy', 'sally'], 1)
+    with pytest.raises(ImportError, match='enchant'):
+        run_main(corpus, fuzzy_distance=1)
@@ -0,0 +1,46 @@
+'''
+Tests that the run report and the index of characters, which the baseline
+    didn't save, are saved only when they are asked for
+'''
+
+import json
+import os
+
+from conftest import run_main
+
+
+def test_run_report_is_optional(corpus):
+    assert 'run_report.json' not in run_main(corpus)
+
+    assert 'run_report.json' in run_main(corpus, run_report=True)
+    with open(os.path.join(corpus, 'run_report.json')) as report_file:
+        report = json.load(report_file)
+    assert 'read' in [stage['stage'] for stage in report['stages']]
+
+
+def test_run_report_stages_add_up(corpus):
+    run_main(corpus, run_report=True)
+    with open(os.path.join(corpus, 'run_report.json')) as report_file:
+        report = json.load(report_file)
+    stages = {stage['stage']: stage for stage in report['stages']}
+
+    # each stage of the counts records the rows of the table once
+    n_rows = stages['read']['rows']
+    for stage_name in ['tokenize', 'match', 'stack views']:
+        assert stages[stage_name]['rows'] == n_rows, stage_name
+    assert (sum(stage['wall_seconds'] for stage in report['stages']) <=
+            report['run']['wall_seconds'])
+
+
+def test_profile_saves_run_report(corpus):
+    filenames = run_main(corpus, profile='cprofile')
+
+    assert 'run_report.json' in filenames
+    assert 'profile_read.prof' in filenames
+
+
+def test_character_index_is_optional(corpus):
+    filenames = run_main(corpus, chunk_rows=300)
+    assert not [f for f in filenames if f.startswith('character_index')]
+
+    assert 'character_index.npz' in run_main(corpus, character_index=True)
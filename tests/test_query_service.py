@@ -0,0 +1,105 @@
+'''
+Tests that the query service answers errors with their HTTP status and looks
+    characters up by the names that the run's own rules merged
+'''
+
+import asyncio
+import json
+import os
+
+import pytest
+
+import query_service as qs
+from conftest import run_main
+
+
+@pytest.fixture
+def service(corpus, rules, tmpdir):
+    rules['merges']['beagle'] = 'snoopy'
+    rules_filepath = str(tmpdir.join('rules.json'))
+    with open(rules_filepath, 'w') as rules_file:
+        json.dump(rules, rules_file)
+
+    run_main(corpus, rules_filepath=rules_filepath, run_report=True,
+             character_index=True)
+
+    return(qs.new_query_service(corpus,
+                                os.path.join(corpus, 'run_report.json')))
+
+
+def answer(service, target, method='GET'):
+    status, body = qs.answer_request(service, method, target)
+    return(status, json.loads(body.decode()))
+
+
+def test_aliases_are_the_run_merges(service):
+    status, body = answer(service, '/character?character=beagle')
+
+    assert status == 200
+    assert body['character'] == 'snoopy'
+    assert service['data']['aliases']['beagle'] == 'snoopy'
+
+
+@pytest.mark.parametrize('target, method, status', [
+    ('/character?character=snoopy', 'POST', 405),
+    ('/nothing', 'GET', 404),
+    ('/character?character=nobody', 'GET', 404),
+    ('/rank?by=height', 'GET', 400),
+    ('/rank?top=ten', 'GET', 400),
+    ('/rank?view=upside_down', 'GET', 400),
+    ('/rolling?characters=snoopy&window=0', 'GET', 400),
+])
+def test_request_errors(service, target, method, status):
+    assert answer(service, target, method)[0] == status
+
+
+def test_service_errors(service, monkeypatch):
+    def not_a_number(data, **arguments):
+        return({'value': float('nan')})
+
+    def failure(data, **arguments):
+        return(data['columns'][len(data['columns'])])
+
+    monkeypatch.setattr(qs, 'query_functions',
+                        lambda: {'/nan': not_a_number, '/failure': failure})
+
+    # neither is the request's fault
+    assert answer(service, '/nan')[0] == 500
+    status, body = answer(service, '/failure')
+    assert status == 500
+    assert 'error' in body
+
+
+class Writer(object):
+    '''
+    Stands in for the 'asyncio' stream that 'handle_connection' writes to
+    '''
+
+    def __init__(self):
+        self.written = b''
+
+    def write(self, data):
+        self.written += data
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_connection_answers_service_errors(service, monkeypatch):
+    monkeypatch.setattr(qs, 'query_functions',
+                        lambda: {'/nan': lambda data: float('nan')})
+
+    loop = asyncio.new_event_loop()
+    try:
+        reader = asyncio.StreamReader(loop=loop)
+        reader.feed_data(b'GET /nan HTTP/1.1\r\nHost: localhost\r\n\r\n')
+        reader.feed_eof()
+        writer = Writer()
+        loop.run_until_complete(qs.handle_connection(service, reader, writer))
+    finally:
+        loop.close()
+
+    assert writer.written.startswith(b'HTTP/1.1 500 Internal Server Error')
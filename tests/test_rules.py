@@ -0,0 +1,81 @@
+'''
+Tests that the correction rules are validated and that every correction uses
+    the rules it is given, not only the default rules file
+'''
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import character_appear as ca
+
+
+def write_rules(rules, tmpdir):
+    rules_filepath = os.path.join(str(tmpdir), 'rules.json')
+    with open(rules_filepath, 'w') as rules_file:
+        json.dump(rules, rules_file)
+    return(rules_filepath)
+
+
+@pytest.mark.parametrize('n_reassigned_dates', [-1, 2.5, '5', True])
+def test_invalid_reassigned_dates_are_rejected(rules, tmpdir,
+                                               n_reassigned_dates):
+    rules['patty']['n_reassigned_dates'] = n_reassigned_dates
+
+    with pytest.raises(ValueError, match='n_reassigned_dates'):
+        ca.load_correction_rules(write_rules(rules, tmpdir))
+
+
+def test_more_reassigned_dates_than_dates_are_rejected(rules):
+    rules['patty']['n_reassigned_dates'] = 3
+    date_index = ca.build_date_index(pd.Series(['1970-01-01',
+                                                   '1970-01-02']))
+
+    with pytest.raises(ValueError, match='only 2 Peppermint Patty dates'):
+        ca.compile_rule_plan(rules, ['patty', 'peppermint patty'], date_index,
+                             ['1970-01-01', '1970-01-02'])
+
+
+def test_corrections_use_given_rules(rules):
+    dates_column = pd.Series(['1960-01-01', '1970-01-01', '1980-01-01'])
+    date_index = ca.build_date_index(dates_column)
+    columns = ['sally', 'snoopy', 'joe cool', 'spike']
+    counts = ca.pack_count_matrix(np.ones((3, len(columns)), dtype=np.uint8),
+                                  columns)
+    rules['appearances'] = {'spike': {'first': '1965', 'last': '1975'}}
+    rules['combined_columns'] = {'snoopy and personas': ['joe cool']}
+
+    counts = ca.adjust_counts_by_appearance_dates_multiple_tables(
+        dates_column, counts, date_index, rules)
+    counts = ca.snoopy_and_personas_multiple_tables(counts, rules)
+    values = ca.unpack_count_matrix(counts)
+
+    # the default rules limit Sally's dates, too, and combine more personas
+    assert list(values[:, columns.index('sally')]) == [1, 1, 1]
+    assert list(values[:, columns.index('spike')]) == [0, 1, 0]
+    assert counts.columns[-1] == 'snoopy and personas'
+
+
+def test_merge_audit_counts_changed_rows():
+    random = np.random.RandomState(0)
+    columns = ['pig pen', 'lucy', 'pig-pen', 'peggy', 'jean']
+    values = random.rand(5, 200, len(columns)) < 0.3
+    counts = ca.pack_count_matrix(values, columns)
+    merged_names, merged_sources = ca.resolve_column_merges(
+        columns, {'pig pen': 'pig-pen', 'peggy': 'peggy jean',
+                  'jean': 'peggy jean'})
+    steps = [('merge', merged_names, merged_sources)]
+
+    merged_counts, _, audit = ca.apply_rule_steps_with_sums(
+        counts, steps, ca.counts_summary_column_sums(counts))
+    changed_counts = {r['column']: r['changed_counts'] for r in audit}
+
+    merged_values = ca.unpack_count_matrix(merged_counts).astype(bool)
+    pig_pen = merged_values[..., merged_counts.columns.index('pig-pen')]
+    peggy_jean = merged_values[..., merged_counts.columns.index('peggy jean')]
+    assert changed_counts == {
+        'pig-pen': (pig_pen != values[..., columns.index('pig-pen')]).sum(),
+        'peggy jean': peggy_jean.sum()}
@@ -0,0 +1,82 @@
+'''
+Tests that reading, counting and saving the table in chunks saves the same
+    outputs as reading the whole table at once
+'''
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import benchmark
+from conftest import run_main
+
+
+def write_corpora(tmpdir, rules, n_panels=1500):
+    return([benchmark.write_synthetic_corpus(str(tmpdir.join(name)), n_panels,
+                                             rules)
+            for name in ['batch', 'chunks']])
+
+
+def assert_same_outputs(batch_path, chunks_path, batch_filenames,
+                        chunks_filenames):
+    # only the whole table is kept in the 'arrow' file (see
+    # 'read_expanded_table')
+    filenames = [f for f in batch_filenames if f != 'expanded_table.arrow']
+    assert chunks_filenames == filenames
+
+    for filename in filenames:
+        batch_filepath = os.path.join(batch_path, filename)
+        chunks_filepath = os.path.join(chunks_path, filename)
+        if filename.endswith('.csv'):
+            with open(batch_filepath, 'rb') as batch_file:
+                with open(chunks_filepath, 'rb') as chunks_file:
+                    assert batch_file.read() == chunks_file.read(), filename
+        elif filename.endswith('.npz'):
+            # the dates of the files in the 'zip' archive differ
+            with np.load(batch_filepath) as batch_index:
+                with np.load(chunks_filepath) as chunks_index:
+                    assert batch_index.files == chunks_index.files
+                    for key in batch_index.files:
+                        batch_values = batch_index[key]
+                        chunks_values = chunks_index[key]
+                        assert batch_values.dtype == chunks_values.dtype
+                        assert np.array_equal(batch_values, chunks_values), key
+
+
+def test_chunks_save_same_outputs_as_batch(tmpdir, rules):
+    batch_path, chunks_path = write_corpora(tmpdir, rules)
+    options = {'co_occurrence': True, 'co_occurrence_by_year': True,
+               'character_index': True}
+
+    batch_filenames = run_main(batch_path, **options)
+    chunks_filenames = run_main(chunks_path, chunk_rows=300, **options)
+
+    assert 'character_index.npz' in batch_filenames
+    assert_same_outputs(batch_path, chunks_path, batch_filenames,
+                        chunks_filenames)
+    # no temporary files are left
+    assert not [f for f in chunks_filenames
+                if f.startswith('character_index_')]
+
+
+def test_empty_table(tmpdir, rules):
+    batch_path, chunks_path = write_corpora(tmpdir, rules, 100)
+    for work_path in [batch_path, chunks_path]:
+        table_filepath = os.path.join(os.path.dirname(work_path),
+                                      '07_separate_talk', 'expanded_table.csv')
+        table = pd.read_csv(table_filepath, sep='^')
+        table.iloc[:0].to_csv(table_filepath, sep='^', index=False)
+
+    batch_filenames = run_main(batch_path, character_index=True)
+    chunks_filenames = run_main(chunks_path, chunk_rows=300,
+                                character_index=True)
+
+    assert_same_outputs(batch_path, chunks_path, batch_filenames,
+                        chunks_filenames)
+
+
+def test_chunks_reject_rolling_prominence(corpus):
+    with pytest.raises(ValueError, match='rolling'):
+        run_main(corpus, chunk_rows=300, rolling_window=10)
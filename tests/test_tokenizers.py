@@ -0,0 +1,76 @@
+'''
+Tests that the 'regex' tokenizer finds the same tokens, and so the same counts,
+    as 'enchant' (see 'compare_tokenizers')
+'''
+
+import pandas as pd
+import pytest
+
+import character_appear as ca
+
+
+texts = ["Snoopy's doghouse",
+         "'Good grief!' says Charlie Brown.",
+         'Pig-Pen and Schröder',
+         "the kids' rock'n'roll",
+         'Lucy,Linus;Sally 1950s',
+         '']
+
+
+def test_regex_tokens():
+    tokenize = ca.get_text_tokenizer('regex')
+
+    assert [sorted(tokenize(text)) for text in texts] == [
+        ['doghouse', "snoopy's"],
+        ['brown', 'charlie', 'good', 'grief', 'says'],
+        ['and', 'pen', 'pig', 'schröder'],
+        ['kids', "rock'n'roll", 'the'],
+        ['linus', 'lucy', 's', 'sally'],
+        []]
+
+
+@pytest.fixture
+def table_and_characters(rules):
+    import benchmark
+
+    characters_and_more, _ = benchmark.make_term_lists(rules)
+    table = benchmark.make_synthetic_table(2000, characters_and_more)
+    extra_rows = table.iloc[:len(texts)].copy()
+    extra_rows['text_spell_corrected'] = texts
+    extra_rows['text_nontalk'] = [[text] for text in texts]
+    extra_rows['text_talk'] = [[text, text.upper()] for text in texts]
+    table = pd.concat([table, extra_rows], ignore_index=True)
+    characters = ca.add_possessives_to_word_list(characters_and_more)
+
+    return(table, characters)
+
+
+def test_regex_tokenizer_matches_enchant(table_and_characters):
+    pytest.importorskip('enchant.tokenize')
+    table, characters = table_and_characters
+
+    comparison = ca.compare_tokenizers(table)
+    assert comparison['rows'] > 0
+    assert comparison['differing_rows'] == 0, comparison['examples']
+
+    enchant_counts = ca.count_characters(table, characters,
+                                         tokenizer_backend='enchant')
+    regex_counts = ca.count_characters(table, characters,
+                                       tokenizer_backend='regex')
+    assert (enchant_counts.bits == regex_counts.bits).all()
+
+
+def test_workers_are_given_the_word_pattern(monkeypatch):
+    pattern = ca.compile_word_pattern()
+
+    def character_class_ranges(is_member):
+        raise AssertionError('the character ranges are computed again')
+
+    monkeypatch.setattr(ca, 'word_pattern_cache', {})
+    monkeypatch.setattr(ca, 'counting_worker_state', {})
+    monkeypatch.setattr(ca, 'character_class_ranges', character_class_ranges)
+    ca.initialize_counting_worker(['snoopy', "snoopy's"], 'regex',
+                                  word_pattern=pattern)
+
+    assert ca.counting_worker_state['tokenizer'](texts[0]) == {
+        'doghouse', "snoopy's"}